@@ -1,6 +1,11 @@
 from django.contrib import admin
 from django import forms
-from .models import Booking, Price, SupplementPrice, Capacity, MobileHome, SeasonInfo, SupplementMobileHome, OtherPrice
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.template.response import TemplateResponse
+from django.urls import path
+from .export import export_response
+from .importer import import_bookings
+from .models import Booking, Price, SupplementPrice, Capacity, CapacityHold, NightOccupancy, MobileHome, SeasonInfo, SupplementMobileHome, OtherPrice
 from django.utils.translation import gettext_lazy as _
 from parler.admin import TranslatableAdmin
 from django.conf import settings
@@ -36,6 +41,43 @@ class CapacityAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(NightOccupancy)
+class NightOccupancyAdmin(admin.ModelAdmin):
+    """
+    Read-only admin for the NightOccupancy ledger.
+    The ledger is maintained automatically; use the rebuild_occupancy command to recompute it.
+    """
+    list_display = ('night', 'booking_type', 'booked')
+    list_filter = ('booking_type', 'night')
+    ordering = ('night', 'booking_type')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CapacityHold)
+class CapacityHoldAdmin(admin.ModelAdmin):
+    """
+    Admin for CapacityHold: lists the places held during Stripe checkouts.
+    Holds expire on their own; deleting one frees its place immediately.
+    """
+    list_display = ('booking_type', 'start_date', 'end_date', 'expires_at', 'created_at')
+    list_filter = ('booking_type',)
+    ordering = ('expires_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(SupplementPrice)
 class SupplementPriceAdmin(admin.ModelAdmin):
     """Admin for the SupplementPrice model: display and manage extra pricing."""
@@ -171,6 +213,15 @@ class OtherPriceAdmin(TranslatableAdmin):
     )
 
 
+class BookingImportForm(forms.Form):
+    """Upload form of the booking import (BookingAdmin.import_view)."""
+    file = forms.FileField(
+        label="Fichier CSV",
+        help_text="Séparateur virgule ou point-virgule ; mêmes colonnes que l'export CSV ou noms des champs.",
+    )
+    dry_run = forms.BooleanField(required=False, label="Vérifier seulement (ne rien enregistrer)")
+
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     """
@@ -180,6 +231,9 @@ class BookingAdmin(admin.ModelAdmin):
     - Allows editing of deposit status directly from list view
     - Provides filters by type, electricity, deposit, and dates
     - Readonly fields: created_at_display, updated_at_display
+    - Actions to download the selected bookings as CSV or XLSX (streamed)
+    - CSV import page, linked from the change list
+    - Stored prices (snapshot taken at confirmation) in the list, with totals per season
     """
     list_display = (
         'last_name',
@@ -190,6 +244,9 @@ class BookingAdmin(admin.ModelAdmin):
         'booking_subtype',
         'electricity',
         'deposit_paid',
+        'nights',
+        'total_price',
+        'deposit_amount',
         'created_at_display',
         'updated_at_display',
     )
@@ -197,7 +254,66 @@ class BookingAdmin(admin.ModelAdmin):
     list_filter = ('booking_type', 'booking_subtype', 'electricity', 'deposit_paid', 'start_date', 'end_date')
     search_fields = ('last_name', 'first_name', 'email', 'phone')
     ordering = ('-created_at',)
-    readonly_fields = ('created_at_display', 'updated_at_display')
+    readonly_fields = ('created_at_display', 'updated_at_display') + Booking.PRICE_SNAPSHOT_FIELDS
+    actions = ['export_csv', 'export_xlsx', 'reprice']
+
+    @admin.action(description="Exporter en CSV", permissions=['view'])
+    def export_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+
+    @admin.action(description="Exporter en Excel (XLSX)", permissions=['view'])
+    def export_xlsx(self, request, queryset):
+        return export_response(queryset, 'xlsx')
+
+    @admin.action(description="Recalculer le prix avec les tarifs actuels", permissions=['change'])
+    def reprice(self, request, queryset):
+        bookings = list(queryset)
+        for booking in bookings:
+            booking.snapshot_price()
+        Booking.objects.bulk_update(bookings, Booking.PRICE_SNAPSHOT_FIELDS)
+        self.message_user(request, f"{len(bookings)} réservation(s) recalculée(s).")
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        # Actions and redirects return other responses
+        context = getattr(response, 'context_data', None)
+        if context and 'cl' in context:
+            context['revenue_by_season'] = Booking.revenue_by_season(context['cl'].queryset)
+        return response
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='bookings_booking_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Import bookings from a CSV file; every rejected row is listed with its error."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        report = None
+        form = BookingImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            dry_run = form.cleaned_data['dry_run']
+            try:
+                text = form.cleaned_data['file'].read().decode('utf-8-sig')
+                report = import_bookings(text, dry_run=dry_run)
+            except UnicodeDecodeError:
+                form.add_error('file', "Le fichier doit être encodé en UTF-8.")
+            except ValidationError as e:
+                form.add_error('file', e.messages[0])
+            else:
+                if report.created and not dry_run:
+                    self.message_user(request, f"{report.created} réservation(s) importée(s).")
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Importer des réservations",
+            'opts': self.model._meta,
+            'form': form,
+            'report': report,
+        }
+        return TemplateResponse(request, 'admin/bookings/booking/import.html', context)
 
     fieldsets = (
         ('Informations client', {
@@ -240,6 +356,10 @@ class BookingAdmin(admin.ModelAdmin):
             ),
             'description': "Ces champs apparaissent uniquement pour certains types d'hébergements."
         }),
+        ('Prix (figé à la confirmation)', {
+            'fields': Booking.PRICE_SNAPSHOT_FIELDS,
+            'description': "Recalculable avec les tarifs actuels par l'action de la liste des réservations."
+        }),
         ('Dates de création et de mise à jour', {
             'fields': ('created_at_display', 'updated_at_display')
         }),
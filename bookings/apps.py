@@ -8,3 +8,7 @@ class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookings'
     verbose_name = "Prix et Réservations"
+
+    def ready(self):
+        """Connect model signals (occupancy ledger upkeep)."""
+        from . import signals  # noqa: F401
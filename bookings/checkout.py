@@ -0,0 +1,84 @@
+"""
+Stripe Checkout sessions for the deposit.
+
+checkout_session_params() builds the session of a booking and its capacity
+hold: the session expires CHECKOUT_MARGIN before the hold, so a paid session
+always has its place, and its parameters only depend on the booking and the
+hold. checkout_idempotency_key() hashes the same inputs: submitting the
+details again (refresh, back button) while the hold is kept gives the same
+key, and Stripe returns the session it already created instead of a new one.
+
+create_checkout_session_async() is used by the async details view, under ASGI.
+It goes through a StripeClient using Stripe's httpx client, created once per
+event loop so its connection pool is reused by every request of the worker.
+"""
+import asyncio
+import hashlib
+import json
+import weakref
+from datetime import timedelta
+import stripe
+from django.conf import settings
+from django.urls import reverse
+from .wizard import WIZARD_FIELDS
+
+
+CHECKOUT_MARGIN = timedelta(minutes=5)
+
+# {event loop: StripeClient}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def checkout_expires_at(hold):
+    """Return the expiry timestamp of the Checkout session of a hold."""
+    return int((hold.expires_at - CHECKOUT_MARGIN).timestamp())
+
+
+def checkout_session_params(booking, deposit, hold):
+    """Return the parameters of the deposit Checkout session."""
+    return {
+        'payment_method_types': ['card'],
+        'line_items': [{
+            'price_data': {
+                'currency': 'eur',
+                'product_data': {
+                    'name': f"Acompte réservation camping ({booking.start_date} - {booking.end_date})",
+                },
+                'unit_amount': int(deposit * 100),  # Amount in cents
+            },
+            'quantity': 1,
+        }],
+        'mode': 'payment',
+        'success_url': f"{settings.SITE_URL}{reverse('booking_confirm')}",
+        'cancel_url': f"{settings.SITE_URL}{reverse('booking_details')}",
+        'customer_email': booking.email,
+        'expires_at': checkout_expires_at(hold),
+    }
+
+
+def checkout_idempotency_key(booking_data):
+    """Return the Stripe idempotency key of a wizard state (booking fields and hold token)."""
+    fields = {name: str(value) for name, value in booking_data.items() if name in WIZARD_FIELDS}
+    digest = hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+    return f"checkout-{digest}"
+
+
+def get_async_client(loop):
+    """Return the StripeClient of an event loop, created on first use."""
+    client = _async_clients.get(loop)
+    if client is None:
+        base_addresses = {'api': settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else None
+        client = _async_clients[loop] = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            http_client=stripe.HTTPXClient(),
+            base_addresses=base_addresses,
+        )
+    return client
+
+
+async def create_checkout_session_async(params, idempotency_key):
+    """Create a Checkout session without blocking the event loop."""
+    client = get_async_client(asyncio.get_running_loop())
+    # StripeClient.v1 only exists in recent versions of stripe-python
+    sessions = getattr(client, 'v1', client).checkout.sessions
+    return await sessions.create_async(params=params, options={'idempotency_key': idempotency_key})
@@ -0,0 +1,291 @@
+"""
+Streaming export of bookings (accountant, tourist tax declaration).
+
+export_rows() reads the bookings with queryset.iterator(), so memory stays
+constant however many seasons are exported. The amounts are those stored at
+confirmation (Booking.snapshot_price); bookings without them are priced a
+chunk at a time with quote_batch(), so no column costs a query per row.
+
+csv_stream() and xlsx_stream() turn the rows into bytes as they come: they
+are fed to a StreamingHttpResponse (BookingAdmin actions) or written to a
+file (export_bookings command), and the download starts with the first rows.
+The XLSX file is written without any dependency: a ZIP archive built on an
+unseekable buffer, with the worksheet streamed one row at a time.
+"""
+import csv
+import datetime
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .pricing import quote_batch
+
+
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_HEADERS = (
+    "Réservation", "Créée le", "Nom", "Prénom", "Email", "Téléphone", "Adresse", "Code postal", "Ville",
+    "Type", "Sous-type", "Arrivée", "Départ", "Nuits", "Adultes", "Enfants +8 ans", "Enfants -8 ans",
+    "Animaux", "Électricité", "Véhicules supplémentaires", "Tentes supplémentaires",
+    "Total", "Acompte", "Acompte payé", "Reste à payer",
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _quote_chunk(bookings):
+    """Return the rows of a chunk of bookings; those without a stored price are priced together."""
+    unpriced = [b for b in bookings if b.total_price is None]
+    quotes = quote_batch(
+        [b.booking_subtype or b.booking_type for b in unpriced],
+        [b.start_date for b in unpriced],
+        [b.end_date for b in unpriced],
+        [b.adults for b in unpriced],
+        [b.children_over_8 for b in unpriced],
+        [b.children_under_8 for b in unpriced],
+        [b.pets for b in unpriced],
+        [b.electricity for b in unpriced],
+        [b.extra_vehicle for b in unpriced],
+        [b.extra_tent for b in unpriced],
+    )
+    # In memory only, so remaining_balance gives the amount left of every booking
+    for booking, total, deposit in zip(unpriced, quotes.totals, quotes.deposits):
+        booking.total_price, booking.deposit_amount = Decimal(total), deposit
+
+    for booking in bookings:
+        yield (
+            booking.pk,
+            timezone.localtime(booking.created_at).date(),
+            booking.last_name,
+            booking.first_name,
+            booking.email,
+            booking.phone,
+            booking.address,
+            booking.postal_code,
+            booking.city,
+            booking.get_booking_type_display(),
+            booking.get_booking_subtype_display() or "",
+            booking.start_date,
+            booking.end_date,
+            booking.nights or max((booking.end_date - booking.start_date).days, 1),
+            booking.adults,
+            booking.children_over_8,
+            booking.children_under_8,
+            booking.pets,
+            "Oui" if booking.electricity == 'yes' else "Non",
+            booking.extra_vehicle,
+            booking.extra_tent,
+            booking.total_price,
+            booking.deposit_amount,
+            "Oui" if booking.deposit_paid else "Non",
+            booking.remaining_balance,
+        )
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one tuple per booking of queryset, in EXPORT_HEADERS order."""
+    chunk = []
+    for booking in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(booking)
+        if len(chunk) == chunk_size:
+            yield from _quote_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _quote_chunk(chunk)
+
+
+# ============================================
+# CSV
+# ============================================
+
+# First characters that make spreadsheet software read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_safe(value):
+    """Neutralize a text cell that would be run as a formula (=HYPERLINK(...)) by prefixing it with '."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_unescape(value):
+    """Undo csv_safe(), for files exported here and imported again."""
+    if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+class _Echo:
+    """File-like object returning what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows, headers=EXPORT_HEADERS):
+    """
+    Yield a CSV file as UTF-8 bytes, one line at a time.
+
+    Semicolon-separated with a BOM, which is what Excel opens directly with
+    French regional settings. Text cells go through csv_safe().
+    """
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff'.encode() + writer.writerow(headers).encode()
+    for row in rows:
+        yield writer.writerow([csv_safe(value) for value in row]).encode()
+
+
+# ============================================
+# XLSX
+# ============================================
+
+class _StreamBuffer:
+    """Unseekable write-only file collecting what zipfile writes, handed out by pop()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Cell style 1: dates (built-in format 14), style 2: amounts with 2 decimals (built-in format 2)
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '</styleSheet>'
+)
+
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+EXCEL_EPOCH = datetime.date(1899, 12, 30)
+
+# Control characters are not allowed in XML 1.0
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xlsx_cell(value):
+    """Return the <c> element of a value: dates and amounts get their number format."""
+    if value is None or value == "":
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, datetime.date):
+        return f'<c s="1"><v>{(value - EXCEL_EPOCH).days}</v></c>'
+    if isinstance(value, Decimal):
+        return f'<c s="2"><v>{value}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(INVALID_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+def xlsx_stream(rows, headers=EXPORT_HEADERS, sheet_name="Réservations", flush_rows=100):
+    """Yield an XLSX file as bytes, every flush_rows rows."""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(name=escape(sheet_name, {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', XLSX_STYLES)
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((XLSX_SHEET_START + xlsx_row(headers)).encode())
+            for count, row in enumerate(rows, 1):
+                sheet.write(xlsx_row(row).encode())
+                if count % flush_rows == 0:
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.pop()
+
+
+STREAMS = {'csv': csv_stream, 'xlsx': xlsx_stream}
+
+
+def export_response(queryset, export_format, filename="reservations"):
+    """Return a StreamingHttpResponse downloading the bookings of queryset."""
+    response = StreamingHttpResponse(
+        STREAMS[export_format](export_rows(queryset)),
+        content_type=CONTENT_TYPES[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,264 @@
+"""
+Bulk import of bookings from a CSV file (old register, bookings taken by phone).
+
+parse_bookings_csv() reads the file and validates each row on its own (fields,
+dates). check_capacities() then validates the capacity of every row in one
+pass: the occupancy of the whole period covered by the file is loaded once
+(NightOccupancy ledger and active CapacityHolds) into a per-night array per
+type, and each row is checked and added to it in file order. Every conflict
+is reported at once instead of one save at a time.
+
+import_bookings() runs both and inserts the valid rows with bulk_create, in
+batches, then updates the ledger with a few queries per type.
+
+The accepted columns are the field names of Booking or the headers of the
+CSV export (bookings.export), so an exported file can be imported again.
+"""
+import csv
+import datetime
+import io
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from django.core.exceptions import ValidationError
+from core.db import retry_on_lock
+from .export import EXPORT_HEADERS, csv_unescape
+from .models import Booking, Capacity, CapacityHold, NightOccupancy, occupied_nights
+
+
+IMPORT_BATCH_SIZE = 500
+
+IMPORT_FIELDS = (
+    'last_name', 'first_name', 'address', 'postal_code', 'city', 'phone', 'email',
+    'start_date', 'end_date', 'booking_type', 'booking_subtype', 'electricity', 'deposit_paid',
+    'adults', 'children_over_8', 'children_under_8', 'pets', 'extra_vehicle', 'extra_tent',
+)
+
+# Headers of the CSV export, for the columns that can be imported
+EXPORT_COLUMNS = dict(zip(EXPORT_HEADERS, (
+    None, None, 'last_name', 'first_name', 'email', 'phone', 'address', 'postal_code', 'city',
+    'booking_type', 'booking_subtype', 'start_date', 'end_date', None, 'adults', 'children_over_8',
+    'children_under_8', 'pets', 'electricity', 'extra_vehicle', 'extra_tent', None, None, 'deposit_paid', None,
+)))
+
+YES = {'oui', 'yes', 'true', '1', 'o', 'y'}
+NO = {'non', 'no', 'false', '0', 'n', ''}
+
+
+@dataclass
+class ImportReport:
+    """Outcome of an import: created bookings and {line number: error} of rejected rows."""
+    total: int = 0
+    created: int = 0
+    errors: dict = field(default_factory=dict)
+
+
+def column_map(headers):
+    """Return {header: Booking field} for the known columns of a CSV file."""
+    labels = {label.lower(): name for label, name in EXPORT_COLUMNS.items() if name}
+    labels.update({name: name for name in IMPORT_FIELDS})
+    return {header: labels[header.strip().lower()] for header in headers if header and header.strip().lower() in labels}
+
+
+def choice_value(value, choices):
+    """Return the key of a choice given as a key or as its label (as exported)."""
+    value = value.strip()
+    for key, label in choices:
+        if value.lower() in (key, str(label).lower()):
+            return key
+    return value
+
+
+def parse_date(value):
+    """Parse an ISO (AAAA-MM-JJ) or French (JJ/MM/AAAA) date."""
+    value = value.strip()
+    try:
+        if '/' in value:
+            return datetime.datetime.strptime(value, '%d/%m/%Y').date()
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError(f"Date invalide : {value!r}")
+
+
+def parse_bool(value):
+    value = value.strip().lower()
+    if value in YES:
+        return True
+    if value in NO:
+        return False
+    raise ValidationError(f"Valeur oui/non invalide : {value!r}")
+
+
+def build_booking(row):
+    """Return an unsaved Booking from a row of {field: text}, or raise ValidationError."""
+    values = {name: csv_unescape((text or '').strip()) for name, text in row.items()}
+
+    subtype = choice_value(values.pop('booking_subtype', ''), Booking.SUBTYPE_CHOICES) or None
+    booking_type = choice_value(values.pop('booking_type', ''), Booking.TYPE_CHOICES)
+    kwargs = {
+        'booking_subtype': subtype,
+        'booking_type': Booking.MAIN_TYPE_MAP.get(subtype, booking_type) if subtype else booking_type,
+        'electricity': 'yes' if parse_bool(values.pop('electricity', '')) else 'no',
+        'deposit_paid': parse_bool(values.pop('deposit_paid', '')),
+        'start_date': parse_date(values.pop('start_date', '')),
+        'end_date': parse_date(values.pop('end_date', '')),
+    }
+    for name in ('adults', 'children_over_8', 'children_under_8', 'pets', 'extra_vehicle', 'extra_tent'):
+        text = values.pop(name, '')
+        if text:
+            try:
+                kwargs[name] = int(text)
+            except ValueError:
+                raise ValidationError(f"Nombre invalide pour {Booking._meta.get_field(name).verbose_name} : {text!r}")
+    kwargs.update(values)
+
+    booking = Booking(**kwargs)
+    if booking.end_date <= booking.start_date:
+        raise ValidationError("La date de départ doit être postérieure à la date d'arrivée.")
+    booking.clean_fields()
+    return booking
+
+
+def error_message(error):
+    """Return a ValidationError as one line of text."""
+    if hasattr(error, 'error_dict'):
+        return " ; ".join(
+            f"{Booking._meta.get_field(name).verbose_name} : {' '.join(messages)}"
+            for name, messages in error.message_dict.items()
+        )
+    return " ".join(error.messages)
+
+
+def parse_bookings_csv(text):
+    """
+    Parse a CSV file (comma or semicolon separated).
+
+    Returns:
+        (list, dict): [(line number, Booking)] of valid rows, {line number: error} of the others
+    """
+    text = text.lstrip('\ufeff')
+    try:
+        dialect = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=';,')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    columns = column_map(reader.fieldnames or [])
+    missing = {'last_name', 'first_name', 'email', 'phone', 'start_date', 'end_date', 'electricity'} - set(columns.values())
+    if not {'booking_type', 'booking_subtype'} & set(columns.values()):
+        missing.add('booking_type')
+    if missing:
+        raise ValidationError(f"Colonnes manquantes : {', '.join(sorted(missing))}")
+
+    bookings, errors = [], {}
+    for row in reader:
+        line = reader.line_num
+        try:
+            bookings.append((line, build_booking({columns[header]: value for header, value in row.items() if header in columns})))
+        except ValidationError as e:
+            errors[line] = error_message(e)
+    return bookings, errors
+
+
+def check_capacities(bookings):
+    """
+    Check the capacity of every booking in one pass, in file order.
+
+    Each type gets an array of the places taken per night over the period of
+    the file, loaded from the ledger and the active holds; a booking is
+    accepted when none of its nights is full, and then added to the array.
+
+    Args:
+        bookings: [(line number, Booking)]
+
+    Returns:
+        (list, dict): accepted [(line number, Booking)], {line number: conflict}
+    """
+    if not bookings:
+        return [], {}
+
+    origin = min(booking.start_date for _, booking in bookings)
+    window_end = max(occupied_nights(booking.start_date, booking.end_date)[-1] for _, booking in bookings)
+    size = (window_end - origin).days + 1
+    types = {booking.booking_type for _, booking in bookings}
+
+    capacities = dict(Capacity.objects.filter(booking_type__in=types).values_list('booking_type', 'max_places'))
+    taken = {booking_type: [0] * size for booking_type in types}
+    for booking_type, night, booked in NightOccupancy.objects.filter(
+        booking_type__in=types, night__gte=origin, night__lte=window_end,
+    ).values_list('booking_type', 'night', 'booked'):
+        taken[booking_type][(night - origin).days] += booked
+    for booking_type, start_date, end_date in CapacityHold.active().filter(
+        booking_type__in=types, start_date__lte=window_end, end_date__gte=origin,
+    ).values_list('booking_type', 'start_date', 'end_date'):
+        for night in occupied_nights(start_date, end_date):
+            if origin <= night <= window_end:
+                taken[booking_type][(night - origin).days] += 1
+
+    accepted, conflicts = [], {}
+    for line, booking in bookings:
+        capacity = capacities.get(booking.booking_type)
+        if capacity is None:
+            conflicts[line] = f"La capacité pour {booking.booking_type} n'est pas définie."
+            continue
+
+        nights = taken[booking.booking_type]
+        first = (booking.start_date - origin).days
+        last = first + len(occupied_nights(booking.start_date, booking.end_date))
+        window = nights[first:last]
+        if max(window) >= capacity:
+            full_night = origin + datetime.timedelta(days=first + window.index(max(window)))
+            conflicts[line] = f"Complet la nuit du {full_night:%d/%m/%Y} ({booking.get_booking_type_display()}, {capacity} places)."
+            continue
+
+        nights[first:last] = [count + 1 for count in window]
+        accepted.append((line, booking))
+    return accepted, conflicts
+
+
+def record_nights(bookings, batch_size=IMPORT_BATCH_SIZE):
+    """Add inserted bookings to the NightOccupancy ledger, with a few queries per type."""
+    counts = defaultdict(Counter)
+    for booking in bookings:
+        main_type, start_date, end_date = booking.ledger_span()
+        counts[main_type].update(occupied_nights(start_date, end_date))
+
+    for main_type, nights in counts.items():
+        rows = NightOccupancy.objects.filter(booking_type=main_type, night__gte=min(nights), night__lte=max(nights))
+        existing = {row.night: row for row in rows if row.night in nights}
+        for night, row in existing.items():
+            row.booked += nights[night]
+        NightOccupancy.objects.bulk_update(existing.values(), ['booked'], batch_size=batch_size)
+        NightOccupancy.objects.bulk_create(
+            [NightOccupancy(booking_type=main_type, night=night, booked=booked)
+             for night, booked in nights.items() if night not in existing],
+            batch_size=batch_size,
+        )
+
+
+def import_bookings(text, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Import the valid rows of a CSV file; rows with an error or a capacity
+    conflict are skipped and reported.
+
+    The capacity check and the inserts run in one transaction, under the
+    write lock, so live checkouts cannot take the same places meanwhile.
+
+    Returns:
+        ImportReport
+    """
+    bookings, errors = parse_bookings_csv(text)
+    report = ImportReport(total=len(bookings) + len(errors), errors=errors)
+
+    @retry_on_lock
+    def insert():
+        accepted, conflicts = check_capacities(bookings)
+        if not dry_run:
+            for _, booking in accepted:
+                booking.snapshot_price()
+            created = Booking.objects.bulk_create([booking for _, booking in accepted], batch_size=batch_size)
+            record_nights(created, batch_size)
+        return accepted, conflicts
+
+    accepted, conflicts = insert()
+    report.errors = dict(sorted({**errors, **conflicts}.items()))
+    report.created = len(accepted)
+    return report
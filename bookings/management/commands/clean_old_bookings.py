@@ -1,10 +1,35 @@
-from django.core.management.base import BaseCommand
+import os
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from datetime import timedelta
 from bookings.models import Booking
+from core.batches import clear_checkpoint, pending, read_checkpoint, run_in_chunks
+
+ANONYMIZED = {
+    'last_name': 'Anonyme',
+    'first_name': 'Anonyme',
+    'address': 'Anonyme',
+    'postal_code': '00000',
+    'city': 'Anonyme',
+    'phone': '0000000000',
+    'email': 'anonyme@example.com',
+}
+
+DEFAULT_CHECKPOINT = os.path.join(tempfile.gettempdir(), 'maineblanc_clean_old_bookings.json')
+
+
+def anonymize(bookings):
+    bookings.update(**ANONYMIZED)
+
+
+def delete(bookings):
+    # Sends post_delete for each booking, which updates NightOccupancy
+    bookings.delete()
+
 
 class Command(BaseCommand):
-    help = 'Supprime ou anonymise les réservations de plus de 10 ans'
+    help = 'Supprime ou anonymise les réservations de plus de 10 ans, par lots (reprise possible après interruption)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -12,30 +37,82 @@ class Command(BaseCommand):
             action='store_true',
             help='Anonymise les réservations au lieu de les supprimer'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help="Nombre de réservations traitées par transaction (par défaut : 500)"
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.1,
+            help="Pause en secondes entre deux lots, pour laisser passer les réservations en ligne (par défaut : 0.1)"
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=DEFAULT_CHECKPOINT,
+            help="Fichier de reprise, mis à jour après chaque lot"
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Ignore le fichier de reprise et recommence depuis le début"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Affiche le nombre de réservations et de lots concernés sans rien modifier"
+        )
 
     def handle(self, *args, **options):
         # Define the limit date (10 years ago)
         limit_date = timezone.now() - timedelta(days=10*365)
-        anonymize = options['anonymize']
+        anonymizing = options['anonymize']
+        job = 'anonymize' if anonymizing else 'delete'
+        chunk_size = options['chunk_size']
+        checkpoint = options['checkpoint']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size doit être un entier positif.")
 
         old_bookings = Booking.objects.filter(created_at__lt=limit_date)
-        total = old_bookings.count()
+        if anonymizing:
+            # Already anonymized bookings are not rewritten on every run
+            old_bookings = old_bookings.exclude(email=ANONYMIZED['email'])
+
+        if options['restart']:
+            clear_checkpoint(checkpoint)
 
-        if total == 0:
+        if options['dry_run']:
+            last_pk = read_checkpoint(checkpoint, job)
+            total = pending(old_bookings, last_pk).count()
+            chunks = -(-total // chunk_size)
+            resume = f" (reprise après la réservation #{last_pk})" if last_pk is not None else ""
+            action = "anonymisées" if anonymizing else "supprimées"
+            self.stdout.write(f"{total} réservations seraient {action} en {chunks} lots de {chunk_size}{resume}.")
+            return
+
+        def progress(stats):
+            self.stdout.write(f"  lot {stats.chunks} : {stats.done}/{stats.total} réservations ({stats.rate:.0f}/s)")
+
+        stats = run_in_chunks(
+            old_bookings,
+            anonymize if anonymizing else delete,
+            job,
+            chunk_size=chunk_size,
+            pause=options['pause'],
+            checkpoint=checkpoint,
+            progress=progress,
+        )
+
+        if stats.done == 0:
             self.stdout.write("Aucune réservation ancienne à traiter.")
             return
 
-        if anonymize:
-            old_bookings.update(
-                last_name='Anonyme',
-                first_name='Anonyme',
-                address='Anonyme',
-                postal_code='00000',
-                city='Anonyme',
-                phone='0000000000',
-                email='anonyme@example.com'
-            )
-            self.stdout.write(f"{total} réservations ont été anonymisées.")
-        else:
-            deleted_count, _ = old_bookings.delete()
-            self.stdout.write(f"{deleted_count} réservations ont été supprimées.")
+        if stats.resumed_after is not None:
+            self.stdout.write(f"Reprise après la réservation #{stats.resumed_after}.")
+        action = "anonymisées" if anonymizing else "supprimées"
+        self.stdout.write(
+            f"{stats.done} réservations ont été {action} en {stats.chunks} lots "
+            f"({stats.elapsed:.1f} s, {stats.rate:.0f} réservations/s)."
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from bookings.query_plans import hot_querysets
+from core.db import explain_query_plan, find_full_scans
+
+class Command(BaseCommand):
+    help = "Affiche le plan d'exécution SQLite des requêtes fréquentes et signale les parcours complets de table"
+
+    def handle(self, *args, **options):
+        flagged = []
+        for name, queryset in hot_querysets().items():
+            plan = explain_query_plan(queryset)
+            scans = find_full_scans(plan)
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f"{name} : parcours complet de {', '.join(scans)}"))
+            else:
+                self.stdout.write(f"{name} :")
+            for step in plan:
+                self.stdout.write(f"    {step}")
+
+        if flagged:
+            raise CommandError(f"{len(flagged)} requête(s) parcourent une table entière.")
+        self.stdout.write("Aucun parcours complet de table.")
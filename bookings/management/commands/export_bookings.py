@@ -0,0 +1,62 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from bookings.export import EXPORT_CHUNK_SIZE, STREAMS, export_rows
+from bookings.models import Booking
+
+class Command(BaseCommand):
+    help = "Exporte les réservations en CSV ou XLSX (comptabilité, taxe de séjour), en flux continu"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help="Fichier de destination (.csv ou .xlsx)"
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(STREAMS),
+            help="Format du fichier (par défaut : d'après l'extension)"
+        )
+        parser.add_argument(
+            '--from',
+            dest='start',
+            type=datetime.date.fromisoformat,
+            help="Arrivées à partir de cette date (AAAA-MM-JJ)"
+        )
+        parser.add_argument(
+            '--to',
+            dest='end',
+            type=datetime.date.fromisoformat,
+            help="Arrivées avant cette date, exclue (AAAA-MM-JJ)"
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help=f"Nombre de réservations lues et tarifées à la fois (par défaut : {EXPORT_CHUNK_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        export_format = options['format'] or output.rsplit('.', 1)[-1].lower()
+        if export_format not in STREAMS:
+            raise CommandError("Format inconnu : utilisez --format csv ou --format xlsx.")
+
+        bookings = Booking.objects.order_by('start_date', 'pk')
+        if options['start']:
+            bookings = bookings.filter(start_date__gte=options['start'])
+        if options['end']:
+            bookings = bookings.filter(start_date__lt=options['end'])
+
+        rows = 0
+
+        def counted(iterable):
+            nonlocal rows
+            for row in iterable:
+                rows += 1
+                yield row
+
+        with open(output, 'wb') as f:
+            for data in STREAMS[export_format](counted(export_rows(bookings, options['chunk_size']))):
+                f.write(data)
+
+        self.stdout.write(f"{rows} réservations exportées dans {output}.")
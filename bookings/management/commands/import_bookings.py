@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from bookings.importer import IMPORT_BATCH_SIZE, import_bookings
+
+class Command(BaseCommand):
+    help = "Importe des réservations depuis un fichier CSV (registre papier, réservations par téléphone)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help="Fichier CSV (séparateur virgule ou point-virgule, mêmes colonnes que l'export)"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f"Nombre de réservations insérées par requête (par défaut : {IMPORT_BATCH_SIZE})"
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8-sig',
+            help="Encodage du fichier (par défaut : utf-8)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Vérifie le fichier et les capacités sans rien enregistrer"
+        )
+
+    def handle(self, *args, **options):
+        with open(options['file'], encoding=options['encoding'], newline='') as f:
+            text = f.read()
+
+        try:
+            report = import_bookings(text, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        except ValidationError as e:
+            raise CommandError(" ".join(e.messages))
+
+        for line, error in report.errors.items():
+            self.stdout.write(self.style.WARNING(f"  ligne {line} : {error}"))
+
+        action = "seraient importées" if options['dry_run'] else "importées"
+        self.stdout.write(f"{report.created}/{report.total} réservations {action}, {len(report.errors)} rejetées.")
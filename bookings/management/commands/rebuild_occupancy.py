@@ -0,0 +1,36 @@
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from bookings.models import Booking, NightOccupancy, occupied_nights
+
+class Command(BaseCommand):
+    help = "Reconstruit entièrement le registre d'occupation par nuit à partir des réservations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Nombre de lignes insérées par requête"
+        )
+
+    def handle(self, *args, **options):
+        counts = Counter()
+        bookings = Booking.objects.order_by().values_list('booking_type', 'start_date', 'end_date')
+
+        for booking_type, start_date, end_date in bookings.iterator():
+            main_type = Booking.MAIN_TYPE_MAP.get(booking_type, booking_type)
+            for night in occupied_nights(start_date, end_date):
+                counts[(main_type, night)] += 1
+
+        with transaction.atomic():
+            NightOccupancy.objects.all().delete()
+            NightOccupancy.objects.bulk_create(
+                [
+                    NightOccupancy(booking_type=booking_type, night=night, booked=booked)
+                    for (booking_type, night), booked in counts.items()
+                ],
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(f"{len(counts)} nuits recalculées.")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from bookings.models import Booking
+from core.batches import run_in_chunks
+
+
+def snapshot(bookings):
+    bookings = list(bookings)
+    for booking in bookings:
+        booking.snapshot_price()
+    Booking.objects.bulk_update(bookings, Booking.PRICE_SNAPSHOT_FIELDS)
+
+
+class Command(BaseCommand):
+    help = "Enregistre le prix des réservations qui n'en ont pas encore (calculé avec les tarifs actuels), par lots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help="Nombre de réservations traitées par transaction (par défaut : 500)"
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.1,
+            help="Pause en secondes entre deux lots (par défaut : 0.1)"
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size doit être un entier positif.")
+
+        # Resumes by itself: priced bookings no longer match
+        stats = run_in_chunks(
+            Booking.objects.filter(total_price__isnull=True),
+            snapshot,
+            'snapshot_prices',
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+        )
+        self.stdout.write(
+            f"{stats.done} réservations tarifées en {stats.chunks} lots "
+            f"({stats.elapsed:.1f} s, {stats.rate:.0f} réservations/s)."
+        )
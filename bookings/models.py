@@ -1,16 +1,34 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractYear
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, RegexValidator, EmailValidator
-from decimal import Decimal
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.utils import formats
 from parler.models import TranslatableModel, TranslatedFields
 import datetime
-import deepl
+import uuid
+from collections import Counter
 from django.utils.text import slugify
-    
+from .pricing import Quote, base_price_field, deposit_for, extras_breakdown, get_pricing_snapshot
+from .seasons import get_season_calendar, season_segments
+from core.db import retry_on_lock
+from core.site_config import get_singleton
+from core.translation_memory import translate_texts
+
+
+def occupied_nights(start_date, end_date):
+    """
+    Return the list of nights (as dates) occupied by a stay.
+
+    A stay occupies every night from start_date up to the night before end_date.
+    Same-day stays are billed as one night, so they occupy the start_date night.
+    """
+    nights = max((end_date - start_date).days, 1)
+    return [start_date + datetime.timedelta(days=i) for i in range(nights)]
+
 
 class SupplementPrice(models.Model):
     """
@@ -118,7 +136,7 @@ class Price(models.Model):
             self.included_people = 1 
         
         if not self.supplements:
-            supplement = SupplementPrice.objects.first()
+            supplement = get_singleton(SupplementPrice)
             if not supplement:
                 supplement = SupplementPrice.objects.create()
             self.supplements = supplement
@@ -223,6 +241,248 @@ class Capacity(models.Model):
         """Return a human-readable label including capacity info."""
         return f"{self.get_booking_type_display()} - {self.max_places} emplacements"
 
+
+class NightOccupancy(models.Model):
+    """
+    Materialized per-night occupancy ledger, one row per (main type, night).
+
+    Fields:
+        - booking_type: main type (tent, caravan, camping_car)
+        - night: the night being counted
+        - booked: number of bookings occupying a place that night
+
+    Kept up to date incrementally by Booking.save() and the booking post_delete
+    signal, and rebuilt from scratch by the rebuild_occupancy command.
+    Queryset .update() and bulk_update() of booking dates or types bypass
+    save(): run rebuild_occupancy after them.
+
+    A same-day stay (start_date == end_date) is billed as one night and
+    occupies the start_date night, whereas the former overlap query only
+    counted it against stays spanning that date.
+
+    Security:
+        - Only numeric and date fields
+        - Never edited from user input
+    """
+    booking_type = models.CharField(max_length=20, choices=Price.TYPE_CHOICES, verbose_name="Type d'emplacement")
+    night = models.DateField(verbose_name="Nuit")
+    booked = models.PositiveIntegerField(default=0, verbose_name="Emplacements réservés")
+
+    class Meta:
+        verbose_name = "Occupation par nuit"
+        verbose_name_plural = "Occupations par nuit"
+        constraints = [
+            models.UniqueConstraint(fields=['booking_type', 'night'], name='unique_night_occupancy'),
+        ]
+
+    def __str__(self):
+        """Return a human-readable label including the night and count."""
+        return f"{self.get_booking_type_display()} - {self.night} : {self.booked}"
+
+    @classmethod
+    def apply(cls, booking_type, nights, delta):
+        """
+        Add delta (positive or negative) to the counters of the given nights.
+        Missing rows are created for positive deltas only.
+        """
+        if not nights or not delta:
+            return
+
+        with transaction.atomic():
+            rows = cls.objects.filter(booking_type=booking_type, night__in=nights)
+            existing = set(rows.values_list('night', flat=True))
+            if delta < 0:
+                rows = rows.filter(booked__gte=-delta)
+            rows.update(booked=F('booked') + delta)
+
+            if delta > 0:
+                cls.objects.bulk_create([
+                    cls(booking_type=booking_type, night=night, booked=delta)
+                    for night in nights if night not in existing
+                ])
+
+    @classmethod
+    def availability(cls, start_date, end_date, booking_types):
+        """
+        Return remaining places per main type for every night in [start_date, end_date).
+
+        Uses one query for the capacities, one for the ledger rows and one for
+        the active CapacityHolds, which count as booked.
+        Types without a Capacity row are reported as full.
+
+        Returns:
+            dict: {booking_type: [remaining for each night]}
+        """
+        night_count = (end_date - start_date).days
+        capacities = dict(
+            Capacity.objects.filter(booking_type__in=booking_types).values_list('booking_type', 'max_places')
+        )
+        remaining = {
+            booking_type: [capacities.get(booking_type, 0)] * night_count
+            for booking_type in booking_types
+        }
+
+        rows = cls.objects.filter(
+            booking_type__in=booking_types,
+            night__gte=start_date,
+            night__lt=end_date,
+        ).values_list('booking_type', 'night', 'booked')
+
+        for booking_type, night, booked in rows:
+            index = (night - start_date).days
+            remaining[booking_type][index] = max(remaining[booking_type][index] - booked, 0)
+
+        holds = CapacityHold.active().filter(
+            booking_type__in=booking_types,
+            start_date__lt=end_date,
+            end_date__gte=start_date,
+        ).values_list('booking_type', 'start_date', 'end_date')
+
+        for booking_type, hold_start, hold_end in holds:
+            for night in occupied_nights(hold_start, hold_end):
+                index = (night - start_date).days
+                if 0 <= index < night_count:
+                    remaining[booking_type][index] = max(remaining[booking_type][index] - 1, 0)
+
+        return remaining
+
+    @classmethod
+    def booked_by_night(cls, booking_type, nights):
+        """Return a {night: booked} dict for the given nights (bounded range lookup)."""
+        if not nights:
+            return {}
+        return dict(
+            cls.objects.filter(
+                booking_type=booking_type,
+                night__gte=nights[0],
+                night__lte=nights[-1],
+            ).values_list('night', 'booked')
+        )
+
+class CapacityHold(models.Model):
+    """
+    Short-lived reservation of one place, taken when the Stripe Checkout session is
+    created and released when the booking is confirmed or when it expires.
+
+    Fields:
+        - booking_type: main type (tent, caravan, camping_car)
+        - start_date, end_date: stay being held
+        - token: random identifier kept in the signed booking wizard state
+        - expires_at: the hold stops counting after this time
+        - created_at: creation timestamp
+
+    Active holds count against capacity in Booking.check_capacity() and in
+    NightOccupancy.availability(), so concurrent checkouts cannot sell the same
+    last place twice. Expired holds are purged on the next acquire().
+
+    Security:
+        - Never edited from user input
+        - Acquired under the database write lock (see acquire)
+    """
+    DURATION = datetime.timedelta(minutes=35)
+
+    booking_type = models.CharField(max_length=20, choices=Price.TYPE_CHOICES, verbose_name="Type d'emplacement")
+    start_date = models.DateField(verbose_name="Date d'arrivée")
+    end_date = models.DateField(verbose_name="Date de départ")
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name="Jeton")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Expire le")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+
+    class Meta:
+        verbose_name = "Blocage temporaire"
+        verbose_name_plural = "Blocages temporaires"
+
+    def __str__(self):
+        """Return a human-readable label including the dates and expiry."""
+        return f"{self.get_booking_type_display()} ({self.start_date} to {self.end_date}) - {self.expires_at:%H:%M}"
+
+    @classmethod
+    def active(cls):
+        """Return the holds that have not expired yet."""
+        return cls.objects.filter(expires_at__gt=timezone.now())
+
+    @classmethod
+    def held_by_night(cls, booking_type, nights, exclude_token=None):
+        """Return a {night: held} Counter of active holds for the given nights."""
+        if not nights:
+            return Counter()
+        holds = cls.active().filter(
+            booking_type=booking_type,
+            start_date__lte=nights[-1],
+            end_date__gte=nights[0],
+        )
+        if exclude_token:
+            holds = holds.exclude(token=exclude_token)
+
+        wanted = set(nights)
+        held = Counter()
+        for start_date, end_date in holds.values_list('start_date', 'end_date'):
+            held.update(night for night in occupied_nights(start_date, end_date) if night in wanted)
+        return held
+
+    @classmethod
+    def acquire(cls, booking_type, start_date, end_date, replace_token=None):
+        """
+        Check capacity and hold one place for the stay, atomically.
+
+        The transaction starts with BEGIN IMMEDIATE (settings.SQLITE_OPTIONS), so
+        SQLite takes its write lock up front: concurrent acquires run one after
+        the other and each sees the holds of the previous ones. Other databases
+        lock the Capacity row. "Database is locked" errors are retried with a
+        jittered backoff (retry_on_lock).
+
+        replace_token is the previous hold of the same customer (e.g. when they
+        come back from Stripe or submit the details again): it is returned as
+        is while it is active and covers the same stay, and released otherwise.
+        Keeping it keeps the Stripe session parameters, and so its idempotency
+        key, unchanged.
+
+        Raises ValidationError if the stay no longer fits.
+        """
+        main_type = Booking.MAIN_TYPE_MAP.get(booking_type, booking_type)
+
+        @retry_on_lock
+        def hold():
+            now = timezone.now()
+            cls.objects.filter(expires_at__lte=now).delete()
+            if replace_token:
+                previous = cls.objects.filter(token=replace_token).first()
+                if previous and (previous.booking_type, previous.start_date, previous.end_date) == (main_type, start_date, end_date):
+                    return previous
+                cls.objects.filter(token=replace_token).delete()
+            list(Capacity.objects.select_for_update().filter(booking_type=main_type))
+
+            Booking(booking_type=main_type, start_date=start_date, end_date=end_date).check_capacity()
+            return cls.objects.create(
+                booking_type=main_type,
+                start_date=start_date,
+                end_date=end_date,
+                expires_at=now + cls.DURATION,
+            )
+
+        return hold()
+
+    @classmethod
+    def release(cls, token):
+        """Delete the hold with the given token, if it still exists."""
+        if token:
+            cls.objects.filter(token=token).delete()
+
+    @classmethod
+    def consume(cls, token):
+        """
+        Delete the active hold with the given token, when its booking is saved.
+
+        Returns True if an active hold was deleted. Run it in the transaction
+        that saves the booking: a second confirmation with the same token, or
+        one coming after the hold expired, gets False and must check the
+        capacity again.
+        """
+        if not token:
+            return False
+        deleted, _ = cls.active().filter(token=token).delete()
+        return deleted > 0
+
 class Booking(models.Model):
     """
     Stores client booking information.
@@ -232,14 +492,20 @@ class Booking(models.Model):
         - Reservation info: start_date, end_date, booking_type, booking_subtype, electricity
         - Counts: adults, children_over_8, children_under_8, pets
         - Extras: extra_vehicle, extra_tent, deposit_paid
+        - Price snapshot: nights, base_price, supplements_price, price_breakdown, total_price,
+          deposit_amount, pricing_version, priced_at
+        - hold_token: capacity hold confirmed by the booking (single-use confirmation)
         - Timestamps: created_at, updated_at
 
     Methods:
-        - get_season(): determines season based on start_date
-        - calculate_total_price(): calculates total cost including supplements
+        - get_season(): determines season of start_date from the SeasonInfo calendar
+        - calculate_total_price(): calculates total cost, each night at its own season, including supplements
         - calculate_deposit(): calculates 15% deposit
-        - save(): auto-assigns main type, included_people, supplements
-        - check_capacity(): checks if capacity is available
+        - quote(): prices the booking with today's tariffs, with the details of the price
+        - snapshot_price(): stores the quote on the booking
+        - save(): auto-assigns main type, included_people, supplements, stores the price
+          snapshot of a new booking (again when its pricing inputs change) and updates NightOccupancy
+        - check_capacity(): checks if capacity is available using NightOccupancy
         - clean(): validates business rules and capacity
 
     Security:
@@ -303,9 +569,33 @@ class Booking(models.Model):
     extra_vehicle = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)], verbose_name="Véhicule supplémentaire")
     extra_tent = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)], verbose_name="Tente supplémentaire")
 
+    # Price snapshot, taken when the booking is first saved or its pricing inputs change (see snapshot_price)
+    nights = models.PositiveIntegerField(null=True, blank=True, verbose_name="Nuits")
+    base_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Prix des nuits")
+    supplements_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Suppléments")
+    price_breakdown = models.JSONField(default=dict, blank=True, verbose_name="Détail des suppléments")
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Prix total")
+    deposit_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Acompte")
+    pricing_version = models.CharField(max_length=16, blank=True, verbose_name="Version des tarifs")
+    priced_at = models.DateTimeField(null=True, blank=True, verbose_name="Tarifé le")
+
+    # Token of the CapacityHold confirmed by this booking: a wizard state can only be confirmed once
+    hold_token = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name="Jeton de confirmation")
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Mis à jour le")
 
+    PRICE_SNAPSHOT_FIELDS = (
+        'nights', 'base_price', 'supplements_price', 'price_breakdown',
+        'total_price', 'deposit_amount', 'pricing_version', 'priced_at',
+    )
+
+    # Fields the price depends on: changing one of them prices the booking again on save
+    PRICING_INPUT_FIELDS = (
+        'booking_type', 'booking_subtype', 'start_date', 'end_date', 'electricity',
+        'adults', 'children_over_8', 'children_under_8', 'pets', 'extra_vehicle', 'extra_tent',
+    )
+
     MAIN_TYPE_MAP = {
         'tent': 'tent',
         'car_tent': 'tent',
@@ -319,6 +609,12 @@ class Booking(models.Model):
         verbose_name = "Réservation"
         verbose_name_plural = "Réservations"
         ordering = ['-created_at']
+        # Access paths checked by the explain_queries command
+        indexes = [
+            models.Index(fields=['booking_type', 'start_date', 'end_date'], name='booking_type_dates_idx'),
+            models.Index(fields=['created_at'], name='booking_created_at_idx'),
+            models.Index(fields=['email'], name='booking_email_idx'),
+        ]
 
     def created_at_display(self):
         """Format creation date for admin display."""
@@ -337,142 +633,199 @@ class Booking(models.Model):
     updated_at_display.short_description = "Mis à jour le"
 
     def get_season(self):
-        """Determine season based on start_date."""
-        month, day = self.start_date.month, self.start_date.day
-        if (month >= 9 and day >= 27) or (month <= 4 and day <= 26):
-            return 'low'
-        elif (month >= 7 and day >= 5) and (month <= 8 and day <= 30):
-            return 'high'
-        else:
-            return 'mid'
+        """Determine season of start_date from the SeasonInfo calendar."""
+        return get_season_calendar(self.start_date.year).season_for(self.start_date)
 
-    def calculate_total_price(self, supplement=None):
+    def quote(self, supplement=None):
         """
-        Calculate total price including extras and supplements.
+        Price the booking, with the details of the price.
         Ensures nights >= 1 and applies correct base price depending on booking_type and electricity.
+        Each night is priced at its own season: the stay is split into season segments,
+        so a stay crossing from mid to high season is priced per segment.
+        Prices are read from the in-process pricing snapshot, so quoting needs no query.
+
+        Returns:
+            Quote(nights, base_price, supplements, total, deposit, pricing_version),
+            supplements being {supplement: amount}. A missing Price gives a total of 0.
         """
         nights = max((self.end_date - self.start_date).days, 1)
 
-        subtype_to_type_map = {
-            'tent': 'tent',
-            'car_tent': 'tent',
-            'caravan': 'caravan',
-            'fourgon': 'caravan',
-            'van': 'caravan',
-            'camping_car': 'camping_car',
-        }
-
-        booking_type_for_price = subtype_to_type_map.get(self.booking_subtype, self.booking_type)
-        season = self.get_season()
-        try:
-            price = Price.objects.get(
-                booking_type=booking_type_for_price,
-                is_worker=False,
-                season=season
-            )
-        except Price.DoesNotExist:
-            return 0
+        booking_type_for_price = self.MAIN_TYPE_MAP.get(self.booking_subtype, self.booking_type)
+        snapshot = get_pricing_snapshot()
 
         if supplement is None:
-            supplement = Price.objects.first().supplements if Price.objects.exists() else None
-        electricity_yes = self.electricity == 'yes'
-
-        included_people = price.included_people if price else 1
+            supplement = snapshot.supplement
 
         # Base price
-        if booking_type_for_price == 'camping_car':
-            base_price = price.price_2_persons_with_electricity if electricity_yes else price.price_2_persons_without_electricity
-            included_people = 2
-        else:
-            included_people = 2 if self.adults >= 2 else 1
-            if self.adults >= 2:
-                base_price = price.price_2_persons_with_electricity if electricity_yes else price.price_2_persons_without_electricity
-            else:
-                base_price = price.price_1_person_with_electricity if electricity_yes else price.price_1_person_without_electricity
+        base_field, included_people = base_price_field(booking_type_for_price, self.adults, self.electricity == 'yes')
 
-        total = (base_price or 0) * nights
+        base_price = 0
+        for season, season_nights in season_segments(self.start_date, self.end_date):
+            price = snapshot.get_price(booking_type_for_price, season)
+            if price is None:
+                return Quote(nights, 0, {}, 0, deposit_for(0), snapshot.fingerprint)
+            base_price += (getattr(price, base_field) or 0) * season_nights
 
         # Add extras
-        extra_adults = max(self.adults - included_people, 0)
-        if supplement:
-            total += extra_adults * (supplement.extra_adult_price or 0) * nights
-            total += self.children_over_8 * (supplement.child_over_8_price or 0) * nights
-            total += self.children_under_8 * (supplement.child_under_8_price or 0) * nights
-            total += self.pets * (supplement.pet_price or 0) * nights
-            total += self.extra_vehicle * (supplement.extra_vehicle_price or 0) * nights
-            total += self.extra_tent * (supplement.extra_tent_price or 0) * nights
-
-        return round(total, 2)
-    
+        supplements = extras_breakdown(
+            supplement,
+            nights,
+            max(self.adults - included_people, 0),
+            self.children_over_8,
+            self.children_under_8,
+            self.pets,
+            self.extra_vehicle,
+            self.extra_tent,
+        )
 
-    def calculate_deposit(self):
-        """Calculate 15% deposit of total price, rounded to 2 decimals."""
-        total_price = self.calculate_total_price()
-        return round(total_price * Decimal('0.15'), 2)
+        total = round(base_price + sum(supplements.values()), 2)
+        return Quote(nights, base_price, supplements, total, deposit_for(total), snapshot.fingerprint)
+
+    def calculate_total_price(self, supplement=None):
+        """Calculate total price with today's tariffs, including extras and supplements (see quote)."""
+        return self.quote(supplement).total
+
+    def snapshot_price(self):
+        """
+        Store the quote of the booking (nights, prices, deposit, tariffs used).
+        Reports and admin lists read these fields instead of pricing the booking
+        again, so they keep the price the customer agreed to after a tariff change.
+        """
+        quote = self.quote()
+        self.nights = quote.nights
+        self.base_price = round(quote.base_price, 2)
+        self.supplements_price = round(sum(quote.supplements.values()), 2)
+        self.price_breakdown = {name: str(round(amount, 2)) for name, amount in quote.supplements.items()}
+        self.total_price = quote.total
+        self.deposit_amount = quote.deposit
+        self.pricing_version = quote.pricing_version
+        self.priced_at = timezone.now()
+
+    @classmethod
+    def revenue_by_season(cls, bookings=None):
+        """
+        Sum the stored prices per season (year of arrival), in one GROUP BY query.
+
+        Returns:
+            list[dict]: {'season', 'bookings', 'nights', 'total', 'deposits'} per season
+        """
+        bookings = cls.objects.all() if bookings is None else bookings
+        return list(
+            bookings.order_by()
+            .annotate(season=ExtractYear('start_date'))
+            .values('season')
+            .annotate(bookings=Count('pk'), nights=Sum('nights'), total=Sum('total_price'), deposits=Sum('deposit_amount'))
+            .order_by('season')
+        )
+
+    @property
+    def remaining_balance(self):
+        """Amount left to pay on arrival, from the price snapshot."""
+        if self.total_price is None:
+            return None
+        return self.total_price - self.deposit_amount if self.deposit_paid else self.total_price
+
+    def calculate_deposit(self, total_price=None):
+        """
+        Calculate 15% deposit of total price, rounded to 2 decimals.
+        Pass an already computed total_price to avoid pricing the booking twice.
+        """
+        if total_price is None:
+            total_price = self.calculate_total_price()
+        return deposit_for(total_price)
 
 
     def save(self, *args, **kwargs):
         """
         Automatically sets booking_type from booking_subtype, included_people,
         and assigns a SupplementPrice if missing.
+        Keeps the NightOccupancy ledger in sync with the saved dates and type.
         """
-
-        MAIN_TYPE_MAP = {
-            'tent': 'tent',
-            'car_tent': 'tent',
-            'caravan': 'caravan',
-            'fourgon': 'caravan',
-            'van': 'caravan',
-            'camping_car': 'camping_car',
-        }
-
         if self.booking_subtype:
-            self.booking_type = MAIN_TYPE_MAP.get(self.booking_subtype, self.booking_subtype)
+            self.booking_type = self.MAIN_TYPE_MAP.get(self.booking_subtype, self.booking_subtype)
         if self.booking_type == 'camping_car':
             self.included_people = 2
         else:
             self.included_people = 1 
         
         if not hasattr(self, 'supplements') or self.supplements is None:
-            self.supplements = SupplementPrice.objects.first()
-
-        super().save(*args, **kwargs)
-
-    def check_capacity(self):
+            self.supplements = get_singleton(SupplementPrice)
+
+        with transaction.atomic():
+            stored = self.stored_pricing_inputs()
+            if self.start_date and self.end_date:
+                # A new booking, or one whose stay or party changed (e.g. in the admin), is priced again
+                if self.total_price is None or (stored and any(
+                    getattr(self, name) != value for name, value in stored.items()
+                )):
+                    self.snapshot_price()
+                self.nights = max((self.end_date - self.start_date).days, 1)
+
+            previous_span = self._span(stored)
+            super().save(*args, **kwargs)
+            current_span = self.ledger_span()
+
+            if previous_span != current_span:
+                if previous_span:
+                    NightOccupancy.apply(previous_span[0], occupied_nights(*previous_span[1:]), -1)
+                NightOccupancy.apply(current_span[0], occupied_nights(*current_span[1:]), 1)
+
+    def ledger_span(self):
+        """Return the (main type, start_date, end_date) occupied by this booking."""
+        main_type = self.MAIN_TYPE_MAP.get(self.booking_type, self.booking_type)
+        return (main_type, self.start_date, self.end_date)
+
+    def stored_pricing_inputs(self):
+        """Return the {field: value} of PRICING_INPUT_FIELDS stored in the database for this booking, if any."""
+        if self.pk is None:
+            return None
+        return Booking.objects.filter(pk=self.pk).values(*self.PRICING_INPUT_FIELDS).first()
+
+    def _span(self, stored):
+        """Return the ledger span of stored pricing inputs, or None."""
+        if stored is None:
+            return None
+        booking_type = stored['booking_type']
+        return (self.MAIN_TYPE_MAP.get(booking_type, booking_type), stored['start_date'], stored['end_date'])
+
+    def stored_ledger_span(self):
+        """Return the span currently recorded in the database for this booking, if any."""
+        return self._span(self.stored_pricing_inputs())
+
+    def check_capacity(self, hold_token=None):
         """
         Checks availability for given dates and booking type.
+        Looks up at most one NightOccupancy row per night of the stay, so the cost
+        does not depend on how many bookings have been made.
+        Active CapacityHolds count as booked, except the one given by hold_token.
         Raises ValidationError if capacity exceeded.
         """
-        MAIN_TYPE_MAP = {
-            'tent': 'tent',
-            'car_tent': 'tent',
-            'caravan': 'caravan',
-            'fourgon': 'caravan',
-            'van': 'caravan',
-            'camping_car': 'camping_car',
-        }
-
         if self.start_date is None or self.end_date is None:
             raise ValidationError(_("Les dates de réservations sont requises pour vérifier la disponibilité."))
         
-        main_type = MAIN_TYPE_MAP.get(self.booking_type, self.booking_type)
+        main_type = self.MAIN_TYPE_MAP.get(self.booking_type, self.booking_type)
 
         try:
             capacity = Capacity.objects.get(booking_type=main_type).max_places
         except Capacity.DoesNotExist:
             raise ValidationError(_("La capacité pour %(type)s n'est pas définie.") % {'type': main_type})
-    
-        overlapping = Booking.objects.filter(
-            booking_type__in=[key for key, value in MAIN_TYPE_MAP.items() if value == main_type],
-            start_date__lt=self.end_date,
-            end_date__gt=self.start_date
-        ).exclude(pk=self.pk)  
-
-        if overlapping.count() >= capacity:
-            raise ValidationError(
-                _("Plus de places disponibles pour ces dates. "
-                "Veuillez choisir d'autres dates ou contacter le camping.")
-            )
+
+        nights = occupied_nights(self.start_date, self.end_date)
+        booked = NightOccupancy.booked_by_night(main_type, nights)
+        held = CapacityHold.held_by_night(main_type, nights, exclude_token=hold_token)
+
+        # Do not count this booking against itself when it is being edited
+        own_nights = set()
+        stored_span = self.stored_ledger_span()
+        if stored_span and stored_span[0] == main_type:
+            own_nights = set(occupied_nights(*stored_span[1:]))
+
+        for night in nights:
+            if booked.get(night, 0) + held[night] - (night in own_nights) >= capacity:
+                raise ValidationError(
+                    _("Plus de places disponibles pour ces dates. "
+                    "Veuillez choisir d'autres dates ou contacter le camping.")
+                )
 
     def clean(self):
         """
@@ -483,7 +836,7 @@ class Booking(models.Model):
         """
         super().clean()
 
-        self.check_capacity()
+        self.check_capacity(hold_token=self.hold_token)
 
         if self.booking_type == "camping_car":
             pass
@@ -592,20 +945,27 @@ class MobileHome(models.Model):
         """
         Automatically translate name and description to multiple languages using DeepL.
         Only executed if DEEPL_API_KEY is set and description_text is provided.
+        Translations go through the translation memory: known texts cost no API call.
         """
         if settings.DEEPL_API_KEY and self.description_text:
             try:
-                translator = deepl.Translator(settings.DEEPL_API_KEY)
-
-                # Traduction noms
-                for lang, field in [('EN-GB','name_en'), ('ES','name_es'), ('DE','name_de'), ('NL','name_nl')]:
-                    if not getattr(self, field, None):
-                        setattr(self, field, translator.translate_text(self.name, target_lang=lang).text)
-
-                # Traduction descriptions
-                for lang, field in [('EN-GB','description_en'), ('ES','description_es'), ('DE','description_de'), ('NL','description_nl')]:
-                    if not getattr(self, field, None):
-                        setattr(self, field, translator.translate_text(self.description_text, target_lang=lang).text)
+                # Missing name and description translations, one DeepL call per language at most
+                for lang, name_field, description_field in [
+                    ('EN-GB', 'name_en', 'description_en'),
+                    ('ES', 'name_es', 'description_es'),
+                    ('DE', 'name_de', 'description_de'),
+                    ('NL', 'name_nl', 'description_nl'),
+                ]:
+                    pending = [
+                        (field, source)
+                        for field, source in [(name_field, self.name), (description_field, self.description_text)]
+                        if not getattr(self, field, None)
+                    ]
+                    if not pending:
+                        continue
+                    translations = translate_texts([source for _, source in pending], target_lang=lang, source_lang="FR")
+                    for (field, _), translated in zip(pending, translations):
+                        setattr(self, field, translated)
 
             except Exception as e:
                 # logger.warning(f"DeepL translation failed: {e}")
@@ -0,0 +1,316 @@
+"""
+In-process pricing snapshot.
+
+Every Price row (keyed by type, season and worker flag), the SupplementPrice
+rows and the OtherPrice values are compiled once per process into immutable
+named tuples, so quoting a booking does not hit the database.
+
+The snapshot is versioned: bookings.signals bumps the version whenever one of
+the pricing models is saved or deleted (e.g. from the admin), and the next
+quote rebuilds it. The shared site configuration version is part of it, so
+the other workers rebuild their snapshot too.
+
+Each snapshot also has a fingerprint of its tariffs, stored with the price
+of a booking (Booking.pricing_version) to tell which tariffs it was quoted
+with. Unlike the version, it is the same in every worker and after a restart.
+
+quote_batch() prices many stays at once from per-night prefix-sum arrays and
+returns exactly what Booking.calculate_total_price() / calculate_deposit()
+would return for each stay.
+
+rates_matrix() lays the same snapshot out for the public rates page.
+"""
+import datetime
+import hashlib
+import threading
+from collections import namedtuple
+from decimal import Decimal
+from types import MappingProxyType
+from django.conf import settings
+from core.site_config import config_version, get_singleton
+
+
+PRICE_FIELDS = (
+    'booking_type',
+    'season',
+    'is_worker',
+    'included_people',
+    'price_1_person_with_electricity',
+    'price_2_persons_with_electricity',
+    'price_1_person_without_electricity',
+    'price_2_persons_without_electricity',
+    'worker_week_price',
+    'weekend_price_without_electricity',
+    'weekend_price_with_electricity',
+)
+
+SUPPLEMENT_FIELDS = (
+    'extra_adult_price',
+    'child_over_8_price',
+    'child_under_8_price',
+    'pet_price',
+    'extra_vehicle_price',
+    'extra_tent_price',
+    'visitor_price_without_swimming_pool',
+    'visitor_price_with_swimming_pool',
+)
+
+OTHER_PRICE_FIELDS = (
+    'current_year',
+    'tourist_tax_date',
+    'price_tourist_tax',
+)
+
+PriceEntry = namedtuple('PriceEntry', PRICE_FIELDS)
+SupplementEntry = namedtuple('SupplementEntry', ('pk',) + SUPPLEMENT_FIELDS)
+OtherPriceEntry = namedtuple('OtherPriceEntry', OTHER_PRICE_FIELDS)
+BatchQuote = namedtuple('BatchQuote', ('totals', 'deposits'))
+Quote = namedtuple('Quote', ('nights', 'base_price', 'supplements', 'total', 'deposit', 'pricing_version'))
+PriceCell = namedtuple('PriceCell', ('elec', 'no_elec'))
+RatesMatrix = namedtuple('RatesMatrix', ('prices', 'worker_prices', 'supplement'))
+
+RATE_SEASONS = ('low', 'mid', 'high')
+
+DEPOSIT_RATE = Decimal('0.15')
+
+
+class PricingSnapshot:
+    """
+    Immutable view of all pricing data at a given version.
+
+    Attributes:
+        - version: pricing version the snapshot was built from
+        - fingerprint: short hash of the prices and default supplements
+        - prices: read-only {(booking_type, season, is_worker): PriceEntry}
+        - supplements: read-only {pk: SupplementEntry}
+        - supplement: default supplements (those of the first Price, as before)
+        - other_price: OtherPriceEntry or None
+    """
+    __slots__ = ('version', 'fingerprint', 'prices', 'supplements', 'supplement', 'other_price')
+
+    def __init__(self, version, prices, supplements, supplement, other_price):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'fingerprint', pricing_fingerprint(prices, supplement))
+        object.__setattr__(self, 'prices', MappingProxyType(prices))
+        object.__setattr__(self, 'supplements', MappingProxyType(supplements))
+        object.__setattr__(self, 'supplement', supplement)
+        object.__setattr__(self, 'other_price', other_price)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PricingSnapshot is immutable")
+
+    def get_price(self, booking_type, season, is_worker=False):
+        """Return the PriceEntry for the given key, or None if it is not defined."""
+        return self.prices.get((booking_type, season, is_worker))
+
+
+def pricing_fingerprint(prices, supplement):
+    """Return a short hash identifying a set of tariffs."""
+    content = repr((sorted(prices.items(), key=repr), supplement[1:] if supplement else None))
+    return hashlib.sha256(content.encode()).hexdigest()[:12]
+
+
+_lock = threading.Lock()
+_version = 0
+_snapshot = None
+
+
+def invalidate_pricing():
+    """Bump the pricing version so the next quote rebuilds the snapshot."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def get_pricing_snapshot():
+    """Return the current PricingSnapshot, building it if the version changed."""
+    global _snapshot
+    version = (_version, config_version())
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = build_pricing_snapshot(version)
+        return _snapshot
+
+
+def build_pricing_snapshot(version=0):
+    """Load every pricing row from the database and compile a PricingSnapshot."""
+    from .models import Price, SupplementPrice, OtherPrice
+
+    supplements = {
+        row[0]: SupplementEntry(*row)
+        for row in SupplementPrice.objects.order_by('pk').values_list('pk', *SUPPLEMENT_FIELDS)
+    }
+
+    prices = {}
+    default_supplement = None
+    for index, row in enumerate(Price.objects.order_by('pk').values_list('supplements_id', *PRICE_FIELDS)):
+        supplements_id, entry = row[0], PriceEntry(*row[1:])
+        if index == 0:
+            default_supplement = supplements.get(supplements_id)
+        # Keep the first row when the admin created duplicates
+        prices.setdefault((entry.booking_type, entry.season, entry.is_worker), entry)
+
+    other_price = None
+    other = get_singleton(OtherPrice)
+    if other is not None:
+        translations = {t.language_code: t for t in other.translations.all()}
+        translation = translations.get(settings.LANGUAGE_CODE) or next(iter(translations.values()), None)
+        if translation is not None:
+            other_price = OtherPriceEntry(*(getattr(translation, field) for field in OTHER_PRICE_FIELDS))
+
+    return PricingSnapshot(version, prices, supplements, default_supplement, other_price)
+
+
+def base_price_field(main_type, adults, electricity_yes):
+    """
+    Return (Price field holding the nightly base price, people included in it)
+    for a stay of the given main type.
+    """
+    if main_type == 'camping_car' or adults >= 2:
+        field = 'price_2_persons_with_electricity' if electricity_yes else 'price_2_persons_without_electricity'
+        return field, 2
+    field = 'price_1_person_with_electricity' if electricity_yes else 'price_1_person_without_electricity'
+    return field, 1
+
+
+def extras_breakdown(supplement, nights, extra_adults, children_over_8, children_under_8, pets, extra_vehicle, extra_tent):
+    """Return the supplements of a stay over all its nights, as {supplement: amount} (non-zero amounts only)."""
+    if not supplement:
+        return {}
+    amounts = {
+        'extra_adults': extra_adults * (supplement.extra_adult_price or 0) * nights,
+        'children_over_8': children_over_8 * (supplement.child_over_8_price or 0) * nights,
+        'children_under_8': children_under_8 * (supplement.child_under_8_price or 0) * nights,
+        'pets': pets * (supplement.pet_price or 0) * nights,
+        'extra_vehicle': extra_vehicle * (supplement.extra_vehicle_price or 0) * nights,
+        'extra_tent': extra_tent * (supplement.extra_tent_price or 0) * nights,
+    }
+    return {name: amount for name, amount in amounts.items() if amount}
+
+
+def extras_total(supplement, nights, extra_adults, children_over_8, children_under_8, pets, extra_vehicle, extra_tent):
+    """Return the supplements of a stay (people, pets, extra vehicle and tent) over all its nights."""
+    return sum(extras_breakdown(
+        supplement, nights, extra_adults, children_over_8, children_under_8, pets, extra_vehicle, extra_tent,
+    ).values())
+
+
+def deposit_for(total_price):
+    """Return the 15% deposit of a total price, rounded to 2 decimals."""
+    return round(total_price * DEPOSIT_RATE, 2)
+
+
+def quote_batch(subtypes, start_dates, end_dates, adults, children_over_8, children_under_8, pets,
+                electricity, extra_vehicles=None, extra_tents=None, supplement=None):
+    """
+    Price many stays in one pass.
+
+    Every argument is a sequence with one entry per stay (column layout), e.g.
+    subtypes=['tent', 'van'], start_dates=[...], electricity=['yes', 'no'].
+    extra_vehicles and extra_tents default to zero for every stay.
+
+    Per-night base prices are laid out once over the whole window covered by the
+    batch, as prefix sums per (main type, price field), so each stay costs a
+    couple of array lookups whatever its length. Missing Price rows are tracked
+    the same way and give a total of 0, like the scalar method.
+
+    Returns:
+        BatchQuote(totals, deposits): two lists aligned with the input
+    """
+    from .models import Booking
+    from .seasons import season_segments
+
+    count = len(subtypes)
+    extra_vehicles = extra_vehicles if extra_vehicles is not None else [0] * count
+    extra_tents = extra_tents if extra_tents is not None else [0] * count
+    if not count:
+        return BatchQuote([], [])
+
+    snapshot = get_pricing_snapshot()
+    if supplement is None:
+        supplement = snapshot.supplement
+
+    nights_list = [max((end - start).days, 1) for start, end in zip(start_dates, end_dates)]
+    origin = min(start_dates)
+    window_end = max(start + datetime.timedelta(days=nights) for start, nights in zip(start_dates, nights_list))
+
+    # Season of every night in the window, one run per boundary crossed
+    night_seasons = []
+    for season, season_nights in season_segments(origin, window_end):
+        night_seasons.extend([season] * season_nights)
+
+    prefix_sums = {}
+
+    def prefix_sum(main_type, field):
+        """Return (cumulative base price, cumulative missing-price nights) over the window."""
+        key = (main_type, field)
+        if key not in prefix_sums:
+            prices, missing = [0], [0]
+            for season in night_seasons:
+                price = snapshot.get_price(main_type, season)
+                prices.append(prices[-1] + ((getattr(price, field) or 0) if price else 0))
+                missing.append(missing[-1] + (price is None))
+            prefix_sums[key] = (prices, missing)
+        return prefix_sums[key]
+
+    totals, deposits = [], []
+    for i in range(count):
+        main_type = Booking.MAIN_TYPE_MAP.get(subtypes[i], subtypes[i])
+        field, included_people = base_price_field(main_type, adults[i], electricity[i] == 'yes')
+        prices, missing = prefix_sum(main_type, field)
+
+        first = (start_dates[i] - origin).days
+        last = first + nights_list[i]
+        if missing[last] - missing[first]:
+            total = 0
+        else:
+            total = (prices[last] - prices[first]) + extras_total(
+                supplement,
+                nights_list[i],
+                max(adults[i] - included_people, 0),
+                children_over_8[i],
+                children_under_8[i],
+                pets[i],
+                extra_vehicles[i],
+                extra_tents[i],
+            )
+            total = round(total, 2)
+
+        totals.append(total)
+        deposits.append(deposit_for(total))
+
+    return BatchQuote(totals, deposits)
+
+
+def rates_matrix(snapshot=None):
+    """
+    Lay the pricing snapshot out for the rates page, so templates index into it
+    instead of looping over every Price row.
+
+    Returns:
+        RatesMatrix(prices, worker_prices, supplement):
+            - prices: {booking_type: {season: {'p1': PriceCell, 'p2': PriceCell}}},
+              PriceCell(elec, no_elec) being the nightly prices with and without electricity
+            - worker_prices: {booking_type: [PriceEntry]} for worker rates
+            - supplement: SupplementEntry with the lowest pk (the first one), or None
+    """
+    if snapshot is None:
+        snapshot = get_pricing_snapshot()
+
+    prices = {}
+    worker_prices = {}
+    for (booking_type, season, is_worker), entry in snapshot.prices.items():
+        if is_worker:
+            worker_prices.setdefault(booking_type, []).append(entry)
+        elif season in RATE_SEASONS:
+            prices.setdefault(booking_type, {})[season] = {
+                'p1': PriceCell(entry.price_1_person_with_electricity, entry.price_1_person_without_electricity),
+                'p2': PriceCell(entry.price_2_persons_with_electricity, entry.price_2_persons_without_electricity),
+            }
+
+    supplement = snapshot.supplements[min(snapshot.supplements)] if snapshot.supplements else None
+    return RatesMatrix(prices, worker_prices, supplement)
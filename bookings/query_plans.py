@@ -0,0 +1,48 @@
+"""
+Hot querysets of the booking tables.
+
+hot_querysets() returns the queries run on every booking or admin page, with
+representative values. The explain_queries command prints their SQLite query
+plan and flags the ones reading a whole table, which get slower every season
+as bookings pile up.
+"""
+import datetime
+from django.utils import timezone
+from .models import Booking, CapacityHold, NightOccupancy
+
+
+def hot_querysets():
+    """
+    Return the hot querysets of the booking tables.
+
+    Returns:
+        dict: {description: queryset}
+    """
+    today = timezone.localdate()
+    start_date, end_date = today, today + datetime.timedelta(days=7)
+    nights = [start_date + datetime.timedelta(days=offset) for offset in range(7)]
+    now = timezone.now()
+
+    return {
+        # Admin change list (Meta.ordering) and its filters
+        "Admin : dernières réservations": Booking.objects.all()[:100],
+        "Admin : filtre type et dates": Booking.objects.filter(booking_type='tent', start_date__gte=start_date, end_date__lte=end_date),
+        # Stays overlapping a period, per type
+        "Séjours en cours sur une période": Booking.objects.filter(
+            booking_type='tent', start_date__lt=end_date, end_date__gt=start_date,
+        ).order_by(),
+        # Customer lookup (confirmation emails, data access requests)
+        "Réservations d'un client": Booking.objects.filter(email='client@example.com'),
+        # clean_old_bookings
+        "Réservations de plus de 10 ans": Booking.objects.filter(
+            created_at__lt=now - datetime.timedelta(days=10 * 365),
+        ).order_by(),
+        # Booking.check_capacity and the availability endpoint
+        "Occupation par nuit": NightOccupancy.objects.filter(
+            booking_type='tent', night__gte=nights[0], night__lte=nights[-1],
+        ),
+        "Blocages actifs sur une période": CapacityHold.active().filter(
+            booking_type='tent', start_date__lte=nights[-1], end_date__gte=nights[0],
+        ),
+        "Blocage d'un client": CapacityHold.objects.filter(token='00000000-0000-0000-0000-000000000000'),
+    }
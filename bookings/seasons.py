@@ -0,0 +1,147 @@
+"""
+Season calendar compiled from SeasonInfo.
+
+The season start dates edited in the admin are projected onto each calendar
+year as a sorted boundary array, and lookups use bisect. Calendars are cached
+per year and per version; bookings.signals bumps the version whenever
+SeasonInfo (or one of its translations) is saved or deleted. The shared site
+configuration version is part of it, so the other workers follow too.
+
+Only the start of each period is used: a season lasts until the next start.
+"""
+import datetime
+import threading
+from bisect import bisect_right
+from django.conf import settings
+from core.site_config import config_version, get_singleton
+
+
+# SeasonInfo field holding the first day of each period
+SEASON_START_FIELDS = (
+    ('mid_season_start_1', 'mid'),
+    ('high_season_start', 'high'),
+    ('mid_season_start_2', 'mid'),
+    ('low_season_start', 'low'),
+)
+
+
+class SeasonCalendar:
+    """
+    Season boundaries of one calendar year.
+
+    Attributes:
+        - year: calendar year covered
+        - starts: sorted first days of each period, starting with January 1st
+        - seasons: season code ('low', 'mid', 'high') for each entry of starts
+    """
+    __slots__ = ('year', 'starts', 'seasons')
+
+    def __init__(self, year, month_days):
+        """
+        Build the calendar from a list of ((month, day), season) period starts.
+        The period starting last in the year also covers January 1st.
+        """
+        boundaries = sorted((_project(year, month, day), season) for (month, day), season in month_days)
+        if boundaries[0][0] != datetime.date(year, 1, 1):
+            boundaries.insert(0, (datetime.date(year, 1, 1), boundaries[-1][1]))
+
+        self.year = year
+        self.starts = tuple(start for start, _ in boundaries)
+        self.seasons = tuple(season for _, season in boundaries)
+
+    def season_for(self, day):
+        """Return the season code of the given day."""
+        return self.seasons[bisect_right(self.starts, day) - 1]
+
+    def next_boundary(self, day):
+        """Return the first day of the period following the given day."""
+        index = bisect_right(self.starts, day)
+        if index < len(self.starts):
+            return self.starts[index]
+        return datetime.date(self.year + 1, 1, 1)
+
+
+def _project(year, month, day):
+    """Project a (month, day) onto the given year, mapping February 29th to the 28th on common years."""
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return datetime.date(year, month, day - 1)
+
+
+_lock = threading.Lock()
+_version = 0
+# (version, period starts, {year: SeasonCalendar}), replaced as a whole on rebuild
+_state = (None, None, {})
+
+
+def invalidate_seasons():
+    """Bump the season version so calendars are rebuilt from SeasonInfo."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def _load_month_days():
+    """Read the period start dates from SeasonInfo, falling back to the model defaults."""
+    from .models import SeasonInfo
+
+    translation_model = SeasonInfo._parler_meta.root_model
+    values = {field: translation_model._meta.get_field(field).default for field, _ in SEASON_START_FIELDS}
+
+    info = get_singleton(SeasonInfo)
+    if info is not None:
+        translations = {t.language_code: t for t in info.translations.all()}
+        translation = translations.get(settings.LANGUAGE_CODE) or next(iter(translations.values()), None)
+        if translation is not None:
+            values = {field: getattr(translation, field) for field, _ in SEASON_START_FIELDS}
+
+    return [((values[field].month, values[field].day), season) for field, season in SEASON_START_FIELDS]
+
+
+def get_season_calendar(year):
+    """Return the SeasonCalendar of the given year (cached until SeasonInfo changes)."""
+    global _state
+    current = (_version, config_version())
+    version, month_days, calendars = _state
+    if version == current and year in calendars:
+        return calendars[year]
+
+    with _lock:
+        if _state[0] != current:
+            _state = (current, _load_month_days(), {})
+        version, month_days, calendars = _state
+        if year not in calendars:
+            calendars[year] = SeasonCalendar(year, month_days)
+        return calendars[year]
+
+
+def get_season(day):
+    """Return the season code ('low', 'mid' or 'high') of the given day."""
+    return get_season_calendar(day.year).season_for(day)
+
+
+def season_segments(start_date, end_date):
+    """
+    Split the nights of a stay into consecutive (season, nights) segments.
+
+    The loop runs once per season boundary crossed, not once per night.
+    Same-day stays count as one night, like calculate_total_price.
+    """
+    end_date = max(end_date, start_date + datetime.timedelta(days=1))
+    segments = []
+    day = start_date
+
+    while day < end_date:
+        calendar = get_season_calendar(day.year)
+        season = calendar.season_for(day)
+        segment_end = min(calendar.next_boundary(day), end_date)
+        nights = (segment_end - day).days
+
+        if segments and segments[-1][0] == season:
+            segments[-1] = (season, segments[-1][1] + nights)
+        else:
+            segments.append((season, nights))
+        day = segment_end
+
+    return segments
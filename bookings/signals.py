@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Booking, NightOccupancy, OtherPrice, Price, SeasonInfo, SupplementPrice, occupied_nights
+from .pricing import invalidate_pricing
+from .seasons import invalidate_seasons
+from core.site_config import invalidate_site_config
+
+
+@receiver(post_delete, sender=Booking)
+def release_booking_nights(sender, instance, **kwargs):
+    """
+    Release the nights of a deleted booking from the NightOccupancy ledger.
+    Also runs for queryset deletes (e.g. clean_old_bookings).
+    """
+    if instance.start_date is None or instance.end_date is None:
+        return
+    main_type, start_date, end_date = instance.ledger_span()
+    NightOccupancy.apply(main_type, occupied_nights(start_date, end_date), -1)
+
+
+PRICING_MODELS = (Price, SupplementPrice, OtherPrice, OtherPrice._parler_meta.root_model)
+
+
+def bump_pricing_version(sender, **kwargs):
+    """Invalidate the pricing snapshot (in every worker) when a pricing row is saved or deleted."""
+    invalidate_pricing()
+    invalidate_site_config()
+
+
+for model in PRICING_MODELS:
+    post_save.connect(bump_pricing_version, sender=model, dispatch_uid=f"pricing_save_{model._meta.label}")
+    post_delete.connect(bump_pricing_version, sender=model, dispatch_uid=f"pricing_delete_{model._meta.label}")
+
+
+SEASON_MODELS = (SeasonInfo, SeasonInfo._parler_meta.root_model)
+
+
+def bump_season_version(sender, **kwargs):
+    """Invalidate the cached season calendars (in every worker) when SeasonInfo is saved or deleted."""
+    invalidate_seasons()
+    invalidate_site_config()
+
+
+for model in SEASON_MODELS:
+    post_save.connect(bump_season_version, sender=model, dispatch_uid=f"seasons_save_{model._meta.label}")
+    post_delete.connect(bump_season_version, sender=model, dispatch_uid=f"seasons_delete_{model._meta.label}")
@@ -0,0 +1,13 @@
+import pytest
+from bookings.pricing import invalidate_pricing
+from bookings.seasons import invalidate_seasons
+from core.site_config import invalidate_site_config
+
+
+@pytest.fixture(autouse=True)
+def fresh_pricing_snapshot():
+    """Database rollbacks between tests do not fire signals, so start each test with fresh pricing caches."""
+    invalidate_pricing()
+    invalidate_seasons()
+    invalidate_site_config()
+    yield
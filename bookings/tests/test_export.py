@@ -0,0 +1,135 @@
+import csv
+import datetime
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+import pytest
+from decimal import Decimal
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from bookings.export import EXPORT_HEADERS, csv_stream, csv_unescape, export_rows, xlsx_stream
+from bookings.models import Booking
+from core.tests.perf import create_site_data
+
+pytestmark = pytest.mark.django_db
+
+SHEET_NS = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+@pytest.fixture
+def bookings():
+    """Twelve bookings of every type, some with the deposit paid."""
+    create_site_data()
+    start = datetime.date(2030, 6, 20)
+    created = []
+    for i, subtype in enumerate(["tent", "car_tent", "van", "camping_car"] * 3):
+        created.append(Booking.objects.create(
+            last_name=f"Client {i}", first_name="Jean", address="1 rue du Lac", postal_code="33000", city="Bordeaux",
+            phone="0600000000", email=f"client{i}@example.com",
+            start_date=start + datetime.timedelta(days=i * 3), end_date=start + datetime.timedelta(days=i * 3 + 2 + i % 4),
+            booking_subtype=subtype, electricity="yes" if i % 2 else "no", adults=1 + i % 3, pets=i % 2,
+            deposit_paid=i % 3 == 0,
+        ))
+    return created
+
+
+def test_export_rows_match_booking_prices(bookings):
+    """Computed columns are those of the scalar methods, with no query per row."""
+    list(export_rows(Booking.objects.order_by("pk")[:1]))  # Builds the pricing snapshot
+    with CaptureQueriesContext(connection) as all_rows:
+        rows = list(export_rows(Booking.objects.order_by("pk"), chunk_size=5))
+    with CaptureQueriesContext(connection) as one_row:
+        list(export_rows(Booking.objects.order_by("pk")[:1], chunk_size=5))
+    assert len(all_rows) == len(one_row)
+
+    columns = {header: index for index, header in enumerate(EXPORT_HEADERS)}
+    for booking, row in zip(bookings, rows):
+        total = Decimal(booking.calculate_total_price())
+        deposit = booking.calculate_deposit(total)
+        assert row[columns["Réservation"]] == booking.pk
+        assert row[columns["Nuits"]] == (booking.end_date - booking.start_date).days
+        assert row[columns["Total"]] == total
+        assert row[columns["Acompte"]] == deposit
+        assert row[columns["Reste à payer"]] == (total - deposit if booking.deposit_paid else total)
+
+
+def test_csv_and_xlsx_streams(bookings):
+    """Both writers produce one line per booking; the XLSX file is a valid workbook."""
+    rows = list(export_rows(Booking.objects.order_by("pk")))
+
+    lines = list(csv.reader(io.StringIO(b"".join(csv_stream(rows)).decode("utf-8-sig")), delimiter=";"))
+    assert lines[0] == list(EXPORT_HEADERS)
+    assert len(lines) == len(bookings) + 1
+
+    chunks = list(xlsx_stream(rows, flush_rows=2))
+    assert len(chunks) > 1
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        sheet = ET.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    sheet_rows = sheet.findall("s:sheetData/s:row", SHEET_NS)
+    assert len(sheet_rows) == len(bookings) + 1
+    assert sheet_rows[1].find("s:c[3]/s:is/s:t", SHEET_NS).text == "Client 0"
+
+
+def test_csv_neutralizes_formulas(bookings):
+    """Texts read as formulas by spreadsheets are prefixed with a quote; numbers are left alone."""
+    Booking.objects.filter(pk=bookings[0].pk).update(last_name='=HYPERLINK("http://evil.example","x")', city="@SUM(A1)")
+    rows = list(export_rows(Booking.objects.filter(pk=bookings[0].pk)))
+
+    line = list(csv.reader(io.StringIO(b"".join(csv_stream(rows)).decode("utf-8-sig")), delimiter=";"))[1]
+    columns = {header: index for index, header in enumerate(EXPORT_HEADERS)}
+    assert line[columns["Nom"]] == '\'=HYPERLINK("http://evil.example","x")'
+    assert line[columns["Ville"]] == "'@SUM(A1)"
+    assert line[columns["Prénom"]] == "Jean"
+    assert not line[columns["Total"]].startswith("'")
+    assert csv_unescape(line[columns["Ville"]]) == "@SUM(A1)"
+
+
+def test_admin_export_action_streams_selection(bookings, client, django_user_model):
+    """The BookingAdmin action downloads the selected bookings."""
+    admin = django_user_model.objects.create_superuser(username="gerant", password="x", email="gerant@example.com")
+    client.force_login(admin)
+
+    selected = [booking.pk for booking in bookings[:3]]
+    response = client.post(reverse("admin:bookings_booking_changelist"), {
+        "action": "export_csv",
+        "_selected_action": selected,
+    })
+
+    assert response.streaming
+    assert response["Content-Disposition"] == 'attachment; filename="reservations.csv"'
+    lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+    assert len(lines) == 4
+
+
+def test_admin_reprice_action_needs_change_permission(bookings, client, django_user_model):
+    """Staff with view access only can export the bookings but not reprice them."""
+    staff = django_user_model.objects.create_user(username="accueil", password="x", is_staff=True)
+    staff.user_permissions.add(Permission.objects.get(codename="view_booking"))
+    client.force_login(staff)
+
+    response = client.get(reverse("admin:bookings_booking_changelist"))
+    actions = [name for name, _ in response.context["action_form"].fields["action"].choices]
+    assert "export_csv" in actions
+    assert "reprice" not in actions
+
+    Booking.objects.filter(pk=bookings[0].pk).update(total_price=Decimal("1.00"))
+    client.post(reverse("admin:bookings_booking_changelist"), {
+        "action": "reprice",
+        "_selected_action": [bookings[0].pk],
+    })
+    assert Booking.objects.get(pk=bookings[0].pk).total_price == Decimal("1.00")
+
+
+def test_export_bookings_command(bookings, tmp_path):
+    """The command writes the bookings whose arrival falls in the period."""
+    output = tmp_path / "saison.xlsx"
+    out = io.StringIO()
+    call_command("export_bookings", str(output), "--from=2030-06-20", "--to=2030-07-02", stdout=out)
+
+    assert "4 réservations exportées" in out.getvalue()
+    with zipfile.ZipFile(output) as archive:
+        assert "xl/workbook.xml" in archive.namelist()
@@ -0,0 +1,113 @@
+import datetime
+import io
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from bookings.export import csv_stream, export_rows
+from bookings.importer import import_bookings
+from bookings.models import Booking, Capacity, CapacityHold, NightOccupancy
+
+pytestmark = pytest.mark.django_db
+
+HEADER = "last_name,first_name,address,postal_code,city,email,phone,start_date,end_date,booking_subtype,electricity,adults,deposit_paid\n"
+
+
+def csv_row(name, start, end, subtype="tent", electricity="oui"):
+    return f"{name},Jean,1 rue du Lac,33000,Bordeaux,{name.lower()}@example.com,0600000000,{start},{end},{subtype},{electricity},2,non\n"
+
+
+@pytest.fixture
+def capacities():
+    for booking_type in ("tent", "caravan", "camping_car"):
+        Capacity.objects.create(booking_type=booking_type, max_places=2)
+
+
+def test_import_reports_every_conflict_at_once(capacities, tmp_path):
+    """Rows are checked in file order against the ledger, the holds and the previous rows."""
+    CapacityHold.acquire("tent", datetime.date(2030, 7, 3), datetime.date(2030, 7, 4))
+    path = tmp_path / "registre.csv"
+    path.write_text(
+        HEADER
+        + csv_row("Alpha", "2030-07-01", "2030-07-05")
+        + csv_row("Bravo", "2030-07-02", "2030-07-03")
+        + csv_row("Charlie", "2030-07-03", "2030-07-06")  # 7/3 taken by Alpha and the hold
+        + csv_row("Delta", "2030-07-02", "2030-07-04")  # 7/2 taken by Alpha and Bravo
+        + csv_row("Echo", "2030-07-04", "2030-07-05", subtype="van")
+        + csv_row("Foxtrot", "05/07/2030", "2030-07-01")
+        + csv_row("Golf", "2030-07-01", "2030-07-02", electricity="peut-être"),
+        encoding="utf-8",
+    )
+
+    out = io.StringIO()
+    call_command("import_bookings", str(path), stdout=out)
+    output = out.getvalue()
+
+    assert "3/7 réservations importées, 4 rejetées" in output
+    assert "ligne 4 : Complet la nuit du 03/07/2030" in output
+    assert "ligne 5 : Complet la nuit du 02/07/2030" in output
+    assert "ligne 7 : La date de départ doit être postérieure" in output
+    assert "ligne 8 : Valeur oui/non invalide" in output
+    assert set(Booking.objects.values_list("last_name", flat=True)) == {"Alpha", "Bravo", "Echo"}
+    assert Booking.objects.get(last_name="Echo").booking_type == "caravan"
+    ledger = dict(NightOccupancy.objects.filter(booking_type="tent").values_list("night", "booked"))
+    assert ledger == {
+        datetime.date(2030, 7, 1): 1,
+        datetime.date(2030, 7, 2): 2,
+        datetime.date(2030, 7, 3): 1,
+        datetime.date(2030, 7, 4): 1,
+    }
+
+
+def test_import_dry_run_saves_nothing(capacities):
+    report = import_bookings(HEADER + csv_row("Alpha", "2030-07-01", "2030-07-05"), dry_run=True)
+    assert (report.total, report.created, report.errors) == (1, 1, {})
+    assert not Booking.objects.exists()
+
+
+def test_import_accepts_the_csv_export(capacities):
+    """An exported file can be imported again."""
+    import_bookings(HEADER + csv_row("Alpha", "2030-07-01", "2030-07-05", subtype="camping_car"))
+    exported = b"".join(csv_stream(export_rows(Booking.objects.all()))).decode("utf-8")
+    Booking.objects.all().delete()
+
+    report = import_bookings(exported)
+
+    assert report.errors == {}
+    booking = Booking.objects.get()
+    assert (booking.last_name, booking.booking_subtype, booking.electricity) == ("Alpha", "camping_car", "yes")
+
+
+def test_import_queries_do_not_grow_with_rows(capacities):
+    """Capacity is validated in memory: 1000 rows cost a few dozen queries (SQLite caps inserts at 999 parameters)."""
+    Capacity.objects.filter(booking_type="tent").update(max_places=10_000)
+    start = datetime.date(2030, 5, 1)
+    rows = "".join(
+        csv_row(f"Client{i}", start + datetime.timedelta(days=i % 120), start + datetime.timedelta(days=i % 120 + 3))
+        for i in range(1000)
+    )
+
+    with CaptureQueriesContext(connection) as captured:
+        report = import_bookings(HEADER + rows, batch_size=500)
+
+    assert report.created == 1000
+    assert len(captured) < 80
+
+
+def test_admin_import_page(capacities, client, django_user_model):
+    """The admin upload page imports the file and lists the rejected rows."""
+    admin = django_user_model.objects.create_superuser(username="gerant", password="x", email="gerant@example.com")
+    client.force_login(admin)
+    url = reverse("admin:bookings_booking_import")
+    assert client.get(url).status_code == 200
+
+    upload = SimpleUploadedFile("registre.csv", (HEADER + csv_row("Alpha", "2030-07-01", "2030-07-05")
+                                                 + csv_row("Bravo", "2030-07-01", "2030-06-01")).encode())
+    response = client.post(url, {"file": upload})
+
+    assert response.status_code == 200
+    assert response.context["report"].created == 1
+    assert 3 in response.context["report"].errors
+    assert Booking.objects.filter(last_name="Alpha").exists()
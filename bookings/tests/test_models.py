@@ -1,10 +1,17 @@
 import pytest
+from io import StringIO
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from parler.utils.context import switch_language
-from bookings.models import SupplementPrice, Price, Booking, Capacity, MobileHome, SupplementMobileHome, SeasonInfo
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from bookings.models import SupplementPrice, Price, Booking, Capacity, CapacityHold, MobileHome, SupplementMobileHome, SeasonInfo, NightOccupancy
+from bookings.pricing import quote_batch
 import datetime
+import json
+import threading
+from django.db import connection
 
 @pytest.mark.django_db
 def test_supplementprice_creation():
@@ -80,6 +87,77 @@ def test_booking_save_total_and_deposit():
     assert booking.included_people in [1, 2]
     assert str(booking) == f"{booking.get_booking_type_display()} ({booking.start_date} to {booking.end_date})"
 
+@pytest.mark.django_db
+def test_booking_stores_price_snapshot():
+    """A new booking stores its quote, which does not follow later tariff changes until repriced."""
+    supp = SupplementPrice.objects.create(extra_adult_price=10, pet_price=2)
+    price = Price.objects.create(booking_type='tent', season='low', price_1_person_with_electricity=20,
+                                 price_2_persons_with_electricity=30, supplements=supp)
+    SeasonInfo.objects.create()
+    start = datetime.date(2031, 1, 10)
+    booking = make_booking(start, 3, adults=3, pets=1)
+
+    booking.refresh_from_db()
+    assert booking.nights == 3
+    assert booking.base_price == Decimal('90.00')
+    assert booking.supplements_price == Decimal('36.00')
+    assert booking.price_breakdown == {'extra_adults': '30.00', 'pets': '6.00'}
+    assert booking.total_price == booking.calculate_total_price() == Decimal('126.00')
+    assert booking.deposit_amount == booking.calculate_deposit()
+    assert booking.remaining_balance == booking.total_price
+    version = booking.pricing_version
+
+    price.price_2_persons_with_electricity = 40
+    price.save()
+    booking.save()
+    booking.refresh_from_db()
+    assert booking.total_price == Decimal('126.00')
+    assert booking.calculate_total_price() == Decimal('156.00')
+
+    Booking.objects.filter(pk=booking.pk).update(total_price=None)
+    call_command('snapshot_prices', '--pause=0', stdout=StringIO())
+    booking.refresh_from_db()
+    assert booking.total_price == Decimal('156.00')
+    assert booking.pricing_version != version
+
+@pytest.mark.django_db
+def test_booking_is_repriced_when_its_stay_changes():
+    """Changing the dates or the party of a saved booking stores a new quote; other edits keep it."""
+    supp = SupplementPrice.objects.create(extra_adult_price=10, pet_price=2)
+    Price.objects.create(booking_type='tent', season='low', price_1_person_with_electricity=20,
+                         price_2_persons_with_electricity=30, supplements=supp)
+    SeasonInfo.objects.create()
+    booking = make_booking(datetime.date(2031, 1, 10), 3, adults=3, pets=1)
+    priced_at = booking.priced_at
+
+    booking.deposit_paid = True
+    booking.save()
+    booking.refresh_from_db()
+    assert booking.priced_at == priced_at
+
+    booking.end_date += datetime.timedelta(days=1)
+    booking.pets = 0
+    booking.save()
+    booking.refresh_from_db()
+    assert booking.nights == 4
+    assert booking.total_price == booking.calculate_total_price() == Decimal('160.00')
+    assert Booking.revenue_by_season()[0]['nights'] == 4
+
+@pytest.mark.django_db
+def test_revenue_by_season_is_one_query(django_assert_num_queries):
+    """Stored prices are summed per season in SQL."""
+    for year in (2030, 2031):
+        for _ in range(3):
+            make_booking(datetime.date(year, 7, 1), 2)
+    Booking.objects.filter(start_date__year=2031).update(total_price=100, deposit_amount=15)
+
+    with django_assert_num_queries(1):
+        revenue = Booking.revenue_by_season()
+
+    assert [(row['season'], row['bookings'], row['nights']) for row in revenue] == [(2030, 3, 6), (2031, 3, 6)]
+    assert revenue[1]['total'] == Decimal('300.00')
+    assert revenue[1]['deposits'] == Decimal('45.00')
+
 @pytest.mark.django_db
 def test_booking_capacity_validation():
     """Test that capacity validation prevents overbooking."""
@@ -102,6 +180,158 @@ def test_booking_capacity_validation():
     with pytest.raises(ValidationError):
         b2.check_capacity()
 
+def make_booking(start, nights, booking_subtype='tent', **kwargs):
+    """Create and return a saved booking covering the given number of nights."""
+    return Booking.objects.create(
+        last_name='A', first_name='A', address='A', postal_code='33000', city='Bordeaux',
+        phone='0600000000', email='a@a.com',
+        start_date=start,
+        end_date=start + datetime.timedelta(days=nights),
+        booking_subtype=booking_subtype, electricity='yes', **kwargs
+    )
+
+def ledger(booking_type):
+    """Return the non-empty ledger rows for a type as a {night: booked} dict."""
+    return dict(NightOccupancy.objects.filter(booking_type=booking_type, booked__gt=0).values_list('night', 'booked'))
+
+@pytest.mark.django_db
+def test_occupancy_ledger_follows_save_and_delete():
+    """Ledger rows are incremented on create, moved on update and released on delete."""
+    start = datetime.date(2030, 7, 1)
+    b1 = make_booking(start, 2)
+    make_booking(start + datetime.timedelta(days=1), 2, booking_subtype='car_tent')
+    assert ledger('tent') == {
+        start: 1,
+        start + datetime.timedelta(days=1): 2,
+        start + datetime.timedelta(days=2): 1,
+    }
+
+    b1.booking_subtype = 'van'
+    b1.save()
+    assert ledger('caravan') == {start: 1, start + datetime.timedelta(days=1): 1}
+    assert ledger('tent') == {start + datetime.timedelta(days=1): 1, start + datetime.timedelta(days=2): 1}
+
+    Booking.objects.all().delete()
+    assert ledger('tent') == {}
+    assert ledger('caravan') == {}
+
+@pytest.mark.django_db
+def test_rebuild_occupancy_command():
+    """The rebuild command recomputes the ledger from the bookings table."""
+    start = datetime.date(2030, 7, 1)
+    make_booking(start, 3)
+    make_booking(start, 1, booking_subtype='camping_car')
+    expected_tent, expected_cc = ledger('tent'), ledger('camping_car')
+
+    NightOccupancy.objects.all().delete()
+    call_command('rebuild_occupancy', stdout=StringIO())
+    assert ledger('tent') == expected_tent
+    assert ledger('camping_car') == expected_cc
+
+@pytest.mark.django_db
+def test_clean_old_bookings_command_runs_in_chunks_and_resumes(tmp_path):
+    """Old bookings are deleted chunk by chunk, after the primary key of the checkpoint."""
+    start = datetime.date(2030, 7, 1)
+    old = [make_booking(start, 1) for _ in range(5)]
+    recent = make_booking(start, 1)
+    Booking.objects.filter(pk__in=[b.pk for b in old]).update(created_at=timezone.now() - datetime.timedelta(days=11 * 365))
+    checkpoint = tmp_path / 'checkpoint.json'
+    checkpoint.write_text(json.dumps({'job': 'delete', 'last_pk': old[1].pk}))
+
+    out = StringIO()
+    call_command('clean_old_bookings', '--dry-run', '--chunk-size=2', f'--checkpoint={checkpoint}', stdout=out)
+    assert "3 réservations seraient supprimées en 2 lots" in out.getvalue()
+    assert Booking.objects.count() == 6
+
+    out = StringIO()
+    call_command('clean_old_bookings', '--chunk-size=2', '--pause=0', f'--checkpoint={checkpoint}', stdout=out)
+    assert "3 réservations ont été supprimées en 2 lots" in out.getvalue()
+    assert set(Booking.objects.values_list('pk', flat=True)) == {old[0].pk, old[1].pk, recent.pk}
+    assert ledger('tent') == {start: 3}
+    assert not checkpoint.exists()
+
+    call_command('clean_old_bookings', '--anonymize', '--pause=0', f'--checkpoint={checkpoint}', stdout=StringIO())
+    assert Booking.objects.filter(email='anonyme@example.com').count() == 2
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('command', ['clean_old_bookings', 'snapshot_prices'])
+@pytest.mark.parametrize('chunk_size', ['0', '-3'])
+def test_batch_commands_reject_invalid_chunk_size(command, chunk_size):
+    """A chunk size that is not a positive integer is refused before any work."""
+    with pytest.raises(CommandError, match="--chunk-size"):
+        call_command(command, f'--chunk-size={chunk_size}', '--dry-run' if command == 'clean_old_bookings' else '--pause=0',
+                     stdout=StringIO())
+
+@pytest.mark.django_db
+def test_check_capacity_ignores_booking_being_edited():
+    """An existing booking does not count against itself when re-validated."""
+    Capacity.objects.create(booking_type='tent', max_places=1)
+    booking = make_booking(datetime.date(2030, 7, 1), 3)
+    booking.end_date += datetime.timedelta(days=1)
+    booking.check_capacity()
+
+@pytest.mark.django_db
+def test_same_day_stay_occupies_its_night():
+    """A same-day stay is billed as one night and takes the place of that night."""
+    Capacity.objects.create(booking_type='tent', max_places=1)
+    start = datetime.date(2030, 7, 1)
+    make_booking(start, 0)
+    assert ledger('tent') == {start: 1}
+
+    with pytest.raises(ValidationError):
+        Booking(booking_type='tent', start_date=start, end_date=start + datetime.timedelta(days=1)).check_capacity()
+    Booking(booking_type='tent', start_date=start + datetime.timedelta(days=1), end_date=start + datetime.timedelta(days=2)).check_capacity()
+
+@pytest.mark.django_db
+def test_capacity_holds_count_until_released_or_expired():
+    """Active holds take a place until they are released or expire."""
+    Capacity.objects.create(booking_type='tent', max_places=1)
+    start = datetime.date.today() + datetime.timedelta(days=30)
+    end = start + datetime.timedelta(days=2)
+
+    hold = CapacityHold.acquire('car_tent', start, end)
+    assert hold.booking_type == 'tent'
+    with pytest.raises(ValidationError):
+        CapacityHold.acquire('tent', start + datetime.timedelta(days=1), end)
+    # The customer holding the place can retry with their own token
+    hold = CapacityHold.acquire('tent', start, end, replace_token=hold.token)
+
+    CapacityHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now())
+    other = CapacityHold.acquire('tent', start, end)
+    assert list(CapacityHold.objects.values_list('pk', flat=True)) == [other.pk]
+
+    CapacityHold.release(other.token)
+    make_booking(start, 2).check_capacity()
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_checkouts_hold_the_last_place_once():
+    """Parallel acquires for one remaining place: exactly one gets it."""
+    Capacity.objects.create(booking_type='tent', max_places=2)
+    start = datetime.date.today() + datetime.timedelta(days=30)
+    make_booking(start, 3).save()
+
+    results = []
+    barrier = threading.Barrier(8)
+
+    def checkout():
+        try:
+            barrier.wait()
+            CapacityHold.acquire('tent', start, start + datetime.timedelta(days=3))
+            results.append('held')
+        except ValidationError:
+            results.append('full')
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=checkout) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == ['full'] * 7 + ['held']
+    assert CapacityHold.objects.count() == 1
+
 @pytest.mark.django_db
 def test_capacity_str():
     """Test the string representation of Capacity."""
@@ -136,4 +366,108 @@ def test_seasoninfo_creation():
     with switch_language(season, 'fr'):
         season.low_season_start = datetime.date(2024, 9, 27)
         season.save()
-        assert season.low_season_start == datetime.date(2024, 9, 27)
\ No newline at end of file
+        assert season.low_season_start == datetime.date(2024, 9, 27)
+
+@pytest.mark.django_db
+def test_quote_uses_pricing_snapshot_without_queries(django_assert_num_queries):
+    """Once the snapshot is loaded, quoting a booking runs no query and sees admin edits."""
+    supp = SupplementPrice.objects.create(extra_adult_price=10, pet_price=2)
+    price = Price.objects.create(
+        booking_type='tent',
+        season='low',
+        price_1_person_with_electricity=20,
+        price_2_persons_with_electricity=30,
+        supplements=supp
+    )
+    booking = Booking(
+        start_date=datetime.date(2030, 1, 10),
+        end_date=datetime.date(2030, 1, 12),
+        booking_type='tent',
+        booking_subtype='tent',
+        electricity='yes',
+        adults=3,
+        pets=1,
+    )
+    assert booking.calculate_total_price() == Decimal('84.00')
+
+    with django_assert_num_queries(0):
+        total = booking.calculate_total_price()
+        deposit = booking.calculate_deposit()
+    assert total == Decimal('84.00')
+    assert deposit == Decimal('12.60')
+
+    price.price_2_persons_with_electricity = 40
+    price.save()
+    assert booking.calculate_total_price() == Decimal('104.00')
+
+@pytest.mark.django_db
+def test_stay_crossing_seasons_is_priced_per_night():
+    """A stay crossing from mid to high season prices each night at its own season."""
+    Price.objects.create(booking_type='caravan', season='mid', price_2_persons_without_electricity=20)
+    Price.objects.create(booking_type='caravan', season='high', price_2_persons_without_electricity=30)
+    # Default SeasonInfo dates: high season starts on July 6th
+    booking = Booking(
+        start_date=datetime.date(2030, 7, 4),
+        end_date=datetime.date(2030, 7, 8),
+        booking_subtype='caravan',
+        booking_type='caravan',
+        electricity='no',
+        adults=2,
+    )
+    assert booking.get_season() == 'mid'
+    assert booking.calculate_total_price() == Decimal('100.00')
+
+@pytest.mark.django_db
+def test_season_calendar_follows_seasoninfo():
+    """Editing SeasonInfo dates in the admin changes the season used for pricing."""
+    booking = Booking(start_date=datetime.date(2030, 7, 4), end_date=datetime.date(2030, 7, 5))
+    assert booking.get_season() == 'mid'
+
+    season = SeasonInfo()
+    with switch_language(season, 'fr'):
+        season.high_season_start = datetime.date(2024, 7, 1)
+        season.save()
+    assert booking.get_season() == 'high'
+
+@pytest.mark.django_db
+def test_quote_batch_matches_scalar_prices():
+    """quote_batch returns, to the cent, what calculate_total_price/calculate_deposit return."""
+    supp = SupplementPrice.objects.create(
+        extra_adult_price=Decimal('4.35'), child_over_8_price=Decimal('3.10'),
+        child_under_8_price=Decimal('1.95'), pet_price=Decimal('1.50'),
+        extra_vehicle_price=Decimal('2.20'), extra_tent_price=Decimal('3.05'),
+    )
+    for season, base in [('low', Decimal('11.45')), ('mid', Decimal('14.90')), ('high', Decimal('19.35'))]:
+        Price.objects.create(
+            booking_type='tent', season=season, supplements=supp,
+            price_1_person_with_electricity=base + 4, price_1_person_without_electricity=base,
+            price_2_persons_with_electricity=base + 7, price_2_persons_without_electricity=base + 3,
+        )
+        Price.objects.create(
+            booking_type='caravan', season=season, supplements=supp,
+            price_2_persons_with_electricity=base + 9, price_2_persons_without_electricity=base + 5,
+        )
+    # No camping_car high-season price: those stays are quoted 0 by both methods
+    Price.objects.create(booking_type='camping_car', season='mid', supplements=supp, price_2_persons_with_electricity=25)
+
+    subtypes = ['tent', 'car_tent', 'van', 'caravan', 'camping_car', 'camping_car']
+    rows = []
+    for i in range(60):
+        start = datetime.date(2030, 6, 20) + datetime.timedelta(days=i * 3)
+        rows.append((
+            subtypes[i % len(subtypes)], start, start + datetime.timedelta(days=i % 15),
+            1 + i % 4, i % 3, i % 2, i % 3, 'yes' if i % 2 else 'no', i % 2, (i // 2) % 2,
+        ))
+
+    columns = list(zip(*rows))
+    quotes = quote_batch(*columns)
+
+    for row, total, deposit in zip(rows, quotes.totals, quotes.deposits):
+        subtype, start, end, adults, over_8, under_8, pets, electricity, vehicles, tents = row
+        booking = Booking(
+            booking_subtype=subtype, booking_type=subtype, start_date=start, end_date=end,
+            adults=adults, children_over_8=over_8, children_under_8=under_8, pets=pets,
+            electricity=electricity, extra_vehicle=vehicles, extra_tent=tents,
+        )
+        assert total == booking.calculate_total_price()
+        assert deposit == booking.calculate_deposit()
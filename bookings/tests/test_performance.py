@@ -0,0 +1,98 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+from django.urls import reverse
+from django.utils import timezone
+from bookings.models import Booking, CapacityHold
+from bookings.wizard import WIZARD_COOKIE_NAME, booking_kwargs, dump_wizard_state, load_wizard_state
+from core.tests.perf import check_budget, create_site_data, measure
+
+pytestmark = [pytest.mark.django_db, pytest.mark.perf]
+
+
+@pytest.fixture
+def site_data(db):
+    """A fully configured site."""
+    create_site_data()
+
+
+@pytest.fixture
+def stay():
+    """A five-night stay a month from now, across whatever seasons it falls in."""
+    start = timezone.localdate() + timedelta(days=30)
+    return start, start + timedelta(days=5)
+
+
+@pytest.fixture
+def form_data(stay):
+    """Valid data of the first step of the funnel."""
+    start, end = stay
+    return {
+        "booking_type": "tent",
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "adults": 2,
+        "children_over_8": 1,
+        "children_under_8": 1,
+        "pets": 1,
+        "electricity": "yes",
+        "cable_length": 10,
+        "tent_length": 3,
+        "tent_width": 2,
+    }
+
+
+@pytest.fixture
+def details_data():
+    """Valid customer details of the third step."""
+    return {
+        "first_name": "Jeanne",
+        "last_name": "Martin",
+        "address": "1 rue des Pins",
+        "postal_code": "17000",
+        "city": "La Rochelle",
+        "email": "jeanne@example.com",
+        "phone": "0601020304",
+    }
+
+
+def test_calculate_total_price_budget(site_data, stay):
+    """Pricing a stay reads the in-memory snapshot: no query once it is loaded."""
+    start, end = stay
+    booking = Booking(booking_type="tent", booking_subtype="tent", start_date=start, end_date=end,
+                      adults=3, children_over_8=1, pets=1, electricity="yes")
+    booking.calculate_total_price()
+
+    errors = check_budget("bookings:calculate_total_price", measure(booking.calculate_total_price))
+    assert not errors, "\n".join(errors)
+
+
+@patch("stripe.checkout.Session.create", return_value=MagicMock(url="https://checkout.stripe.test/session"))
+def test_booking_funnel_budget(mock_stripe, client, site_data, form_data, details_data, mailoutbox):
+    """The four steps of the funnel stay within their budgets (Stripe stubbed, emails kept in memory)."""
+    def request(method, name, expected_status, data=None):
+        def run():
+            response = getattr(client, method)(reverse(name), data=data)
+            assert response.status_code == expected_status
+        return run
+
+    errors = []
+    errors += check_budget("bookings:booking_form:get", measure(request("get", "booking_form", 200)))
+    errors += check_budget("bookings:booking_form:post", measure(request("post", "booking_form", 302, form_data)))
+    errors += check_budget("bookings:booking_summary:get", measure(request("get", "booking_summary", 200)))
+    errors += check_budget("bookings:booking_details:get", measure(request("get", "booking_details", 200)))
+    errors += check_budget("bookings:booking_details:post", measure(request("post", "booking_details", 302, details_data)))
+    assert mock_stripe.called
+
+    # Each confirmation saves the booking: give every run a fresh hold and wizard state
+    state = load_wizard_state(client.cookies[WIZARD_COOKIE_NAME].value)
+    booking = Booking(**booking_kwargs(state))
+
+    def new_checkout():
+        hold = CapacityHold.acquire(booking.booking_subtype, booking.start_date, booking.end_date)
+        client.cookies[WIZARD_COOKIE_NAME] = dump_wizard_state({**state, "hold_token": str(hold.token)})
+
+    errors += check_budget("bookings:booking_confirm:get", measure(request("get", "booking_confirm", 200), setup=new_checkout))
+    assert Booking.objects.filter(email="jeanne@example.com").exists()
+    assert not mailoutbox
+    assert not errors, "\n".join(errors)
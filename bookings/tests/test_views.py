@@ -1,10 +1,20 @@
+import json
+import threading
 import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory
 from django.urls import reverse
 from django.core import mail
 from django.contrib.messages import get_messages
 from unittest.mock import patch, MagicMock
-from bookings.models import Booking, SupplementPrice
+from bookings.models import Booking, SupplementPrice, Capacity, CapacityHold
+from bookings.views import booking_details_async
+from bookings.wizard import WIZARD_COOKIE_NAME, dump_wizard_state, load_wizard_state
+from core.models import OutboxEmail
+from django.contrib.sessions.models import Session
 from datetime import date, timedelta
+from django.utils import timezone
 from decimal import Decimal
 
 pytestmark = pytest.mark.django_db
@@ -61,10 +71,8 @@ def supplements():
 # Helpers
 # ------------------------------
 def set_booking_session(client, booking_data):
-    """Stores booking data in client session for views that rely on session data."""
-    session = client.session
-    session["booking_data"] = booking_data
-    session.save()
+    """Stores booking data in the signed wizard cookie the booking views rely on."""
+    client.cookies[WIZARD_COOKIE_NAME] = dump_wizard_state(booking_data)
 
 
 # ------------------------------
@@ -105,6 +113,22 @@ def test_booking_form_valid(mock_check_capacity, client):
     mock_check_capacity.assert_called()
 
 
+def test_booking_form_keeps_the_hold_of_a_previous_checkout(client, valid_booking_data):
+    """Going back to step 1 should carry the hold token over, and the hold should not count against its own stay."""
+    Capacity.objects.create(booking_type="tent", max_places=1)
+    start, end = date.today() + timedelta(days=10), date.today() + timedelta(days=12)
+    hold = CapacityHold.acquire("tent", start, end)
+    set_booking_session(client, {**valid_booking_data, "hold_token": str(hold.token)})
+
+    response = client.post(reverse("booking_form"), data={
+        **valid_booking_data, "booking_type": "tent", "start_date": start.isoformat(), "end_date": end.isoformat(),
+        "tent_length": 3, "tent_width": 2, "cable_length": 10,
+    })
+
+    assert response.status_code == 302
+    assert load_wizard_state(response.cookies[WIZARD_COOKIE_NAME].value)["hold_token"] == str(hold.token)
+
+
 # ------------------------------
 # 2. booking_summary
 # ------------------------------
@@ -122,13 +146,32 @@ def test_booking_summary_displays_correct_prices(mock_deposit, mock_total, clien
     assert response.context["remaining_balance"] == Decimal("70.00")
 
 
+def test_booking_summary_does_not_write_session(client, valid_booking_data):
+    """Browsing the funnel should not create any database session."""
+    set_booking_session(client, valid_booking_data)
+    response = client.get(reverse("booking_summary"))
+
+    assert response.status_code == 200
+    assert not Session.objects.exists()
+
+
+def test_booking_summary_rejects_tampered_state(client, valid_booking_data):
+    """A wizard cookie that fails the signature check should send the user back to the form."""
+    client.cookies[WIZARD_COOKIE_NAME] = dump_wizard_state(valid_booking_data) + "x"
+    response = client.get(reverse("booking_summary"))
+
+    assert response.status_code == 302
+    assert response.url == reverse("booking_form")
+
+
 # ------------------------------
 # 3. booking_details
 # ------------------------------
 @patch("stripe.checkout.Session.create")
 @patch("bookings.models.Booking.calculate_deposit", return_value=Decimal("50.00"))
 def test_booking_details_creates_stripe_session(mock_deposit, mock_stripe, client, valid_booking_data, client_details_data, supplements):
-    """Booking details view should create a Stripe session for deposit payment and redirect to Stripe."""
+    """Booking details view should hold a place, create a Stripe session for deposit payment and redirect to Stripe."""
+    Capacity.objects.create(booking_type="tent", max_places=1)
     set_booking_session(client, valid_booking_data)
 
     mock_stripe.return_value = MagicMock(url="https://stripe.com/checkout-session")
@@ -142,14 +185,82 @@ def test_booking_details_creates_stripe_session(mock_deposit, mock_stripe, clien
     assert mock_stripe.call_args.kwargs["mode"] == "payment"
     assert mock_stripe.call_args.kwargs["line_items"][0]["price_data"]["unit_amount"] > 0
 
+    hold = CapacityHold.objects.get()
+    assert mock_stripe.call_args.kwargs["expires_at"] < hold.expires_at.timestamp()
+    assert mock_stripe.call_args.kwargs["idempotency_key"].startswith("checkout-")
+
+
+@patch("stripe.checkout.Session.create")
+def test_booking_details_refuses_when_last_place_is_held(mock_stripe, client, valid_booking_data, client_details_data):
+    """Booking details view should not create a Stripe session when another checkout holds the last place."""
+    Capacity.objects.create(booking_type="tent", max_places=1)
+    CapacityHold.acquire("tent", date(2025, 9, 15), date(2025, 9, 17))
+    set_booking_session(client, valid_booking_data)
+
+    response = client.post(reverse("booking_details"), data=client_details_data)
+
+    assert response.status_code == 200
+    assert response.context["form"].non_field_errors()
+    assert not mock_stripe.called
+
+
+@pytest.fixture
+def fake_stripe(settings):
+    """Runs a local Stripe API answering Checkout session creations; yields the idempotency keys received."""
+    keys = []
+
+    class StripeHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            keys.append(self.headers["Idempotency-Key"])
+            body = json.dumps({"id": "cs_test", "object": "checkout.session", "url": "https://stripe.com/checkout-session"})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StripeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.STRIPE_API_BASE = f"http://127.0.0.1:{server.server_port}"
+    settings.STRIPE_SECRET_KEY = "sk_test_fake"
+    yield keys
+    server.shutdown()
+    server.server_close()
+
+
+def test_booking_details_async_reuses_session_on_resubmit(fake_stripe, valid_booking_data, client_details_data, supplements):
+    """Submitting the same details twice should keep the hold and send the same idempotency key to Stripe."""
+    Capacity.objects.create(booking_type="tent", max_places=1)
+    factory = AsyncRequestFactory()
+    wizard_cookie = dump_wizard_state(valid_booking_data)
+
+    responses = []
+    for _ in range(2):
+        request = factory.post(reverse("booking_details"), data=client_details_data)
+        request.COOKIES[WIZARD_COOKIE_NAME] = wizard_cookie
+        response = async_to_sync(booking_details_async)(request)
+        wizard_cookie = response.cookies[WIZARD_COOKIE_NAME].value
+        responses.append(response)
+
+    assert [response.url for response in responses] == ["https://stripe.com/checkout-session"] * 2
+    assert len(fake_stripe) == 2
+    assert fake_stripe[0] == fake_stripe[1]
+    assert CapacityHold.objects.count() == 1
+
 
 # ------------------------------
 # 4. booking_confirm
 # ------------------------------
 @patch("django.core.mail.EmailMessage.send")
 def test_booking_confirm_saves_booking_and_sends_emails(mock_send, client, valid_booking_data, client_details_data):
-    """Booking confirmation should save the booking, mark deposit as paid, send emails, and clear session."""
-    booking_session_data = {**valid_booking_data, **client_details_data}
+    """Booking confirmation should save the booking, mark deposit as paid, queue emails, and clear session."""
+    hold = CapacityHold.objects.create(booking_type="tent", start_date=date(2025, 9, 15), end_date=date(2025, 9, 17),
+                                       expires_at=timezone.now() + CapacityHold.DURATION)
+    booking_session_data = {**valid_booking_data, **client_details_data, "hold_token": str(hold.token)}
     set_booking_session(client, booking_session_data)
 
     url = reverse("booking_confirm")
@@ -158,10 +269,121 @@ def test_booking_confirm_saves_booking_and_sends_emails(mock_send, client, valid
     booking = Booking.objects.get(email="john@example.com")
     assert booking.deposit_paid is True
     assert booking.start_date == date(2025, 9, 15)
+    assert booking.nights == 2
+    assert booking.total_price is not None and booking.pricing_version
+    assert not CapacityHold.objects.exists()
 
-    assert mock_send.call_count == 2
+    # Emails are queued in the outbox, not sent inline
+    assert mock_send.call_count == 0
+    assert sorted(email.to for email in OutboxEmail.objects.all()) == [[""], ["john@example.com"]]
 
-    assert "booking_data" not in client.session
+    assert client.cookies[WIZARD_COOKIE_NAME].value == ""
 
     messages_list = list(get_messages(response.wsgi_request))
     assert any("Votre réservation a été confirmée" in str(m) for m in messages_list)
+
+
+def test_booking_confirm_replay_cannot_sell_the_last_place_twice(client, valid_booking_data, client_details_data):
+    """Replaying the wizard cookie after its hold was consumed should not save another booking on a full stay."""
+    Capacity.objects.create(booking_type="tent", max_places=1)
+    hold = CapacityHold.acquire("tent", date(2025, 9, 15), date(2025, 9, 17))
+    wizard_cookie = dump_wizard_state({**valid_booking_data, **client_details_data, "hold_token": str(hold.token)})
+
+    for _ in range(3):
+        client.cookies[WIZARD_COOKIE_NAME] = wizard_cookie
+        response = client.get(reverse("booking_confirm"))
+
+    assert Booking.objects.count() == 1
+    assert response.status_code == 302
+    assert response.url == reverse("booking_form")
+
+
+def test_booking_confirm_is_single_use(client, valid_booking_data, client_details_data):
+    """A wizard cookie confirms one booking only, even when places are left."""
+    Capacity.objects.create(booking_type="tent", max_places=5)
+    hold = CapacityHold.acquire("tent", date(2025, 9, 15), date(2025, 9, 17))
+    wizard_cookie = dump_wizard_state({**valid_booking_data, **client_details_data, "hold_token": str(hold.token)})
+
+    for _ in range(2):
+        client.cookies[WIZARD_COOKIE_NAME] = wizard_cookie
+        response = client.get(reverse("booking_confirm"))
+
+    assert Booking.objects.get().hold_token == hold.token
+    assert response.status_code == 302
+    assert any("déjà été confirmée" in str(m) for m in get_messages(response.wsgi_request))
+
+
+def test_booking_admin_list_shows_totals_per_season(client, django_user_model, valid_booking_data, client_details_data):
+    """The admin change list sums the stored prices of the listed bookings per season."""
+    admin = django_user_model.objects.create_superuser(username="gerant", password="x", email="gerant@example.com")
+    client.force_login(admin)
+    Booking.objects.create(**{**client_details_data, "start_date": date(2025, 9, 15), "end_date": date(2025, 9, 17),
+                              "booking_subtype": "tent", "electricity": "yes", "adults": 2})
+    Booking.objects.update(total_price=Decimal("42.00"), deposit_amount=Decimal("6.30"))
+
+    response = client.get(reverse("admin:bookings_booking_changelist"))
+
+    assert response.status_code == 200
+    assert response.context["revenue_by_season"][0]["season"] == 2025
+    assert response.context["revenue_by_season"][0]["total"] == Decimal("42.00")
+    assert "Totaux par saison" in response.content.decode()
+
+
+# ------------------------------
+# 5. booking_availability
+# ------------------------------
+def test_booking_availability_returns_remaining_places(client):
+    """Availability endpoint should return remaining places per night for each main type."""
+    Capacity.objects.create(booking_type='tent', max_places=2)
+    Capacity.objects.create(booking_type='caravan', max_places=1)
+    Booking.objects.create(
+        last_name='A', first_name='A', address='A', postal_code='33000', city='Bordeaux',
+        phone='0600000000', email='a@a.com', electricity='yes',
+        booking_subtype='van', start_date=date(2030, 7, 2), end_date=date(2030, 7, 3),
+    )
+
+    url = reverse("booking_availability")
+    response = client.get(url, {"start": "2030-07-01", "end": "2030-07-04"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["remaining"]["tent"] == [2, 2, 2]
+    assert data["remaining"]["caravan"] == [1, 0, 1]
+    assert data["remaining"]["camping_car"] == [0, 0, 0]
+    assert response["ETag"]
+    assert not response.has_header("Last-Modified")
+
+
+def test_booking_availability_revalidates_with_etag(client):
+    """A matching If-None-Match header should return 304 Not Modified."""
+    Capacity.objects.create(booking_type='tent', max_places=2)
+    url = reverse("booking_availability")
+    params = {"start": "2030-07-01", "end": "2030-07-04"}
+
+    etag = client.get(url, params)["ETag"]
+    response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+
+
+def test_booking_availability_ignores_if_modified_since(client):
+    """A released hold frees a place without a newer date: only the ETag can say the content changed."""
+    Capacity.objects.create(booking_type='tent', max_places=2)
+    hold = CapacityHold.acquire("tent", date(2030, 7, 1), date(2030, 7, 2))
+    url = reverse("booking_availability")
+    params = {"start": "2030-07-01", "end": "2030-07-04"}
+    etag = client.get(url, params)["ETag"]
+
+    CapacityHold.release(hold.token)
+    response = client.get(url, params, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+
+    assert response.status_code == 200
+    assert response.json()["remaining"]["tent"][0] == 2
+    assert client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_booking_availability_rejects_invalid_dates(client):
+    """Malformed or inverted windows should return 400."""
+    url = reverse("booking_availability")
+    assert client.get(url, {"start": "not-a-date"}).status_code == 400
+    assert client.get(url, {"start": "2030-07-04", "end": "2030-07-01"}).status_code == 400
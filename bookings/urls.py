@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -5,6 +6,7 @@ from . import views
 urlpatterns = [
     path('reservation/form/', views.booking_form, name='booking_form'),
     path('reservation/resume/', views.booking_summary, name='booking_summary'),
-    path('reservation/coordonnees/', views.booking_details, name='booking_details'),
+    path('reservation/coordonnees/', views.booking_details_async if settings.ASYNC_CHECKOUT else views.booking_details, name='booking_details'),
     path('reservation/confirmation/', views.booking_confirm, name='booking_confirm'),
+    path('reservation/disponibilites/', views.booking_availability, name='booking_availability'),
 ]
\ No newline at end of file
@@ -1,22 +1,38 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.urls import reverse
 from .forms import BookingFormClassic,BookingDetailsForm
-from .models import Booking, SupplementPrice
+from .models import Booking, Capacity, CapacityHold, NightOccupancy
+from .checkout import checkout_idempotency_key, checkout_session_params, create_checkout_session_async
+from .wizard import get_wizard_state, set_wizard_state, clear_wizard_state, booking_kwargs
+from core.db import retry_on_lock
+from core.metrics import timing
+from core.outbox import queue_emails
 from django.core.mail import EmailMessage
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
-from decimal import Decimal
 from datetime import date
 from django.utils import translation
 from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET
+from datetime import timedelta
+import hashlib, json
 import stripe, socket, traceback
 
 # Stripe configuration
 stripe.api_key = settings.STRIPE_SECRET_KEY
+if settings.STRIPE_API_BASE:
+    stripe.api_base = settings.STRIPE_API_BASE
 site_url = settings.SITE_URL
 
+# Availability calendar
+AVAILABILITY_TYPES = ['tent', 'caravan', 'camping_car']
+AVAILABILITY_MAX_NIGHTS = 366
+
 
 # -----------------------------
 # STEP 1: Reservation form (Booking type and dates)
@@ -30,14 +46,15 @@ def booking_form(request):
 
     Security:
     - Use Django forms for input validation.
-    - Convert decimals and dates to safe formats before saving in session.
+    - Only whitelisted Booking fields are kept in the signed wizard state.
     - Validate capacity with Booking.check_capacity to prevent overbooking.
     """
-    initial_data = request.session.get('booking_data', {})
-    booking_session_data = {}
+    initial_data = get_wizard_state(request)
+    # The hold of a previous checkout is the customer's own place
+    hold_token = initial_data.get('hold_token')
 
     if request.method == 'POST':
-        form = BookingFormClassic(request.POST)
+        form = BookingFormClassic(request.POST, instance=Booking(hold_token=hold_token))
         if form.is_valid():
             booking_data = form.cleaned_data
             booking_subtype = booking_data.get('booking_subtype')
@@ -56,27 +73,16 @@ def booking_form(request):
 
             # Validate availability (capacity)
             try:
-                temp_booking.check_capacity()
+                temp_booking.check_capacity(hold_token=hold_token)
             except ValidationError as e:
                 form.add_error(None, e.messages[0])
                 return render(request, 'bookings/booking_form.html', {'form': form})
             
-            # Safely store data in session
-            for field, value in booking_data.items():
-                if isinstance(value, Decimal):
-                    booking_session_data[field] = float(value)
-                elif isinstance(value, date):
-                    booking_session_data[field] = value.isoformat()
-                else:
-                    booking_session_data[field] = value
-            
-            booking_session_data['booking_type'] = booking_subtype
-            booking_session_data['booking_subtype'] = booking_subtype
-            booking_session_data['electricity'] = booking_data.get('electricity')
-            booking_session_data['is_worker'] = False
-            
-            request.session['booking_data'] = booking_session_data
-            return redirect('booking_summary')
+            # Store the step in the signed wizard cookie (no database write).
+            # The hold token is carried over: the details step keeps or replaces it
+            wizard_data = {**booking_data, 'booking_type': booking_subtype, 'booking_subtype': booking_subtype,
+                           'hold_token': hold_token}
+            return set_wizard_state(redirect('booking_summary'), wizard_data)
     else:
         initial_dict = initial_data.copy()
         if initial_data:
@@ -91,25 +97,17 @@ def booking_form(request):
 def booking_summary(request):
     """
     Display a booking summary before payment.
-    Validates session data and shows:
+    Validates wizard data and shows:
     - Total price
     - Deposit amount
     - Remaining balance
     """
-    booking_data = request.session.get('booking_data')
-    if not booking_data:
+    booking_data = get_wizard_state(request)
+    if not booking_data.get('start_date') or not booking_data.get('end_date'):
         return redirect('booking_form')
-    
-    # Convert stored ISO dates back to date objects
-    start_date = date.fromisoformat(booking_data['start_date'])
-    end_date = date.fromisoformat(booking_data['end_date'])
 
-    # Keep only model fields to avoid injection
-    model_fields = [f.name for f in Booking._meta.get_fields()]
-    booking_data_for_model = {k: v for k, v in booking_data.items() if k in model_fields}
-    booking_data_for_model['start_date'] = start_date
-    booking_data_for_model['end_date'] = end_date
-    booking = Booking(**booking_data_for_model)
+    # The wizard state only holds typed model fields
+    booking = Booking(**booking_kwargs(booking_data))
 
     # Electricity display
     electricity_choice = booking_data.get('electricity', 'yes')
@@ -147,9 +145,8 @@ def booking_summary(request):
     booking.booking_type = subtype_to_main.get(booking_subtype, booking_subtype)
 
     # Price calculations
-    supplement = SupplementPrice.objects.first()
-    total_price = booking.calculate_total_price(supplement=supplement)
-    deposit = booking.calculate_deposit()
+    total_price = booking.calculate_total_price()
+    deposit = booking.calculate_deposit(total_price)
     remaining_balance = round(total_price - deposit, 2)
 
     return render(request, 'bookings/booking_summary.html', {
@@ -162,74 +159,117 @@ def booking_summary(request):
 # -----------------------------
 # STEP 3: Customer details and Stripe session
 # -----------------------------
+def _details_page(request, form, error_message=None):
+    """Render the details step."""
+    context = {
+        'form': form,
+        'STRIPE_PUBLIC_KEY': settings.STRIPE_PUBLIC_KEY,
+    }
+    if error_message:
+        context['error_message'] = error_message
+    return render(request, 'bookings/booking_details.html', context)
+
+
+def _prepare_checkout(request, booking_data):
+    """
+    Validate the details and hold one place until the payment is done.
+
+    Updates booking_data with the details and the hold token.
+
+    Returns:
+        (form, checkout): checkout is (Stripe session params, idempotency key),
+        or None when the form must be shown again
+    """
+    form = BookingDetailsForm(request.POST)
+    if not form.is_valid():
+        return form, None
+
+    booking_data.update(form.cleaned_data)
+    booking = Booking(**booking_kwargs(booking_data))
+
+    # Keeps or replaces the hold of a previous attempt
+    try:
+        hold = CapacityHold.acquire(
+            booking.booking_subtype or booking.booking_type,
+            booking.start_date,
+            booking.end_date,
+            replace_token=booking_data.get('hold_token'),
+        )
+    except ValidationError as e:
+        form.add_error(None, e.messages[0])
+        return form, None
+    booking_data['hold_token'] = str(hold.token)
+
+    deposit = booking.calculate_deposit()
+    return form, (checkout_session_params(booking, deposit, hold), checkout_idempotency_key(booking_data))
+
+
+def _checkout_failed(request, form, booking_data, error):
+    """Release the hold and show the details step again with an error."""
+    print("⚠️ Stripe Error:", error)
+    traceback.print_exc()
+    CapacityHold.release(booking_data.pop('hold_token', None))
+    response = _details_page(request, form, _("Impossible de traiter le paiement pour le moment. Veuillez réessayer."))
+    return set_wizard_state(response, booking_data)
+
+
 def booking_details(request):
     """
     Collect customer's personal details.
-    Once valid, create a Stripe Checkout session for deposit payment.
+    Once valid, hold one place (CapacityHold) and create a Stripe Checkout
+    session for deposit payment. The session expires before the hold.
 
+    The idempotency key comes from the wizard state: submitting the same
+    details again returns the session already created.
 
     Security:
-    - Never trust session directly, always validate with Django form.
+    - Never trust wizard data directly, always validate with Django form.
     - Stripe key is read from Django settings.
     """
-    booking_data = request.session.get('booking_data', {})
+    booking_data = get_wizard_state(request)
 
-    if request.method == 'POST':
-        form = BookingDetailsForm(request.POST)
-        if form.is_valid():
-            booking_data.update(form.cleaned_data)
-            request.session['booking_data'] = booking_data
+    if request.method != 'POST':
+        return _details_page(request, BookingDetailsForm(initial=booking_data))
 
-            # Filter and clean model fields
-            model_fields = [f.name for f in Booking._meta.get_fields()]
-            booking_data = {k: v for k, v in booking_data.items() if k in model_fields}
+    form, checkout = _prepare_checkout(request, booking_data)
+    if checkout is None:
+        return _details_page(request, form)
 
-            # Convert dates safely
-            if isinstance(booking_data.get('start_date'), str):
-                booking_data['start_date'] = date.fromisoformat(booking_data['start_date'])
-            if isinstance(booking_data.get('end_date'), str):
-                booking_data['end_date'] = date.fromisoformat(booking_data['end_date'])
+    params, idempotency_key = checkout
+    try:
+        with timing('stripe'):
+            checkout_session = stripe.checkout.Session.create(**params, idempotency_key=idempotency_key)
+    except stripe.error.StripeError as e:
+        return _checkout_failed(request, form, booking_data, e)
 
-            booking = Booking(**booking_data)
-            deposit = booking.calculate_deposit()
+    return set_wizard_state(redirect(checkout_session.url, code=303), booking_data)
 
-            # Create Stripe Checkout session
-            try:
-                checkout_session = stripe.checkout.Session.create(
-                    payment_method_types=['card'],
-                    line_items=[{
-                        'price_data': {
-                            'currency': 'eur',
-                            'product_data': {
-                                'name': f"Acompte réservation camping ({booking.start_date} - {booking.end_date})",
-                            },
-                            'unit_amount': int(deposit * 100),  # Amount in cents
-                        },
-                        'quantity': 1,
-                    }],
-                    mode='payment',
-                    success_url=f"{settings.SITE_URL}{reverse('booking_confirm')}",
-                    cancel_url=f"{settings.SITE_URL}{reverse('booking_details')}",
-                    customer_email=booking_data.get('email'),
-                )
-            
-                return redirect(checkout_session.url, code=303)
-            except stripe.error.StripeError as e:
-                print("⚠️ Stripe Error:", e)
-                traceback.print_exc()
-                return render(request, 'bookings/booking_details.html', {
-                    'form': form,
-                    'STRIPE_PUBLIC_KEY': settings.STRIPE_PUBLIC_KEY,
-                    'error_message': _("Impossible de traiter le paiement pour le moment. Veuillez réessayer.")
-                })
-    else:
-        form = BookingDetailsForm(initial=booking_data)
 
-    return render(request, 'bookings/booking_details.html', {
-        'form': form,
-        'STRIPE_PUBLIC_KEY': settings.STRIPE_PUBLIC_KEY
+async def booking_details_async(request):
+    """
+    Async variant of booking_details, used under ASGI (settings.ASYNC_CHECKOUT).
 
-    })
+    The form, the hold and the rendering run in a worker thread; the Stripe
+    call is awaited on the event loop through a pooled httpx client
+    (bookings.checkout), so a slow Stripe response holds no worker.
+    """
+    booking_data = get_wizard_state(request)
+
+    if request.method != 'POST':
+        return await sync_to_async(_details_page)(request, BookingDetailsForm(initial=booking_data))
+
+    form, checkout = await sync_to_async(_prepare_checkout)(request, booking_data)
+    if checkout is None:
+        return await sync_to_async(_details_page)(request, form)
+
+    params, idempotency_key = checkout
+    try:
+        with timing('stripe'):
+            checkout_session = await create_checkout_session_async(params, idempotency_key)
+    except stripe.error.StripeError as e:
+        return await sync_to_async(_checkout_failed)(request, form, booking_data, e)
+
+    return set_wizard_state(redirect(checkout_session.url, code=303), booking_data)
 
 # -----------------------------
 # STEP 4: Confirmation and email sending
@@ -238,45 +278,41 @@ def booking_confirm(request):
     """
     Final step:
     - Verify data integrity
-    - Save booking in DB
-    - Send confirmation emails (admin + customer)
-    - Clear session
+    - Save booking in DB in place of its capacity hold (capacity is checked
+      again when the hold is gone)
+    - Queue confirmation emails (admin + customer) in the outbox
+    - Clear wizard state
 
 
     Security:
     - Validate required fields before saving.
-    - Remove all booking data from session after confirmation.
+    - A wizard state confirms one booking only (Booking.hold_token is unique).
+    - Remove the wizard cookie after confirmation.
     """
-    booking_data = request.session.get('booking_data')
+    booking_data = get_wizard_state(request)
 
     if not booking_data:
         messages.error(request, _("Aucune donnée de réservation trouvée. Veuillez recommencer le processus de réservation."))
         return redirect('booking_form')
     
     required_fields = ['first_name', 'last_name', 'address', 'postal_code', 'city', 'email', 'phone']
-    if not all(field in booking_data for field in required_fields):
+    if not all(booking_data.get(field) for field in required_fields):
         messages.error(request, _("Les informations de contact sont incomplètes. Veuillez compléter vos coordonnées."))
         return redirect('booking_details')
 
-    # Convert dates
-    booking_data['start_date'] = date.fromisoformat(booking_data['start_date'])
-    booking_data['end_date'] = date.fromisoformat(booking_data['end_date'])
+    # The hold taken at the payment step identifies this confirmation
+    hold_token = booking_data.get('hold_token')
+    if not hold_token:
+        messages.error(request, _("Le paiement de l'acompte n'a pas été initié. Veuillez valider vos coordonnées."))
+        return redirect('booking_details')
 
     # Save client address details for email
     client_address = booking_data.get('address')
     client_postal_code = booking_data.get('postal_code')
     client_city = booking_data.get('city')
 
-    # Rebuild the Booking object with model fields
-    model_fields = [f.name for f in Booking._meta.get_fields()]
-    booking_data = {k: v for k, v in booking_data.items() if k in model_fields}
-    booking = Booking(**booking_data)
-
-    # Additional fields
-    booking.vehicle_length = booking_data.get('vehicle_length')
-    booking.tent_length = booking_data.get('tent_length')
-    booking.tent_width = booking_data.get('tent_width')
-    booking.cable_length = booking_data.get('cable_length')
+    # Rebuild the Booking object from the typed wizard fields
+    booking = Booking(**booking_kwargs(booking_data))
 
     # Electricity display
     electricity_choice = booking_data.get('electricity', 'yes')
@@ -296,13 +332,38 @@ def booking_confirm(request):
     booking.is_tent = booking.booking_subtype in ['tent', 'car_tent']
     booking.is_vehicle = booking.booking_subtype in ['caravan', 'fourgon', 'van', 'camping_car']
 
-    supplement = SupplementPrice.objects.first()
-    total_price = booking.calculate_total_price(supplement=supplement)
-    deposit = booking.calculate_deposit()
-    
-    # Mark deposit as paid and save
+    # The price is stored with the booking, as quoted at confirmation
+    booking.snapshot_price()
+    total_price, deposit = booking.total_price, booking.deposit_amount
+
+    # Mark deposit as paid and save; the booking now takes the place of its hold
     booking.deposit_paid = True
-    booking.save()
+    booking.hold_token = hold_token
+
+    @retry_on_lock
+    def save_booking():
+        # Single use: the cookie cannot be revoked, but its hold token is
+        # stored (unique) on the booking it confirmed
+        if Booking.objects.filter(hold_token=hold_token).exists():
+            return False
+        # Under the write lock: without its active hold (expired), the
+        # booking only fits if a place is still free
+        if not CapacityHold.consume(hold_token):
+            list(Capacity.objects.select_for_update().filter(booking_type=booking.ledger_span()[0]))
+            booking.check_capacity()
+        booking.save()
+        return True
+
+    try:
+        saved = save_booking()
+    except ValidationError as e:
+        print("⚠️ Confirmation refusée :", e.messages[0])
+        messages.error(request, _("Plus de places disponibles pour ces dates : votre réservation n'a pas pu être enregistrée. "
+                                  "Veuillez contacter le camping pour le remboursement de l'acompte."))
+        return clear_wizard_state(redirect('booking_form'))
+    if not saved:
+        messages.info(request, _("Cette réservation a déjà été confirmée."))
+        return clear_wizard_state(redirect('booking_form'))
 
     site_url = getattr(settings, "SITE_URL", "http://127.0.0.1:8000")
 
@@ -311,6 +372,7 @@ def booking_confirm(request):
     is_render = "render" in hostname or "onrender" in site_url
 
     # Email to admin
+    emails = []
     try:
         with translation.override('fr'):
             extra_info_1 = ""
@@ -354,7 +416,7 @@ def booking_confirm(request):
                     to=[settings.ADMIN_EMAIL],
                 )
                 email_admin.content_subtype = "html"
-                email_admin.send(fail_silently=False)
+                emails.append(email_admin)
 
         # Email to client in selected language
         with translation.override(request.LANGUAGE_CODE):
@@ -396,26 +458,77 @@ def booking_confirm(request):
                     to=[booking.email],
                 )
                 email_client.content_subtype = "html"
-                email_client.send(fail_silently=False)
+                emails.append(email_client)
+
+        # Queued in the outbox (one INSERT), sent by the send_outbox command
+        queue_emails(emails)
     
     except Exception as e:
         print("⚠️ Erreur lors de l'envoi des emails :", e)
         messages.warning(request, _("Votre réservation est enregistrée, mais une erreur est survenue lors de l'envoi des emails. Veuillez contacter l'administrateur."))
 
-    # Clean session
-    if 'booking_data' in request.session:
-        del request.session['booking_data']
-    
     messages.success(
         request, 
         _("Merci ! Votre réservation a été confirmée. Un email de confirmation vous a été envoyé." if not is_render else
           "Merci ! Votre réservation a été confirmée. (Simulation d'envoi d'email sur Render.)")
     )
 
-    return render(request, 'bookings/booking_confirm.html', {
+    response = render(request, 'bookings/booking_confirm.html', {
         'booking': booking,
         'total_price': total_price,
         'deposit': deposit,
         'remaining_balance': round(total_price - deposit, 2)
     })
+    return clear_wizard_state(response)
+
+
+# -----------------------------
+# Availability calendar (JSON, used by the date pickers)
+# -----------------------------
+@require_GET
+def booking_availability(request):
+    """
+    Return remaining places per night and per main type as JSON.
+
+    Query parameters:
+    - start: first night (ISO date), defaults to today
+    - end: day after the last night (ISO date), defaults to start + 366 days
+
+    Response:
+    {"start": "2025-07-01", "end": "2025-07-04",
+     "remaining": {"tent": [3, 2, 0], "caravan": [...], "camping_car": [...]}}
+
+    Security:
+    - Only dates are read from the query string and validated.
+    - The window is capped to AVAILABILITY_MAX_NIGHTS nights.
+    - Served with an ETag of the content so clients can revalidate cheaply.
+      No Last-Modified: holds expire and are released, and capacities are
+      edited, without any timestamp moving forward, so only the content
+      tells whether the answer changed.
+    """
+    try:
+        start_date = date.fromisoformat(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+        end_date = date.fromisoformat(request.GET['end']) if request.GET.get('end') else start_date + timedelta(days=AVAILABILITY_MAX_NIGHTS)
+    except ValueError:
+        return JsonResponse({'error': _("Dates invalides.")}, status=400)
+
+    if end_date <= start_date:
+        return JsonResponse({'error': _("La date de fin doit être postérieure à la date de début.")}, status=400)
+    end_date = min(end_date, start_date + timedelta(days=AVAILABILITY_MAX_NIGHTS))
+
+    remaining = NightOccupancy.availability(start_date, end_date, AVAILABILITY_TYPES)
+    payload = {
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'remaining': remaining,
+    }
+    content = json.dumps(payload, separators=(',', ':'))
+    etag = '"%s"' % hashlib.md5(content.encode(), usedforsecurity=False).hexdigest()
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(payload, json_dumps_params={'separators': (',', ':')})
 
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,136 @@
+"""
+Booking wizard state.
+
+The four steps of the booking funnel (form, summary, details, confirm) carry
+their data in a signed, compressed cookie instead of the database session, so
+browsing the funnel does not write anything until the booking is confirmed.
+
+The token holds a format version, the Booking fields filled so far and the
+token of the CapacityHold taken at the payment step. Only the fields listed in
+WIZARD_FIELDS are kept, and values are restored to their model type (dates,
+Decimals, integers) when the token is read. A token that is tampered with,
+expired or written by another format version is ignored.
+"""
+import datetime
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core import signing
+from .models import Booking
+
+
+WIZARD_COOKIE_NAME = 'booking_wizard'
+WIZARD_SALT = 'bookings.wizard'
+WIZARD_VERSION = 1
+WIZARD_MAX_AGE = 60 * 60 * 24  # One day
+
+# Fields set by the server only, never carried by the wizard
+SERVER_FIELDS = ('id', 'deposit_paid', 'hold_token', 'created_at', 'updated_at')
+
+
+def _decimal(value):
+    return Decimal(str(value))
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+_LOADERS = {
+    'DateField': _date,
+    'DecimalField': _decimal,
+    'PositiveIntegerField': int,
+    'IntegerField': int,
+    'BooleanField': bool,
+}
+
+# {field name: loader}, computed once from the Booking model
+WIZARD_FIELDS = {
+    field.name: _LOADERS.get(field.get_internal_type(), str)
+    for field in Booking._meta.concrete_fields
+    if field.name not in SERVER_FIELDS
+}
+
+# Wizard-only fields, not passed to Booking
+EXTRA_FIELDS = {
+    'hold_token': str,
+}
+WIZARD_FIELDS.update(EXTRA_FIELDS)
+
+
+def _dump_value(value):
+    """Return a JSON-friendly version of a field value."""
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def dump_wizard_state(data):
+    """Return the signed token holding the whitelisted fields of data."""
+    fields = {
+        name: _dump_value(value)
+        for name, value in data.items()
+        if name in WIZARD_FIELDS
+    }
+    return signing.dumps([WIZARD_VERSION, fields], salt=WIZARD_SALT, compress=True)
+
+
+def load_wizard_state(token):
+    """
+    Return the typed fields stored in a token.
+
+    Returns an empty dict when the token is missing, invalid, expired or from
+    another format version.
+    """
+    if not token:
+        return {}
+    try:
+        version, fields = signing.loads(token, salt=WIZARD_SALT, max_age=WIZARD_MAX_AGE)
+    except (signing.BadSignature, TypeError, ValueError):
+        return {}
+    if version != WIZARD_VERSION or not isinstance(fields, dict):
+        return {}
+
+    state = {}
+    for name, value in fields.items():
+        loader = WIZARD_FIELDS.get(name)
+        if loader is None:
+            continue
+        if value is None:
+            state[name] = None
+            continue
+        try:
+            state[name] = loader(value)
+        except (TypeError, ValueError, InvalidOperation):
+            return {}
+    return state
+
+
+def booking_kwargs(state):
+    """Return the Booking fields of a wizard state, without the wizard-only fields."""
+    return {name: value for name, value in state.items() if name not in EXTRA_FIELDS}
+
+
+def get_wizard_state(request):
+    """Return the wizard state of the request (empty dict when there is none)."""
+    return load_wizard_state(request.COOKIES.get(WIZARD_COOKIE_NAME))
+
+
+def set_wizard_state(response, data):
+    """Store the wizard state on the response cookie."""
+    response.set_cookie(
+        WIZARD_COOKIE_NAME,
+        dump_wizard_state(data),
+        max_age=WIZARD_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )
+    return response
+
+
+def clear_wizard_state(response):
+    """Remove the wizard state cookie."""
+    response.delete_cookie(WIZARD_COOKIE_NAME, samesite='Lax')
+    return response
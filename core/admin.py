@@ -1,7 +1,8 @@
 from django.contrib import admin
 from parler.admin import TranslatableAdmin
-from .models import CampingInfo, SwimmingPoolInfo, FoodInfo, LaundryInfo
+from .models import CampingInfo, SwimmingPoolInfo, FoodInfo, LaundryInfo, OutboxEmail
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 
 
 @admin.register(CampingInfo)
@@ -134,4 +135,30 @@ class LaundryInfoAdmin(TranslatableAdmin):
                 'dryer_price',
             )
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """
+    Admin interface for the email outbox.
+
+    - Lists queued, sent and dead emails with their last error
+    - Action to put failed emails back in the queue
+    """
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = ('subject', 'body', 'content_subtype', 'from_email', 'to', 'attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['requeue']
+
+    @admin.action(description="Remettre en file d'attente")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=OutboxEmail.STATUS_SENT).update(
+            status=OutboxEmail.STATUS_PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f"{count} email(s) remis en file d'attente.")
+
+    def has_add_permission(self, request):
+        return False
@@ -9,4 +9,6 @@ class CoreConfig(AppConfig):
     name = 'core'
     verbose_name = "Informations diverses"
 
-
+    def ready(self):
+        """Connect signals (page cache invalidation, request metrics)."""
+        from . import signals  # noqa: F401
@@ -0,0 +1,119 @@
+"""
+Chunked batch jobs.
+
+run_in_chunks() applies an action (update, delete...) to a queryset a few rows
+at a time, in primary key order: each chunk is its own short transaction, so
+SQLite's write lock is released between chunks and live checkouts are not
+blocked for the whole job. An optional pause between chunks throttles it
+further.
+
+The last primary key done is written to a checkpoint file after each chunk:
+an interrupted job started again with the same checkpoint resumes after it.
+The file is removed once the job is finished.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from .db import retry_on_lock
+
+
+@dataclass
+class BatchStats:
+    """Progress of a chunked job."""
+    total: int = 0  # Rows to process when the run started
+    done: int = 0
+    chunks: int = 0
+    resumed_after: object = None  # Primary key of the checkpoint, if any
+    start: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    @property
+    def rate(self):
+        """Rows per second."""
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+
+def read_checkpoint(path, job):
+    """Return the last primary key done by job, or None (missing file or other job)."""
+    if not path:
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return checkpoint.get('last_pk') if checkpoint.get('job') == job else None
+
+
+def write_checkpoint(path, job, last_pk):
+    """Store the last primary key done, atomically."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'job': job, 'last_pk': last_pk}, f)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def pending(queryset, after_pk=None):
+    """Return the rows of queryset not done yet, in primary key order."""
+    if after_pk is not None:
+        queryset = queryset.filter(pk__gt=after_pk)
+    return queryset.order_by('pk')
+
+
+def run_in_chunks(queryset, action, job, chunk_size=500, pause=0.0, checkpoint=None, progress=None):
+    """
+    Apply action to queryset chunk by chunk.
+
+    Args:
+        queryset: rows to process
+        action: callable receiving the queryset of one chunk, run in a
+            transaction (retried when the database is locked)
+        job: name stored in the checkpoint, so another job (or the same one
+            with other options) does not resume from it
+        chunk_size: rows per chunk (and per transaction)
+        pause: seconds to sleep between chunks
+        checkpoint: path of the checkpoint file, or None to disable it
+        progress: optional callable receiving the BatchStats after each chunk
+
+    Returns:
+        BatchStats
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be a positive integer, got {chunk_size}")
+
+    last_pk = read_checkpoint(checkpoint, job)
+    stats = BatchStats(total=pending(queryset, last_pk).count(), resumed_after=last_pk)
+
+    while True:
+        pks = list(pending(queryset, last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+
+        retry_on_lock(action)(queryset.filter(pk__in=pks))
+        last_pk = pks[-1]
+        if checkpoint:
+            write_checkpoint(checkpoint, job, last_pk)
+
+        stats.done += len(pks)
+        stats.chunks += 1
+        if progress:
+            progress(stats)
+        if len(pks) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    clear_checkpoint(checkpoint)
+    return stats
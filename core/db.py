@@ -0,0 +1,193 @@
+"""
+SQLite helpers.
+
+The connection tuning itself (WAL, busy_timeout, BEGIN IMMEDIATE...) lives in
+settings.DATABASES; see SQLITE_PRAGMAS.
+
+retry_on_lock() runs a write transaction again, after a jittered exponential
+backoff, when SQLite still reports the database as locked once busy_timeout
+has expired (or at once for shared-cache connections, which ignore it).
+
+benchmark_sqlite() measures what the tuning changes: several processes, like
+gunicorn workers, write sessions and read pages on a shared database file.
+
+explain_query_plan() and find_full_scans() audit the plans SQLite picks for
+a queryset (see the explain_queries command).
+"""
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+
+
+LOCK_RETRIES = 8
+LOCK_RETRY_DELAY = 0.05  # Seconds, doubled on each retry
+
+
+def is_lock_error(error):
+    """Return True for the SQLite "database is locked/busy" errors."""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def retry_on_lock(func=None, *, retries=LOCK_RETRIES, delay=LOCK_RETRY_DELAY):
+    """
+    Run a function in a transaction, retried when the database is locked.
+
+    Only the outermost transaction can be retried: inside another atomic
+    block the error is raised to it.
+
+    Usage:
+        @retry_on_lock
+        def save_booking(): ...
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            wait = delay
+            for attempt in range(retries + 1):
+                try:
+                    with transaction.atomic():
+                        return func(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_lock_error(e) or attempt == retries or connection.in_atomic_block:
+                        raise
+                    time.sleep(wait * (1 + random.random()))
+                    wait *= 2
+        return wrapper
+
+    return decorator(func) if func else decorator
+
+
+# ============================================
+# Query plans
+# ============================================
+
+# "SCAN bookings_booking" (SQLite >= 3.36) or "SCAN TABLE bookings_booking",
+# without "USING [COVERING] INDEX": every row of the table is read
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+def explain_query_plan(queryset):
+    """Return the steps of the SQLite query plan of a queryset (EXPLAIN QUERY PLAN details)."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def find_full_scans(plan):
+    """Return the tables read entirely by a query plan."""
+    return [match.group(1) for match in map(FULL_SCAN_RE.match, plan) if match]
+
+
+# ============================================
+# Benchmark
+# ============================================
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 0,
+}
+
+
+def _open(path, pragmas, immediate):
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn, ('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+
+
+def _worker(path, pragmas, immediate, retry, duration, write_ratio, seed):
+    """
+    Run requests for duration seconds: each one reads a page worth of rows, and
+    some also save a session in a transaction.
+
+    Returns:
+        (latencies in ms, number of "database is locked" failures)
+    """
+    rng = random.Random(seed)
+    conn, begin = _open(path, pragmas, immediate)
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + duration
+
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        write = rng.random() < write_ratio
+        wait = LOCK_RETRY_DELAY / 10
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                conn.execute('SELECT key, data FROM session ORDER BY expire DESC LIMIT 20').fetchall()
+                if write:
+                    conn.execute(begin)
+                    conn.execute('SELECT COUNT(*) FROM session').fetchone()
+                    conn.execute(
+                        'INSERT OR REPLACE INTO session (key, data, expire) VALUES (?, ?, ?)',
+                        (f'k{rng.randrange(5000)}', 'x' * 500, time.time()),
+                    )
+                    conn.execute('COMMIT')
+                latencies.append((time.perf_counter() - start) * 1000)
+                break
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                if not is_lock_error(e) or not retry or attempt == LOCK_RETRIES:
+                    failures += 1
+                    break
+                time.sleep(wait * (1 + rng.random()))
+                wait *= 2
+    conn.close()
+    return latencies, failures
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def benchmark_sqlite(workers=4, duration=3.0, write_ratio=0.2):
+    """
+    Compare Django's default SQLite setup with the tuned one.
+
+    Returns:
+        dict: {setup name: {'requests', 'failures', 'p50_ms', 'p95_ms', 'p99_ms'}}
+    """
+    tuned = {name: value for name, value in settings.SQLITE_PRAGMAS.items()}
+    setups = {
+        'défaut': (DEFAULT_PRAGMAS, False, False),
+        'optimisé': (tuned, True, True),
+    }
+
+    results = {}
+    for name, (pragmas, immediate, retry) in setups.items():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            conn, _ = _open(path, pragmas, immediate)
+            conn.execute('CREATE TABLE session (key TEXT PRIMARY KEY, data TEXT, expire REAL)')
+            conn.executemany('INSERT INTO session VALUES (?, ?, ?)', [(f'k{i}', 'x' * 500, i) for i in range(5000)])
+            conn.close()
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                runs = list(pool.map(
+                    _worker,
+                    *zip(*[(path, pragmas, immediate, retry, duration, write_ratio, seed) for seed in range(workers)]),
+                ))
+
+        latencies = [latency for run_latencies, _ in runs for latency in run_latencies]
+        results[name] = {
+            'requests': len(latencies),
+            'failures': sum(failures for _, failures in runs),
+            'p50_ms': round(_percentile(latencies, 0.50), 2),
+            'p95_ms': round(_percentile(latencies, 0.95), 2),
+            'p99_ms': round(_percentile(latencies, 0.99), 2),
+        }
+    return results
@@ -0,0 +1,210 @@
+"""
+Responsive image derivatives.
+
+build_images() resizes every photo and icon found in STATICFILES_DIRS into
+AVIF, WebP and JPEG (PNG for images with transparency) copies at the widths of
+IMAGE_WIDTHS, never upscaling. The copies are written under static/responsive/,
+so collectstatic hashes and serves them like any other static file.
+
+A manifest (static/responsive/manifest.json) records the content hash of each
+source and the copies built from it: only new or changed sources are
+processed again, in a process pool, and the copies of removed sources are
+deleted.
+
+The {% responsive_image %} tag (core.templatetags.responsive_images) reads the
+manifest to emit <picture> sources with srcset/sizes.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+
+
+RESPONSIVE_DIR = 'responsive'
+MANIFEST_NAME = 'manifest.json'
+IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Pillow format name, file extension and save options of each output format
+OUTPUT_FORMATS = {
+    'avif': ('AVIF', 'avif', {'quality': 55}),
+    'webp': ('WEBP', 'webp', {'quality': 75, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'png', {'optimize': True}),
+}
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+
+def images_dir():
+    """Return the static directory holding the source images and the derivatives."""
+    return str(settings.STATICFILES_DIRS[0])
+
+
+def file_hash(path):
+    """Return the SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_sources(static_dir):
+    """
+    Return the relative paths (with forward slashes) of the source images.
+    A hand-exported .webp next to a .jpg/.png of the same name is a copy, not a source.
+    """
+    sources = []
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.relpath(root, static_dir) == '.' and RESPONSIVE_DIR in dirs:
+            dirs.remove(RESPONSIVE_DIR)
+        stems = {os.path.splitext(name)[0] for name in files if name.lower().endswith(('.jpg', '.jpeg', '.png'))}
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in SOURCE_EXTENSIONS:
+                continue
+            if ext.lower() == '.webp' and stem in stems:
+                continue
+            sources.append(os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/'))
+    return sorted(sources)
+
+
+def target_widths(width):
+    """Return the widths to build for a source of the given width (no upscaling)."""
+    widths = [w for w in IMAGE_WIDTHS if w < width]
+    widths.append(min(width, IMAGE_WIDTHS[-1]))
+    return widths
+
+
+def derivative_name(source, width, image_format):
+    """Return the relative path of one derivative, e.g. responsive/pictures/bordeaux-640.avif."""
+    stem = os.path.splitext(source)[0]
+    return f"{RESPONSIVE_DIR}/{stem}-{width}.{OUTPUT_FORMATS[image_format][1]}"
+
+
+def build_derivatives(static_dir, source, source_hash):
+    """
+    Build every derivative of one source image and return its manifest entry.
+    Runs in a worker process.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(os.path.join(static_dir, source)) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    fallback = 'png' if has_alpha else 'jpeg'
+    variants = {'avif': [], 'webp': [], fallback: []}
+
+    for width in target_widths(image.width):
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for image_format in variants:
+            pil_format, _, options = OUTPUT_FORMATS[image_format]
+            name = derivative_name(source, width, image_format)
+            path = os.path.join(static_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            resized.save(path, pil_format, **options)
+            variants[image_format].append([width, name])
+
+    return {
+        'hash': source_hash,
+        'width': image.width,
+        'height': image.height,
+        'fallback': fallback,
+        'variants': variants,
+    }
+
+
+def manifest_path(static_dir):
+    return os.path.join(static_dir, RESPONSIVE_DIR, MANIFEST_NAME)
+
+
+def read_manifest(static_dir):
+    """Return the manifest of a static directory ({} if it was never built)."""
+    try:
+        with open(manifest_path(static_dir), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _entry_files(entry):
+    return {name for widths in entry['variants'].values() for _, name in widths}
+
+
+def _remove_files(static_dir, names):
+    for name in names:
+        try:
+            os.remove(os.path.join(static_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def build_images(static_dir=None, jobs=None, force=False):
+    """
+    Build the derivatives of new and changed sources and update the manifest.
+
+    Returns:
+        (built, unchanged, removed): lists of source paths
+    """
+    static_dir = static_dir or images_dir()
+    manifest = read_manifest(static_dir)
+    sources = find_sources(static_dir)
+
+    todo, unchanged = [], []
+    for source in sources:
+        source_hash = file_hash(os.path.join(static_dir, source))
+        entry = manifest.get(source)
+        up_to_date = (
+            entry is not None
+            and entry['hash'] == source_hash
+            and all(os.path.exists(os.path.join(static_dir, name)) for name in _entry_files(entry))
+        )
+        if up_to_date and not force:
+            unchanged.append(source)
+        else:
+            todo.append((source, source_hash))
+
+    removed = [source for source in manifest if source not in sources]
+    for source in removed:
+        _remove_files(static_dir, _entry_files(manifest.pop(source)))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            entries = pool.map(build_derivatives, [static_dir] * len(todo), *zip(*todo))
+            for (source, _), entry in zip(todo, entries):
+                previous = manifest.get(source)
+                if previous:
+                    _remove_files(static_dir, _entry_files(previous) - _entry_files(entry))
+                manifest[source] = entry
+
+    path = manifest_path(static_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    return [source for source, _ in todo], unchanged, removed
+
+
+_manifest_cache = (None, {})
+
+
+def get_manifest():
+    """Return the manifest of the static images directory, reloaded when the file changes."""
+    global _manifest_cache
+    static_dir = images_dir()
+    try:
+        key = (static_dir, os.stat(manifest_path(static_dir)).st_mtime_ns)
+    except OSError:
+        return {}
+    if _manifest_cache[0] != key:
+        _manifest_cache = (key, read_manifest(static_dir))
+    return _manifest_cache[1]
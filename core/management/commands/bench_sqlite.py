@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from core.db import benchmark_sqlite
+
+class Command(BaseCommand):
+    help = "Compare la configuration SQLite par défaut et la configuration optimisée sous écritures concurrentes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help="Nombre de processus simulant les workers gunicorn (par défaut : 4)"
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=3.0,
+            help="Durée de chaque mesure en secondes (par défaut : 3)"
+        )
+        parser.add_argument(
+            '--write-ratio',
+            type=float,
+            default=0.2,
+            help="Part des requêtes qui écrivent une session (par défaut : 0.2)"
+        )
+
+    def handle(self, *args, **options):
+        results = benchmark_sqlite(options['workers'], options['duration'], options['write_ratio'])
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:10} {result['requests']:7} requêtes, {result['failures']:5} échecs (base verrouillée), "
+                f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms"
+            )
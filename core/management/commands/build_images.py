@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from core.images import IMAGE_WIDTHS, build_images
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons AVIF/WebP/JPEG redimensionnées des images statiques (seules les images modifiées sont retraitées)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=None,
+            help="Nombre de processus (par défaut : nombre de processeurs)"
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Régénère toutes les images, même inchangées"
+        )
+
+    def handle(self, *args, **options):
+        built, unchanged, removed = build_images(jobs=options['jobs'], force=options['force'])
+        for source in built:
+            self.stdout.write(f"  {source}")
+        self.stdout.write(
+            f"{len(built)} images générées ({', '.join(map(str, IMAGE_WIDTHS))} px max), "
+            f"{len(unchanged)} inchangées, {len(removed)} supprimées."
+        )
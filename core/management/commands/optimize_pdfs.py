@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core.pdfs import optimize_pdfs
+
+class Command(BaseCommand):
+    help = "Linéarise et recompresse les PDF des médias et des documents statiques (affichage progressif)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Retraite aussi les PDF déjà linéarisés"
+        )
+
+    def handle(self, *args, **options):
+        optimized, skipped = optimize_pdfs(force=options['force'])
+        for path, size_before, size_after in optimized:
+            self.stdout.write(f"  {path} : {size_before // 1024} Ko -> {size_after // 1024} Ko")
+        self.stdout.write(f"{len(optimized)} PDF optimisés, {len(skipped)} déjà linéarisés.")
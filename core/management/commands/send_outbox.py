@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand
+from core.outbox import DEFAULT_MAX_ATTEMPTS, send_pending_emails
+
+class Command(BaseCommand):
+    help = "Envoie les emails en file d'attente (outbox) par lots sur une seule connexion SMTP"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help="Nombre d'emails envoyés par connexion"
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help="Nombre de tentatives avant de marquer un email en échec définitif"
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Tourne en continu au lieu de vider la file une seule fois"
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help="Pause en secondes entre deux vérifications en mode --loop"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total_sent, total_failed = 0, 0
+
+            # Drain everything that is due, one batch (and one connection) at a time
+            while True:
+                sent, failed = send_pending_emails(options['batch_size'], options['max_attempts'])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < options['batch_size']:
+                    break
+
+            if total_sent or total_failed or not options['loop']:
+                self.stdout.write(f"{total_sent} emails envoyés, {total_failed} en échec.")
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
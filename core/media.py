@@ -0,0 +1,159 @@
+"""
+Media file serving.
+
+serve_media() serves the uploaded files of MEDIA_ROOT (mobile-home brochures
+and inventories) in production, where django.conf.urls.static does nothing:
+
+- ETag and Last-Modified validators, answered with 304 Not Modified;
+- single byte ranges (Range / If-Range), so browsers and PDF viewers can
+  resume downloads and fetch pages of a linearized PDF before the rest;
+- FileResponse streaming: the WSGI server sends the file (or the requested
+  range) with sendfile() when it supports it. Under ASGI, Django reads the
+  response into memory first, so production serves the WSGI application;
+- optional offload to the front server with X-Accel-Redirect (nginx,
+  MEDIA_ACCEL_REDIRECT_PREFIX) or X-Sendfile (Apache/lighttpd, MEDIA_X_SENDFILE),
+  which then handles ranges itself.
+"""
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24  # One day: uploads keep their name when replaced
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """
+    Read-only view of the bytes [start, start + length) of an open file.
+
+    fileno() is kept so a WSGI file wrapper can use sendfile() from the current
+    offset for the Content-Length of the response.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) byte positions (end included) of a Range header.
+
+    Returns None when the header is absent or not a single byte range (the
+    whole file is then served), and raises ValueError when the range cannot
+    be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+
+def if_range_matches(request, etag, mtime):
+    """Return True when the If-Range validator (if any) still matches the file."""
+    validator = request.META.get('HTTP_IF_RANGE')
+    if not validator:
+        return True
+    if validator.startswith(('"', 'W/')):
+        return validator == etag
+    return parse_http_date_safe(validator) == int(mtime)
+
+
+def offload_response(path, relative_path):
+    """Return a response handing the file to the front server, or None."""
+    prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    if prefix:
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative_path
+        return response
+    if getattr(settings, 'MEDIA_X_SENDFILE', False):
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+    return None
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file of MEDIA_ROOT with validators, byte ranges and sendfile (WSGI).
+
+    Security:
+        - The path is joined with safe_join(): no access outside MEDIA_ROOT.
+        - Only GET and HEAD are allowed.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Fichier introuvable")
+    if not os.path.isfile(full_path):
+        raise Http404("Fichier introuvable")
+
+    stat = os.stat(full_path)
+    etag = quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+    last_modified = http_date(stat.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return not_modified
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    response = offload_response(full_path, path.replace(os.sep, '/'))
+
+    if response is None:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{stat.st_size}"
+            return response
+        if byte_range and not if_range_matches(request, etag, stat.st_mtime):
+            byte_range = None
+
+        file = open(full_path, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(FileRange(file, start, end - start + 1), status=206,
+                                    content_type=content_type, filename=os.path.basename(full_path))
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+        else:
+            response = FileResponse(file, content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Type'] = content_type
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    patch_cache_control(response, public=True, max_age=MEDIA_CACHE_MAX_AGE)
+    return response
@@ -0,0 +1,242 @@
+"""
+Request metrics.
+
+MetricsMiddleware (core.middleware) opens a RequestTimings for each request and
+fills it with:
+- the query count and time of every database connection (execute_wrapper
+  installed on each new connection, see install_query_timer);
+- the template render time (InstrumentedDjangoTemplates, the template backend);
+- the time spent calling Stripe and DeepL, measured by timing() around those
+  calls (emails are sent by the send_outbox command, outside requests).
+
+Staff users get them in a Server-Timing header (visible in the browser
+developer tools). Every request is also added to in-process histograms per
+URL name, exposed in the Prometheus text format by core.views.metrics_view.
+Each gunicorn worker keeps its own histograms.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from asgiref.local import Local
+from django.template.backends.django import DjangoTemplates, Template
+
+
+# Upper bounds of the histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Outbound services measured with timing()
+EXTERNAL_SERVICES = ('stripe', 'deepl')
+
+_local = Local()
+
+
+class RequestTimings:
+    """Durations (seconds) and query count of one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.durations = dict.fromkeys(('db', 'template', *EXTERNAL_SERVICES), 0.0)
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """Return the Server-Timing header value."""
+        entries = [f'db;dur={self.durations["db"] * 1000:.1f};desc="{self.queries} queries"']
+        entries += [
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.durations.items()
+            if name != 'db' and duration
+        ]
+        entries.append(f'total;dur={self.total() * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def start_request():
+    """Start measuring the current request."""
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def end_request():
+    """Stop measuring the current request."""
+    _local.timings = None
+
+
+def current_timings():
+    """Return the RequestTimings of the current request, or None outside requests."""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def timing(name):
+    """
+    Add the duration of a block to the current request.
+
+    Usage:
+        with timing('stripe'):
+            stripe.checkout.Session.create(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings()
+        if timings is not None:
+            timings.durations[name] += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    connection_created receiver adding query_timer to every database connection.
+
+    Installed on the connection rather than around the request: under ASGI the
+    queries run in sync_to_async threads, on other connections than the one of
+    the event loop.
+    """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def query_timer(execute, sql, params, many, context):
+    """connection.execute_wrapper() counting the queries and their time."""
+    timings = current_timings()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.durations['db'] += time.perf_counter() - start
+        timings.queries += 1
+
+
+class InstrumentedTemplate(Template):
+    """Backend template adding its render time to the current request."""
+
+    def render(self, context=None, request=None):
+        # Included and extended templates render inside this call: counted once
+        with timing('template'):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Django template backend measuring render times."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name).template, self)
+
+
+# ============================================
+# Histograms
+# ============================================
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label value."""
+
+    def __init__(self, name, help_text, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series = {}  # {label value: [bucket counts..., +Inf count, sum]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value):
+        with self._lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: list(values) for key, values in sorted(self.series.items())}
+        for label_value, values in series.items():
+            label = f'{self.label}="{escape_label(label_value)}"'
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{label}}} {values[-2]}')
+            lines.append(f'{self.name}_sum{{{label}}} {values[-1]:.6f}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self.series.clear()
+
+
+class Counter:
+    """Prometheus counter, one series per label value."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount, label_value):
+        with self._lock:
+            self.series[label_value] = self.series.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            series = sorted(self.series.items())
+        for label_value, value in series:
+            lines.append(f'{self.name}{{{self.label}="{escape_label(label_value)}"}} {value}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self.series.clear()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', "Durée des requêtes par vue", 'view')
+DB_DURATION = Histogram('http_request_db_seconds', "Temps SQL par requête et par vue", 'view')
+TEMPLATE_DURATION = Histogram('http_request_template_seconds', "Temps de rendu des templates par requête et par vue", 'view')
+EXTERNAL_DURATION = Histogram('external_call_seconds', "Temps passé chez les services externes, par requête", 'service')
+DB_QUERIES = Counter('db_queries_total', "Nombre de requêtes SQL par vue", 'view')
+REQUESTS = Counter('http_requests_total', "Nombre de requêtes par vue", 'view')
+
+METRICS = (REQUEST_DURATION, DB_DURATION, TEMPLATE_DURATION, EXTERNAL_DURATION, DB_QUERIES, REQUESTS)
+
+
+def record_request(view, timings):
+    """Add a finished request to the histograms."""
+    REQUEST_DURATION.observe(timings.total(), view)
+    DB_DURATION.observe(timings.durations['db'], view)
+    TEMPLATE_DURATION.observe(timings.durations['template'], view)
+    DB_QUERIES.inc(timings.queries, view)
+    REQUESTS.inc(1, view)
+    for service in EXTERNAL_SERVICES:
+        if timings.durations[service]:
+            EXTERNAL_DURATION.observe(timings.durations[service], service)
+
+
+def render_metrics():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def clear_metrics():
+    """Reset every metric."""
+    for metric in METRICS:
+        metric.clear()
@@ -0,0 +1,83 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .metrics import end_request, record_request, start_request
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware usable in an async middleware chain.
+
+    WhiteNoise is sync only: under ASGI, Django would run every request
+    through a thread to call it. Here the lookup of the static file stays on
+    the event loop and only serving a file (opening it) goes to a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Measure each request (database, templates, external services) for core.metrics.
+
+    Staff users get the measures in a Server-Timing response header. Every
+    request is recorded in the histograms of its URL name.
+
+    Sync and async capable: under ASGI the chain stays async, so the async
+    views (booking_details_async) are not run through a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = start_request()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, timings, getattr(request, 'user', None))
+        finally:
+            end_request()
+
+    async def __acall__(self, request):
+        timings = start_request()
+        try:
+            response = await self.get_response(request)
+            user = await request.auser() if hasattr(request, 'auser') else None
+            return self.finish(request, response, timings, user)
+        finally:
+            end_request()
+
+    def finish(self, request, response, timings, user):
+        """Record the request and add the Server-Timing header for staff users."""
+        match = request.resolver_match
+        record_request(match.view_name if match else '<unresolved>', timings)
+
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = timings.server_timing()
+        return response
@@ -3,8 +3,11 @@ from django.db import models
 from parler.models import TranslatableModel, TranslatedFields
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
+from django.core.mail import EmailMessage
+from django.utils import timezone
 import deepl
 import datetime
+from .translation_memory import translate_texts
 
 logger = logging.getLogger(__name__)
 
@@ -107,7 +110,8 @@ class FoodInfo(TranslatableModel):
     bread reservations, and bar opening hours.
 
     Translations:
-        - Automatically translates burger and pizza days using DeepL API.
+        - Automatically translates burger and pizza days using DeepL API,
+          through the translation memory (core.translation_memory).
         - Logs translation errors without interrupting save process.
 
     Security:
@@ -172,7 +176,8 @@ class FoodInfo(TranslatableModel):
     def save(self, *args, **kwargs):
         """
         Overrides save to automatically translate certain fields into multiple languages
-        using DeepL API. Errors are logged but do not interrupt saving.
+        using DeepL API, with one call per language for the texts missing from the
+        translation memory. Errors are logged but do not interrupt saving.
 
         Security:
             - Only controlled default values are translated; no user input is processed.
@@ -183,7 +188,6 @@ class FoodInfo(TranslatableModel):
         if not getattr(settings, "DEEPL_API_KEY", None):
             return
 
-        translator = deepl.Translator(settings.DEEPL_API_KEY)
         target_languages = ["en", "es", "de", "nl"]
 
         for lang in target_languages:
@@ -191,17 +195,12 @@ class FoodInfo(TranslatableModel):
                 # Create or retrieve translation object for the target language
                 translation, _ = self.translations.get_or_create(language_code=lang)
 
-                # Translate Burger days
-                translation.burger_food_days = translator.translate_text(
-                    self.burger_food_days,
-                    target_lang=lang.upper() if lang != "en" else "EN-GB"
-                ).text
-
-                # Translate Pizza days
-                translation.pizza_food_days = translator.translate_text(
-                    self.pizza_food_days,
-                    target_lang=lang.upper() if lang != "en" else "EN-GB"
-                ).text
+                # Translate Burger and Pizza days in one call (cached in the translation memory)
+                translation.burger_food_days, translation.pizza_food_days = translate_texts(
+                    [self.burger_food_days, self.pizza_food_days],
+                    target_lang=lang.upper() if lang != "en" else "EN-GB",
+                    source_lang="FR",
+                )
 
                 translation.save()
             
@@ -239,4 +238,129 @@ class LaundryInfo(TranslatableModel):
     def __str__(self):
         return "Informations diverses sur la laverie"
 
-    
\ No newline at end of file
+
+class OutboxEmail(models.Model):
+    """
+    Durable email outbox.
+
+    Views only insert rows here; the send_outbox management command drains
+    pending emails in batches over a single SMTP connection, retries failures
+    with exponential backoff and moves emails to the dead-letter state after
+    too many attempts.
+
+    Security:
+        - Email bodies are rendered server-side from templates before being queued.
+        - Only the admin can read queued emails.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "En attente"),
+        (STATUS_SENT, "Envoyé"),
+        (STATUS_DEAD, "Échec définitif"),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name="Sujet")
+    body = models.TextField(verbose_name="Contenu")
+    content_subtype = models.CharField(max_length=20, default="html", verbose_name="Format")
+    from_email = models.CharField(max_length=255, blank=True, verbose_name="Expéditeur")
+    to = models.JSONField(default=list, verbose_name="Destinataires")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Statut")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Tentatives")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    # Set by the worker that claimed the email (see core.outbox._claim_batch)
+    claim_token = models.UUIDField(null=True, blank=True, editable=False, verbose_name="Jeton de traitement")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Envoyé le")
+
+    class Meta:
+        verbose_name = "Email en file d'attente"
+        verbose_name_plural = "Emails en file d'attente"
+        ordering = ['-created_at']
+        # Polled by send_outbox --loop (core.outbox._claim_batch)
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+    def __str__(self):
+        """Return the subject and recipients of the email."""
+        return f"{self.subject} → {', '.join(self.to)}"
+
+    @classmethod
+    def from_message(cls, message):
+        """Build an unsaved OutboxEmail from a django EmailMessage."""
+        return cls(
+            subject=str(message.subject),
+            body=str(message.body),
+            content_subtype=message.content_subtype,
+            from_email=message.from_email or "",
+            to=list(message.to),
+        )
+
+    def to_message(self, connection=None):
+        """Rebuild the django EmailMessage to send."""
+        message = EmailMessage(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email or None,
+            to=self.to,
+            connection=connection,
+        )
+        message.content_subtype = self.content_subtype
+        return message
+
+
+class TranslationMemory(models.Model):
+    """
+    Persistent DeepL translation memory.
+
+    One row per (source text hash, source language, target language), so the
+    same text is only ever sent once to DeepL for a given language pair.
+
+    Security:
+        - Only stores admin-managed content, never visitor messages.
+    """
+    source_hash = models.CharField(max_length=64, verbose_name="Empreinte du texte source")
+    source_lang = models.CharField(max_length=10, verbose_name="Langue source")
+    target_lang = models.CharField(max_length=10, verbose_name="Langue cible")
+    source_text = models.TextField(verbose_name="Texte source")
+    translated_text = models.TextField(verbose_name="Traduction")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+
+    class Meta:
+        verbose_name = "Mémoire de traduction"
+        verbose_name_plural = "Mémoire de traduction"
+        constraints = [
+            models.UniqueConstraint(fields=['source_hash', 'source_lang', 'target_lang'], name='unique_translation_memory'),
+        ]
+
+    def __str__(self):
+        return f"{self.source_lang} → {self.target_lang} : {self.source_text[:50]}"
+
+
+class PageGroupUpdate(models.Model):
+    """
+    Last content change of a page group (core.page_cache.PAGE_GROUPS).
+
+    Written by core.signals whenever a model read by the group is saved or
+    deleted, and used as the <lastmod> of its pages in the sitemap.
+    """
+    group = models.CharField(max_length=20, unique=True, verbose_name="Groupe de pages")
+    updated_at = models.DateTimeField(verbose_name="Mis à jour le")
+
+    class Meta:
+        verbose_name = "Mise à jour de pages"
+        verbose_name_plural = "Mises à jour de pages"
+
+    def __str__(self):
+        return f"{self.group} : {self.updated_at:%d/%m/%Y %H:%M}"
+
+    @classmethod
+    def touch(cls, group):
+        """Record that the content of a page group changed now."""
+        cls.objects.update_or_create(group=group, defaults={'updated_at': timezone.now()})
@@ -0,0 +1,111 @@
+"""
+Email outbox helpers.
+
+queue_emails() is called from the request path and costs a single INSERT.
+send_pending_emails() is called by the send_outbox management command: it
+drains due emails in batches over one reused connection, retries failures
+with exponential backoff and marks emails as dead after max_attempts.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from django.core.mail import get_connection
+from django.utils import timezone
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts: 1 min, 2 min, 4 min... capped at 1 hour
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+DEFAULT_MAX_ATTEMPTS = 5
+
+# A claimed batch is hidden from other workers for this long
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def queue_emails(messages):
+    """Store EmailMessage objects in the outbox with a single INSERT."""
+    return OutboxEmail.objects.bulk_create([OutboxEmail.from_message(message) for message in messages])
+
+
+def retry_delay(attempts):
+    """Return the delay before the next attempt after the given number of failures."""
+    return min(RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), RETRY_MAX_DELAY)
+
+
+def _claim_batch(batch_size):
+    """
+    Claim due emails and push their next attempt forward so concurrent workers skip them.
+
+    The UPDATE stamps a token unique to this claim, and only the rows carrying
+    it are returned: when two workers select the same ids, the UPDATE of the
+    second one matches no row (their next attempt has moved) and it gets nothing.
+    """
+    now = timezone.now()
+    ids = list(
+        OutboxEmail.objects.filter(status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'pk')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4()
+    OutboxEmail.objects.filter(
+        pk__in=ids, status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=now,
+    ).update(next_attempt_at=now + CLAIM_LEASE, claim_token=token)
+    return list(OutboxEmail.objects.filter(claim_token=token).order_by('pk'))
+
+
+def _record_failure(email, error, max_attempts):
+    """Schedule a retry with backoff, or move the email to the dead-letter state."""
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    if email.attempts >= max_attempts:
+        email.status = OutboxEmail.STATUS_DEAD
+        logger.error(f"Email {email.pk} abandonné après {email.attempts} tentatives : {error}")
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_pending_emails(batch_size=50, max_attempts=DEFAULT_MAX_ATTEMPTS, connection=None):
+    """
+    Send one batch of due emails over a single connection.
+
+    Returns:
+        (int, int): number of emails sent and number of failures
+    """
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    connection = connection or get_connection()
+    sent, failed = 0, 0
+
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            _record_failure(email, e, max_attempts)
+        return 0, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                # One message per call so a failure only affects its own email
+                connection.send_messages([email.to_message(connection)])
+            except Exception as e:
+                _record_failure(email, e, max_attempts)
+                failed += 1
+            else:
+                email.status = OutboxEmail.STATUS_SENT
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = ""
+                email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+                sent += 1
+    finally:
+        connection.close()
+
+    return sent, failed
@@ -0,0 +1,122 @@
+"""
+Per-language full-page cache for the core pages.
+
+Each cached view belongs to a page group listing the models its page reads.
+Pages are stored in the default cache under a key made of the group, its
+content version, the language and the path. core.signals replaces the
+version of every group depending on a model whenever a row of that model (or
+of its parler translations) is saved or deleted, so admin edits show up on
+the next request and the stale pages simply age out.
+
+Visitors with a session cookie (admins, customers in the middle of a request)
+always get a freshly rendered page. The CSRF token of the cached HTML is
+swapped for a placeholder when the page is stored, and each visitor gets
+their own token back when it is served.
+"""
+import re
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import get_language
+
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24  # One day
+
+# Models read by each page group ('app_label.ModelName')
+PAGE_GROUPS = {
+    'static': (),
+    'infos': (
+        'core.CampingInfo',
+        'bookings.OtherPrice',
+        'bookings.SeasonInfo',
+        'bookings.Capacity',
+    ),
+    'services': (
+        'core.SwimmingPoolInfo',
+        'core.FoodInfo',
+        'core.LaundryInfo',
+    ),
+    'rates': (
+        'bookings.Price',
+        'bookings.SupplementPrice',
+        'bookings.OtherPrice',
+        'bookings.SeasonInfo',
+        'bookings.MobileHome',
+        'bookings.SupplementMobileHome',
+    ),
+}
+
+CSRF_PLACEHOLDER = '__csrf_token__'
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def groups_for_model(label):
+    """Return the page groups reading the given model label."""
+    return [group for group, labels in PAGE_GROUPS.items() if label in labels]
+
+
+def _version_key(group):
+    return f'page_cache:version:{group}'
+
+
+def page_version(group):
+    """Return the current content version of a page group."""
+    return cache.get_or_set(_version_key(group), lambda: uuid.uuid4().hex, None)
+
+
+def bump_page_version(group):
+    """Give a page group a new content version, so its pages are rendered again."""
+    cache.set(_version_key(group), uuid.uuid4().hex, None)
+
+
+def page_key(group, request):
+    """Return the cache key of the page for this request."""
+    return f'page_cache:{group}:{page_version(group)}:{get_language()}:{request.path}'
+
+
+def is_cacheable(request):
+    """Only anonymous GET/HEAD requests without query string are served from cache."""
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.META.get('QUERY_STRING')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def cached_page(group):
+    """
+    Cache the rendered page of a view per language and content version.
+
+    Usage:
+        @cached_page('rates')
+        def rates_view(request): ...
+    """
+    if group not in PAGE_GROUPS:
+        raise ValueError(f"Unknown page group: {group}")
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+
+            key = page_key(group, request)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content.replace(CSRF_PLACEHOLDER, get_token(request)), content_type=content_type)
+                patch_vary_headers(response, ('Cookie',))
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                content = CSRF_INPUT_RE.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', response.content.decode(response.charset))
+                cache.set(key, (content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+            return response
+        wrapper.page_group = group
+        return wrapper
+    return decorator
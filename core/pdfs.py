@@ -0,0 +1,84 @@
+"""
+PDF optimization.
+
+optimize_pdfs() rewrites the PDFs of MEDIA_ROOT and of the static documents
+linearized ("fast web view": the first page and the page index come first,
+so a viewer can render it while the rest downloads, and fetch the other pages
+with byte ranges), with their streams recompressed at the highest Flate level
+and their objects packed into compressed object streams.
+
+Files that are already linearized are left alone, so the command can run on
+every deploy.
+"""
+import os
+import tempfile
+from django.conf import settings
+from .images import RESPONSIVE_DIR, images_dir
+
+
+def pdf_dirs():
+    """Return the directories holding the PDFs to optimize."""
+    return [str(settings.MEDIA_ROOT), images_dir()]
+
+
+def find_pdfs(directory):
+    """Return the absolute paths of the PDFs of a directory, derivatives excluded."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        if RESPONSIVE_DIR in dirs and os.path.samefile(root, directory):
+            dirs.remove(RESPONSIVE_DIR)
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pdf'))
+    return sorted(paths)
+
+
+def optimize_pdf(path, force=False):
+    """
+    Linearize and recompress one PDF in place.
+
+    Returns:
+        (size_before, size_after), or None when it was already linearized
+    """
+    import pikepdf
+
+    with pikepdf.open(path) as pdf:
+        if pdf.is_linearized and not force:
+            return None
+        fd, temp_path = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            pdf.save(
+                temp_path,
+                linearize=True,
+                compress_streams=True,
+                recompress_flate=True,
+                stream_decode_level=pikepdf.StreamDecodeLevel.generalized,
+                object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            )
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    size_before = os.path.getsize(path)
+    os.replace(temp_path, path)
+    return size_before, os.path.getsize(path)
+
+
+def optimize_pdfs(directories=None, force=False):
+    """
+    Optimize every PDF of the given directories (MEDIA_ROOT and static by default).
+
+    Returns:
+        (optimized, skipped): optimized is a list of (path, size_before, size_after),
+        skipped a list of paths already linearized
+    """
+    optimized, skipped = [], []
+    for directory in directories or pdf_dirs():
+        if not os.path.isdir(directory):
+            continue
+        for path in find_pdfs(directory):
+            sizes = optimize_pdf(path, force=force)
+            if sizes is None:
+                skipped.append(path)
+            else:
+                optimized.append((path, *sizes))
+    return optimized, skipped
@@ -0,0 +1,47 @@
+from django.apps import apps
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from .metrics import install_query_timer
+from .models import PageGroupUpdate
+from .page_cache import PAGE_GROUPS, bump_page_version, groups_for_model
+from .site_config import SINGLETON_MODELS, invalidate_site_config
+
+
+# {sender model: label of the model whose pages it affects}, parler translations included
+PAGE_SENDERS = {}
+for label in {label for labels in PAGE_GROUPS.values() for label in labels}:
+    model = apps.get_model(label)
+    PAGE_SENDERS[model] = label
+    if hasattr(model, '_parler_meta'):
+        PAGE_SENDERS[model._parler_meta.root_model] = label
+
+
+def bump_page_versions(sender, **kwargs):
+    """Invalidate the cached pages reading the saved or deleted model and date the change."""
+    for group in groups_for_model(PAGE_SENDERS[sender]):
+        bump_page_version(group)
+        PageGroupUpdate.touch(group)
+
+
+for sender in PAGE_SENDERS:
+    post_save.connect(bump_page_versions, sender=sender, dispatch_uid=f"page_cache_save_{sender._meta.label}")
+    post_delete.connect(bump_page_versions, sender=sender, dispatch_uid=f"page_cache_delete_{sender._meta.label}")
+
+
+def bump_site_config_version(sender, **kwargs):
+    """Reload the site configuration registry in every worker."""
+    invalidate_site_config()
+
+
+for label in SINGLETON_MODELS:
+    model = apps.get_model(label)
+    senders = [model]
+    if hasattr(model, '_parler_meta'):
+        senders.append(model._parler_meta.root_model)
+    for sender in senders:
+        post_save.connect(bump_site_config_version, sender=sender, dispatch_uid=f"site_config_save_{sender._meta.label}")
+        post_delete.connect(bump_site_config_version, sender=sender, dispatch_uid=f"site_config_delete_{sender._meta.label}")
+
+
+# Request metrics: count the queries of every connection (see core.metrics)
+connection_created.connect(install_query_timer, dispatch_uid="metrics_query_timer")
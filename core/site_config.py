@@ -0,0 +1,118 @@
+"""
+Site configuration registry.
+
+The admin-edited settings models are used as singletons: the first row of each
+is the configuration of the site. The registry loads the first row of every
+model in SINGLETON_MODELS, with all its translations prefetched, and keeps
+them in memory for the whole process.
+
+A global version number, kept in the shared cache, tells the gunicorn workers
+when to reload: core.signals replaces it whenever one of these models (or its
+translations) is saved or deleted, and bookings.signals does the same for the
+pricing and season models. Each worker checks it at most once per request, and
+on every call outside a request (shell, management commands). The pricing
+snapshot and the season calendars also follow config_version(), so every
+worker sees admin edits, not only the one that handled them.
+
+get_singleton() returns a shallow copy switched to the active language, so a
+view can use translated fields without changing the shared instance.
+"""
+import copy
+import threading
+import uuid
+from asgiref.local import Local
+from django.apps import apps
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.utils.translation import get_language
+
+
+SINGLETON_MODELS = (
+    'bookings.SupplementPrice',
+    'bookings.OtherPrice',
+    'bookings.SeasonInfo',
+    'bookings.Capacity',
+    'bookings.SupplementMobileHome',
+    'core.CampingInfo',
+    'core.SwimmingPoolInfo',
+    'core.FoodInfo',
+    'core.LaundryInfo',
+)
+
+VERSION_KEY = 'site_config:version'
+
+_lock = threading.Lock()
+# (version, {label: instance or None}), replaced as a whole on reload
+_state = (None, {})
+# Version seen by the current request, None outside requests
+_request = Local()
+
+
+def invalidate_site_config():
+    """Publish a new configuration version, picked up by every worker."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    _request.version = None
+
+
+def config_version():
+    """Return the shared version, reading the cache at most once per request."""
+    version = getattr(_request, 'version', None)
+    if version is None:
+        version = cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, None)
+        if getattr(_request, 'in_request', False):
+            _request.version = version
+    return version
+
+
+def _load():
+    """Load the first row of every singleton model, translations included."""
+    instances = {}
+    for label in SINGLETON_MODELS:
+        model = apps.get_model(label)
+        queryset = model.objects.order_by('pk')
+        if hasattr(model, '_parler_meta'):
+            queryset = queryset.prefetch_related('translations')
+        instances[label] = next(iter(queryset[:1]), None)
+    return instances
+
+
+def _instances():
+    global _state
+    version = config_version()
+    if _state[0] == version:
+        return _state[1]
+
+    with _lock:
+        if _state[0] != version:
+            _state = (version, _load())
+        return _state[1]
+
+
+def get_singleton(model):
+    """
+    Return the configuration row of a model (its first row), or None.
+
+    Usage:
+        supplements = get_singleton(SupplementPrice)
+    """
+    instance = _instances()[model._meta.label]
+    if instance is None:
+        return None
+    instance = copy.copy(instance)
+    if hasattr(instance, 'set_current_language'):
+        instance.set_current_language(get_language())
+    return instance
+
+
+def _start_request(**kwargs):
+    _request.in_request = True
+    _request.version = None
+
+
+def _finish_request(**kwargs):
+    _request.in_request = False
+    _request.version = None
+
+
+request_started.connect(_start_request, dispatch_uid='site_config_request_started')
+request_finished.connect(_finish_request, dispatch_uid='site_config_request_finished')
@@ -1,15 +1,48 @@
+"""
+Multilingual sitemap.
+
+The sitemap lists every public page in the five languages, with the hreflang
+alternates of each one and, for the pages built from admin content, the
+<lastmod> of that content (PageGroupUpdate, kept up to date by core.signals).
+
+sitemap_view() renders it once per content version of the page groups, stores
+it with its gzip and brotli encodings in the default cache, and serves the
+encoding accepted by the client with ETag/Last-Modified validators.
+"""
+import gzip
+import hashlib
+import brotli
 from django.contrib.sitemaps import Sitemap
-from django.urls import reverse
+from django.contrib.sitemaps.views import sitemap
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.urls import resolve, reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from .models import PageGroupUpdate
+from .page_cache import PAGE_GROUPS, page_version
+
+
+SITEMAP_TIMEOUT = 60 * 60 * 24  # One day
+
 
 class MultilingualStaticSitemap(Sitemap):
     changefreq = "monthly"
     priority = 0.8
 
+    i18n = True
+    alternates = True
+    x_default = True
+    languages = ['fr', 'en', 'es', 'de', 'nl']
+
     pages = [
         'home',
         'about',
         'infos',
         'services',
+        'rates',
         'accommodations',
         'activities',
         'reservation_request',
@@ -17,28 +50,97 @@ class MultilingualStaticSitemap(Sitemap):
         'privacy-policy',
     ]
 
-    languages = ['fr', 'en', 'es', 'de', 'nl']
+    def __init__(self):
+        self._lastmods = None
 
     def items(self):
         """
-        Returns a list of tuples (language, name_url)
-        Example: [('fr', 'home'), ('en', 'home'), ...]
+        Returns the URL names; the Sitemap pairs each one with every language.
         """
-        return [(lang, page) for lang in self.languages for page in self.pages]
+        return self.pages
 
     def location(self, item):
         """
-        Constructs the final URL with the language code
+        Returns the path in the active language (set by the Sitemap for each pair)
         """
-        lang, page = item
-        return f"/{lang}{reverse(page)}"
-    
-    def alternates(self, item):
+        return reverse(item)
+
+    def lastmod(self, item):
         """
-        Adds <xhtml:link> tags to indicate translated versions
+        Returns the last change of the admin content shown by the page,
+        or None for pages without such content
         """
-        _, page = item
-        return {
-            lang: f"/{lang}{reverse(page)}"
-            for lang in self.languages
-        }
+        if self._lastmods is None:
+            self._lastmods = dict(PageGroupUpdate.objects.values_list('group', 'updated_at'))
+        group = getattr(resolve(reverse(item)).func, 'page_group', None)
+        return self._lastmods.get(group)
+
+
+sitemaps = {
+    'multilingual_static': MultilingualStaticSitemap,
+}
+
+
+def _sitemap_key(request):
+    versions = ':'.join(page_version(group) for group in PAGE_GROUPS)
+    digest = hashlib.sha1(f"{request.scheme}:{request.get_host()}:{versions}".encode()).hexdigest()
+    return f'sitemap:{digest}'
+
+
+def render_sitemap(request):
+    """
+    Render the sitemap and return its cache entry.
+
+    Returns:
+        dict: identity/gzip/br bodies, the ETag and the Last-Modified timestamp (or None)
+    """
+    response = sitemap(request, sitemaps)
+    response.render()
+    content = response.content
+    latest = PageGroupUpdate.objects.aggregate(latest=Max('updated_at'))['latest']
+    return {
+        'identity': content,
+        'gzip': gzip.compress(content, compresslevel=9, mtime=0),
+        'br': brotli.compress(content, quality=11),
+        'etag': f'"{hashlib.sha1(content).hexdigest()}"',
+        'last_modified': int(latest.timestamp()) if latest else None,
+    }
+
+
+def preferred_encoding(request):
+    """Return the best encoding accepted by the client among br, gzip and identity."""
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+    for encoding in ('br', 'gzip'):
+        if encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+@require_safe
+def sitemap_view(request):
+    """
+    Serve the cached, pre-compressed sitemap.xml.
+
+    Security:
+        - No user input used besides the validators and Accept-Encoding.
+    """
+    key = _sitemap_key(request)
+    entry = cache.get(key)
+    if entry is None:
+        entry = render_sitemap(request)
+        cache.set(key, entry, SITEMAP_TIMEOUT)
+
+    response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if response is None:
+        encoding = preferred_encoding(request)
+        response = HttpResponse(entry[encoding], content_type='application/xml')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = entry['etag']
+    if entry['last_modified']:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
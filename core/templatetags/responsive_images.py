@@ -0,0 +1,41 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from core.images import MIME_TYPES, get_manifest
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(source, alt='', sizes='100vw', css_class='', loading='lazy'):
+    """
+    Render a static image as a <picture> with AVIF and WebP sources and a
+    JPEG/PNG fallback, each with a srcset of the widths built by the
+    build_images command. The browser downloads the smallest file that fits.
+
+    Falls back to a plain <img> when no derivatives were built for the image.
+
+    Usage:
+        {% load responsive_images %}
+        {% responsive_image 'pictures/bordeaux.jpg' alt=_("Bordeaux") sizes="(min-width: 992px) 33vw, 100vw" css_class="card-img-top" %}
+    """
+    entry = get_manifest().get(source)
+    if entry is None:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}">',
+            static(source), alt, css_class, loading,
+        )
+
+    def srcset(image_format):
+        return ', '.join(f"{static(name)} {width}w" for width, name in entry['variants'][image_format])
+
+    fallback = entry['fallback']
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[image_format], srcset(image_format), sizes) for image_format in ('avif', 'webp')),
+    )
+    largest = entry['variants'][fallback][-1][1]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="{}" decoding="async"></picture>',
+        sources, static(largest), srcset(fallback), sizes, entry['width'], entry['height'], alt, css_class, loading,
+    )
@@ -1,9 +1,21 @@
 import pytest
+from django.core.cache import cache
 from django.utils import translation
+from bookings.pricing import invalidate_pricing
+from core.site_config import invalidate_site_config
 from core.models import CampingInfo, SwimmingPoolInfo, FoodInfo, LaundryInfo
 from core.views import MobileHome
 import datetime
 
+@pytest.fixture(autouse=True)
+def empty_page_cache():
+    """Start every test with an empty page cache, a fresh pricing snapshot and configuration registry."""
+    cache.clear()
+    invalidate_pricing()
+    invalidate_site_config()
+    yield
+    cache.clear()
+
 @pytest.fixture
 def campinginfo_fr(db):
     """Creates a CampingInfo object with French translation for testing."""
@@ -0,0 +1,172 @@
+"""
+Performance budgets for the test suite.
+
+measure() runs a callable several times and records:
+- the number of SQL queries (checked exactly: one more query is a regression);
+- the p50/p95 wall time in milliseconds;
+- the peak memory allocated during one run (tracemalloc), in KiB.
+
+check_budget() compares a measure with its entry of perf_baseline.json (at the
+root of the project) and returns the budgets it misses. Query counts are
+always checked, both ways: fewer queries than the baseline also fails, so the
+baseline is recorded again and keeps the improvement. Wall time and memory
+depend on the machine and its load: they are only measured and checked on
+demand, with a tolerance:
+    PERF_TIMINGS=1 python -m pytest -m perf
+
+Recording the baseline again after an intended change:
+    PERF_UPDATE_BASELINE=1 python -m pytest -m perf
+"""
+import gc
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import translation
+
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'perf_baseline.json'
+
+SAMPLES = int(os.environ.get('PERF_SAMPLES', 5))
+UPDATE_BASELINE = os.environ.get('PERF_UPDATE_BASELINE') == '1'
+CHECK_TIMINGS = os.environ.get('PERF_TIMINGS') == '1'
+
+# Allowed ratio over the baseline, plus a fixed margin for very fast views
+TIME_TOLERANCE = float(os.environ.get('PERF_TIME_TOLERANCE', 3.0))
+TIME_MARGIN_MS = 10.0
+MEMORY_TOLERANCE = 1.5
+MEMORY_MARGIN_KB = 256.0
+
+
+@dataclass
+class Measure:
+    queries: int
+    p50_ms: float | None
+    p95_ms: float | None
+    peak_kb: float
+
+
+def measure(run, setup=None, samples=SAMPLES):
+    """
+    Measure a callable.
+
+    Args:
+        run: callable to measure
+        setup: optional callable run before each sample, not measured
+        samples: timed runs, only made when timings are checked or recorded
+
+    Returns:
+        Measure
+    """
+    # One run with query capture and tracemalloc, which both slow it down
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        # Read now: the next request resets the query log
+        queries = len(captured)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    if not (CHECK_TIMINGS or UPDATE_BASELINE):
+        return Measure(queries=queries, p50_ms=None, p95_ms=None, peak_kb=round(peak / 1024, 1))
+
+    gc.collect()
+    timings = []
+    for _ in range(samples):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    p95 = statistics.quantiles(timings, n=20, method='inclusive')[18] if len(timings) > 1 else timings[0]
+    return Measure(
+        queries=queries,
+        p50_ms=round(statistics.median(timings), 2),
+        p95_ms=round(p95, 2),
+        peak_kb=round(peak / 1024, 1),
+    )
+
+
+def read_baseline():
+    """Return the checked-in baseline ({} when missing)."""
+    try:
+        return json.loads(BASELINE_PATH.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+
+
+def record_baseline(name, result):
+    """Store a measure in the baseline file."""
+    baseline = read_baseline()
+    baseline[name] = asdict(result)
+    BASELINE_PATH.write_text(json.dumps(baseline, indent=1, sort_keys=True) + '\n', encoding='utf-8')
+
+
+def check_budget(name, result):
+    """
+    Compare a measure with its baseline entry.
+
+    Returns:
+        list[str]: the exceeded budgets (empty when within budget)
+    """
+    if UPDATE_BASELINE:
+        record_baseline(name, result)
+        return []
+
+    expected = read_baseline().get(name)
+    if expected is None:
+        return [f"{name}: no baseline, run with PERF_UPDATE_BASELINE=1"]
+
+    errors = []
+    if result.queries > expected['queries']:
+        errors.append(f"{name}: {result.queries} queries (baseline {expected['queries']})")
+    elif result.queries < expected['queries']:
+        errors.append(f"{name}: {result.queries} queries, fewer than the baseline ({expected['queries']}): "
+                      f"record it again with PERF_UPDATE_BASELINE=1")
+    if not CHECK_TIMINGS:
+        return errors
+    if result.p95_ms > expected['p95_ms'] * TIME_TOLERANCE + TIME_MARGIN_MS:
+        errors.append(f"{name}: p95 {result.p95_ms} ms (baseline {expected['p95_ms']} ms)")
+    if result.peak_kb > expected['peak_kb'] * MEMORY_TOLERANCE + MEMORY_MARGIN_KB:
+        errors.append(f"{name}: peak {result.peak_kb} KiB (baseline {expected['peak_kb']} KiB)")
+    return errors
+
+
+def create_site_data():
+    """
+    Create the content of a configured site: every configuration singleton,
+    the prices of each type and season, the capacities and four mobile homes.
+    """
+    from bookings.models import (Capacity, MobileHome, OtherPrice, Price, SeasonInfo, SupplementMobileHome,
+                                 SupplementPrice)
+    from core.models import CampingInfo, FoodInfo, LaundryInfo, SwimmingPoolInfo
+
+    with translation.override('fr'):
+        for model in (CampingInfo, SwimmingPoolInfo, FoodInfo, LaundryInfo, OtherPrice, SeasonInfo, SupplementMobileHome):
+            model.objects.create()
+        supplements = SupplementPrice.objects.create(extra_adult_price=5, child_over_8_price=3, child_under_8_price=2,
+                                                     pet_price=2, extra_vehicle_price=3, extra_tent_price=3,
+                                                     visitor_price_without_swimming_pool=3, visitor_price_with_swimming_pool=5)
+        for booking_type in ('tent', 'caravan', 'camping_car'):
+            Capacity.objects.create(booking_type=booking_type, max_places=20)
+            for offset, season in enumerate(('low', 'mid', 'high')):
+                single = None if booking_type == 'camping_car' else 10 + offset
+                Price.objects.create(booking_type=booking_type, season=season, supplements=supplements,
+                                     price_1_person_with_electricity=single, price_1_person_without_electricity=single,
+                                     price_2_persons_with_electricity=16 + offset, price_2_persons_without_electricity=13 + offset)
+            Price.objects.create(booking_type=booking_type, is_worker=True, supplements=supplements, worker_week_price=12,
+                                 weekend_price_with_electricity=15, weekend_price_without_electricity=12)
+        for name in ('Bleuet', 'Capucine', 'Sabot de Vénus', 'Belle Dame'):
+            MobileHome.objects.create(name=name, description_text=f"Mobil-home {name}", night_price=60, night_price_mid=70,
+                                      week_low=350, week_mid=450, week_high=650)
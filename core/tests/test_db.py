@@ -0,0 +1,73 @@
+import io
+import pytest
+from django.db import OperationalError, connection
+from django.core.management import call_command
+from bookings.models import Booking
+from core.db import benchmark_sqlite, explain_query_plan, find_full_scans, retry_on_lock
+
+
+@pytest.mark.django_db
+def test_connections_are_tuned():
+    """Each connection gets the PRAGMAs of settings.SQLITE_PRAGMAS and BEGIN IMMEDIATE."""
+    with connection.cursor() as cursor:
+        assert cursor.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert cursor.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert cursor.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+    assert connection.transaction_mode == "IMMEDIATE"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_retry_on_lock(monkeypatch):
+    """Lock errors are retried with a backoff, other errors are raised at once."""
+    monkeypatch.setattr("core.db.time.sleep", lambda seconds: None)
+    calls = []
+
+    @retry_on_lock
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OperationalError("database is locked")
+        return "saved"
+
+    assert flaky() == "saved"
+    assert len(calls) == 3
+
+    @retry_on_lock
+    def broken():
+        calls.append(1)
+        raise OperationalError("no such table: booking")
+
+    calls.clear()
+    with pytest.raises(OperationalError):
+        broken()
+    assert len(calls) == 1
+
+
+def test_benchmark_sqlite_tuned_setup_never_fails():
+    """Under concurrent writers the tuned setup waits for the lock instead of failing."""
+    results = benchmark_sqlite(workers=2, duration=0.3, write_ratio=0.5)
+    assert set(results) == {"défaut", "optimisé"}
+    assert results["optimisé"]["requests"] > 0
+    assert results["optimisé"]["failures"] == 0
+
+
+def test_find_full_scans():
+    """Only table scans without an index are reported."""
+    plan = [
+        "SCAN bookings_booking",
+        "SCAN TABLE core_outboxemail",
+        "SCAN bookings_booking USING INDEX booking_created_at_idx",
+        "SEARCH bookings_booking USING INDEX booking_email_idx (email=?)",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]
+    assert find_full_scans(plan) == ["bookings_booking", "core_outboxemail"]
+
+
+@pytest.mark.django_db
+def test_booking_lookups_use_indexes():
+    """The booking access paths are served by an index, and the audit command finds no full scan."""
+    plan = explain_query_plan(Booking.objects.filter(booking_type="tent", start_date__lt="2025-09-17", end_date__gt="2025-09-15"))
+    assert any("booking_type_dates_idx" in step for step in plan)
+    assert not find_full_scans(explain_query_plan(Booking.objects.filter(email="john@example.com")))
+
+    call_command("explain_queries", stdout=io.StringIO())
@@ -0,0 +1,57 @@
+import pytest
+from django.template import Context, Template
+from django.test import override_settings
+from PIL import Image
+from core.images import build_images, find_sources, read_manifest
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    """A static directory with a photo, its hand-exported WebP copy and a transparent icon."""
+    pictures = tmp_path / "pictures"
+    pictures.mkdir()
+    Image.new("RGB", (800, 400), "green").save(pictures / "lac.jpg")
+    Image.new("RGB", (800, 400), "green").save(pictures / "lac.webp")
+    Image.new("RGBA", (64, 64), (0, 0, 0, 0)).save(pictures / "icon.png")
+    return tmp_path
+
+
+def test_find_sources_skips_webp_copies(static_dir):
+    """A .webp next to a .jpg of the same name is not a source."""
+    assert find_sources(str(static_dir)) == ["pictures/icon.png", "pictures/lac.jpg"]
+
+
+def test_build_images_is_incremental(static_dir):
+    """Derivatives are built without upscaling, then only changed sources are rebuilt."""
+    built, unchanged, removed = build_images(str(static_dir), jobs=1)
+    assert built == ["pictures/icon.png", "pictures/lac.jpg"]
+
+    entry = read_manifest(str(static_dir))["pictures/lac.jpg"]
+    assert [width for width, _ in entry["variants"]["avif"]] == [320, 640, 800]
+    assert entry["fallback"] == "jpeg"
+    assert read_manifest(str(static_dir))["pictures/icon.png"]["fallback"] == "png"
+    assert (static_dir / "responsive/pictures/lac-320.webp").exists()
+
+    Image.new("RGB", (500, 250), "blue").save(static_dir / "pictures/lac.jpg")
+    (static_dir / "pictures/icon.png").unlink()
+    built, unchanged, removed = build_images(str(static_dir), jobs=1)
+    assert (built, unchanged, removed) == (["pictures/lac.jpg"], [], ["pictures/icon.png"])
+    assert not (static_dir / "responsive/pictures/lac-640.webp").exists()
+    assert not (static_dir / "responsive/pictures/icon-64.png").exists()
+
+
+def test_responsive_image_tag(static_dir):
+    """The tag emits AVIF/WebP sources with srcset, or a plain <img> for unknown images."""
+    template = Template(
+        "{% load responsive_images %}"
+        "{% responsive_image 'pictures/lac.jpg' alt='Lac' sizes='50vw' %}"
+        "{% responsive_image 'pictures/other.jpg' alt='Other' %}"
+    )
+    with override_settings(STATICFILES_DIRS=[str(static_dir)]):
+        build_images(str(static_dir), jobs=1)
+        html = template.render(Context())
+
+    assert '<source type="image/avif" srcset="/static/responsive/pictures/lac-320.avif 320w, ' in html
+    assert 'sizes="50vw"' in html
+    assert 'width="800" height="400" alt="Lac"' in html
+    assert '<img src="/static/pictures/other.jpg" alt="Other"' in html
@@ -0,0 +1,79 @@
+import pytest
+import pikepdf
+from django.test import override_settings
+from core.pdfs import optimize_pdfs
+
+PDF_CONTENT = b"%PDF-1.4 " + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def media_root(tmp_path, settings):
+    """A MEDIA_ROOT holding one brochure."""
+    (tmp_path / "mobilhomes").mkdir()
+    (tmp_path / "mobilhomes" / "bleuet.pdf").write_bytes(PDF_CONTENT)
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def content(response):
+    return b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_serve_media_with_validators(client, media_root):
+    """The whole file is served with validators, then answered with 304 when unchanged."""
+    response = client.get("/media/mobilhomes/bleuet.pdf")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/pdf"
+    assert response["Accept-Ranges"] == "bytes"
+    assert content(response) == PDF_CONTENT
+
+    response = client.get("/media/mobilhomes/bleuet.pdf", HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_serve_media_ranges(client, media_root):
+    """Single byte ranges get a 206, stale If-Range the whole file, unsatisfiable ranges a 416."""
+    size = len(PDF_CONTENT)
+    response = client.get("/media/mobilhomes/bleuet.pdf", HTTP_RANGE="bytes=10-19")
+    assert response.status_code == 206
+    assert response["Content-Range"] == f"bytes 10-19/{size}"
+    assert response["Content-Length"] == "10"
+    assert content(response) == PDF_CONTENT[10:20]
+
+    response = client.get("/media/mobilhomes/bleuet.pdf", HTTP_RANGE="bytes=-5")
+    assert content(response) == PDF_CONTENT[-5:]
+
+    response = client.get("/media/mobilhomes/bleuet.pdf", HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"stale"')
+    assert response.status_code == 200
+
+    response = client.get("/media/mobilhomes/bleuet.pdf", HTTP_RANGE=f"bytes={size}-")
+    assert response.status_code == 416
+    assert response["Content-Range"] == f"bytes */{size}"
+
+
+@pytest.mark.django_db
+def test_serve_media_offload_and_traversal(client, media_root):
+    """X-Accel-Redirect hands the file to nginx; paths outside MEDIA_ROOT are not found."""
+    with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX="/protected-media/"):
+        response = client.get("/media/mobilhomes/bleuet.pdf")
+    assert response["X-Accel-Redirect"] == "/protected-media/mobilhomes/bleuet.pdf"
+    assert response.content == b""
+
+    assert client.get("/media/..%2Fmanage.py").status_code == 404
+    assert client.get("/media/mobilhomes/missing.pdf").status_code == 404
+
+
+def test_optimize_pdfs_linearizes_once(tmp_path):
+    """PDFs are rewritten linearized, and left alone on the next run."""
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    pdf.save(tmp_path / "inventaire.pdf")
+
+    optimized, skipped = optimize_pdfs([str(tmp_path)])
+    assert [path for path, _, _ in optimized] == [str(tmp_path / "inventaire.pdf")]
+    with pikepdf.open(tmp_path / "inventaire.pdf") as result:
+        assert result.is_linearized
+
+    assert optimize_pdfs([str(tmp_path)]) == ([], [str(tmp_path / "inventaire.pdf")])
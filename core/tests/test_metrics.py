@@ -0,0 +1,101 @@
+import logging
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, override_settings
+from django.urls import reverse
+from core.metrics import clear_metrics, end_request, start_request, timing
+from core.middleware import MetricsMiddleware
+
+
+@pytest.fixture(autouse=True)
+def empty_metrics():
+    """Start every test with empty histograms."""
+    clear_metrics()
+    yield
+    clear_metrics()
+
+
+@pytest.fixture
+def staff_client(client, django_user_model):
+    """A client logged in as a staff user."""
+    user = django_user_model.objects.create_user(username="gerant", password="x", is_staff=True)
+    client.force_login(user)
+    return client
+
+
+@pytest.mark.django_db
+def test_server_timing_for_staff_only(client, staff_client):
+    """Staff users get the database and template timings of the request, visitors do not."""
+    response = staff_client.get(reverse('services'))
+    server_timing = response['Server-Timing']
+    assert server_timing.startswith('db;dur=')
+    assert 'queries"' in server_timing
+    assert 'template;dur=' in server_timing
+    assert 'total;dur=' in server_timing
+
+    client.logout()
+    assert not client.get(reverse('services')).has_header('Server-Timing')
+
+
+@pytest.mark.django_db
+def test_async_requests_are_measured(django_user_model):
+    """Under ASGI the middleware stays async and counts the queries run in sync_to_async threads."""
+    staff = django_user_model.objects.create_user(username="gerant", password="x", is_staff=True)
+
+    async def view(request):
+        await sync_to_async(django_user_model.objects.count)()
+        return HttpResponse()
+
+    middleware = MetricsMiddleware(view)
+    request = AsyncRequestFactory().get("/")
+    request.auser = sync_to_async(lambda: staff)
+
+    response = async_to_sync(middleware)(request)
+
+    assert iscoroutinefunction(middleware)
+    assert 'desc="1 queries"' in response['Server-Timing']
+
+
+def test_asgi_middleware_chain_is_not_adapted(caplog, settings):
+    """Every middleware is async capable: under ASGI no request goes through a thread to run them."""
+    settings.DEBUG = True  # Django only logs the adaptations in debug mode
+    with caplog.at_level(logging.DEBUG, logger="django.request"):
+        ASGIHandler()
+    assert "adapted" not in caplog.text
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint(client):
+    """Requests are aggregated per URL name and exposed to the scraper holding the token."""
+    client.get(reverse('rates'))
+    client.get(reverse('rates'))
+
+    assert client.get('/metrics').status_code == 404
+    with override_settings(METRICS_TOKEN='secret'):
+        assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code == 404
+        response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+
+    content = response.content.decode()
+    assert response.status_code == 200
+    assert '# TYPE http_request_duration_seconds histogram' in content
+    assert 'http_request_duration_seconds_count{view="rates"} 2' in content
+    assert 'http_request_duration_seconds_bucket{view="rates",le="+Inf"} 2' in content
+    assert 'http_requests_total{view="rates"} 2' in content
+
+
+def test_timing_adds_to_current_request():
+    """External calls are added to the current request, and ignored outside requests."""
+    with timing('deepl'):
+        pass
+
+    timings = start_request()
+    try:
+        with timing('stripe'):
+            pass
+    finally:
+        end_request()
+    assert timings.durations['stripe'] > 0
+    assert timings.durations['deepl'] == 0
+    assert 'stripe;dur=' in timings.server_timing()
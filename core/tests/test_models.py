@@ -1,4 +1,12 @@
+import uuid
 import pytest
+from unittest.mock import MagicMock, patch
+from django.core import mail
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from core.models import OutboxEmail, TranslationMemory
+from bookings.models import MobileHome
+from core.outbox import _claim_batch, queue_emails, send_pending_emails
 
 def test_campinginfo_fixture(campinginfo_fr):
     """Verify that the CampingInfo fixture is correctly created and times are set."""
@@ -22,4 +30,85 @@ def test_laundryinfo_fixture(laundryinfo_fr):
     """Verify that the LaundryInfo fixture is correctly created and prices are correct."""
     assert laundryinfo_fr.pk is not None
     assert laundryinfo_fr.washing_machine_price == 4
-    assert laundryinfo_fr.dryer_price == 2
\ No newline at end of file
+    assert laundryinfo_fr.dryer_price == 2
+
+@pytest.mark.django_db
+def test_outbox_sends_batch_over_one_connection():
+    """Queued emails are sent by the worker over a single connection and marked as sent."""
+    messages = []
+    for i in range(3):
+        message = EmailMessage(subject=f"Sujet {i}", body="<p>Bonjour</p>", from_email="camping@example.com", to=[f"client{i}@example.com"])
+        message.content_subtype = "html"
+        messages.append(message)
+    queue_emails(messages)
+    assert len(mail.outbox) == 0
+
+    with patch("core.outbox.get_connection", wraps=get_connection) as mock_connection:
+        sent, failed = send_pending_emails()
+
+    assert (sent, failed) == (3, 0)
+    assert mock_connection.call_count == 1
+    assert [m.to for m in mail.outbox] == [["client0@example.com"], ["client1@example.com"], ["client2@example.com"]]
+    assert mail.outbox[0].content_subtype == "html"
+    assert not OutboxEmail.objects.exclude(status=OutboxEmail.STATUS_SENT).exists()
+
+@pytest.mark.django_db
+def test_outbox_retries_with_backoff_then_dead_letters():
+    """Failed sends are retried later with backoff, then moved to the dead-letter state."""
+    queue_emails([EmailMessage(subject="Sujet", body="Corps", to=["client@example.com"])])
+    connection = MagicMock()
+    connection.send_messages.side_effect = OSError("SMTP indisponible")
+
+    assert send_pending_emails(connection=connection, max_attempts=2) == (0, 1)
+    email = OutboxEmail.objects.get()
+    assert email.status == OutboxEmail.STATUS_PENDING
+    assert email.attempts == 1
+    assert email.next_attempt_at > timezone.now()
+    assert "SMTP indisponible" in email.last_error
+
+    # Not due yet: nothing is picked up
+    assert send_pending_emails(connection=connection, max_attempts=2) == (0, 0)
+
+    OutboxEmail.objects.update(next_attempt_at=timezone.now())
+    assert send_pending_emails(connection=connection, max_attempts=2) == (0, 1)
+    assert OutboxEmail.objects.get().status == OutboxEmail.STATUS_DEAD
+
+@pytest.mark.django_db
+def test_outbox_claim_is_exclusive():
+    """A worker selecting the same due emails as another one does not get them once the other has claimed them."""
+    queue_emails([EmailMessage(subject="Sujet", body="Corps", to=[f"client{i}@example.com"]) for i in range(2)])
+    new_token = uuid.uuid4
+    other_worker = []
+
+    def claim_in_between():
+        # Runs between the SELECT and the UPDATE of the first worker
+        if not other_worker:
+            other_worker.append(None)
+            other_worker[:] = _claim_batch(10)
+        return new_token()
+
+    with patch("core.outbox.uuid.uuid4", side_effect=claim_in_between):
+        claimed = _claim_batch(10)
+
+    assert len(other_worker) == 2
+    assert claimed == []
+
+def fake_translate(texts, source_lang=None, target_lang=None):
+    """Stand-in for deepl.Translator.translate_text returning one result per text."""
+    return [MagicMock(text=f"{text} [{target_lang}]") for text in texts]
+
+@pytest.mark.django_db
+def test_mobilehome_translations_are_batched_and_remembered(settings):
+    """One DeepL call per language on first save; identical content costs nothing afterwards."""
+    settings.DEEPL_API_KEY = "fake-api-key"
+
+    with patch("deepl.Translator.translate_text", side_effect=fake_translate) as mock_translate:
+        home = MobileHome.objects.create(name="Bleuet", description_text="Deux chambres")
+        assert mock_translate.call_count == 4
+        assert home.name_de == "Bleuet [DE]"
+        assert home.description_en == "Deux chambres [EN-GB]"
+
+        MobileHome.objects.create(name="Bleuet", slug="bleuet-2", description_text="Deux chambres")
+        assert mock_translate.call_count == 4
+
+    assert TranslationMemory.objects.count() == 8
@@ -0,0 +1,38 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import translation
+from core import urls as core_urls
+from .perf import check_budget, create_site_data, measure
+
+pytestmark = [pytest.mark.django_db, pytest.mark.perf]
+
+# Every page of core.urls but the 404 test page
+PAGES = [pattern.name for pattern in core_urls.urlpatterns if pattern.name != 'not_found']
+LANGUAGES = [code for code, _ in settings.LANGUAGES]
+
+
+@pytest.fixture
+def site_data(db):
+    """A fully configured site."""
+    create_site_data()
+
+
+@pytest.mark.parametrize('language', LANGUAGES)
+@pytest.mark.parametrize('page', PAGES)
+def test_page_budget(client, site_data, page, language):
+    """Each page stays within its query, time and memory budgets, rendered and served from cache."""
+    with translation.override(language):
+        url = reverse(page)
+
+    def get():
+        with translation.override(language):
+            response = client.get(url)
+        assert response.status_code == 200
+
+    # Rendered: empty page cache and cold configuration registry
+    errors = check_budget(f"core:{page}:{language}:render", measure(get, setup=cache.clear))
+    get()
+    errors += check_budget(f"core:{page}:{language}:cached", measure(get))
+    assert not errors, "\n".join(errors)
@@ -1,5 +1,12 @@
 import pytest
+import brotli
 from django.urls import reverse
+from django.utils import translation
+from core.page_cache import CSRF_PLACEHOLDER
+from bookings.models import Price, SupplementPrice
+from bookings.pricing import rates_matrix
+from core.models import CampingInfo, LaundryInfo, PageGroupUpdate
+from core.site_config import get_singleton
 
 # ==============================
 # Tests for simple views
@@ -13,6 +20,13 @@ def test_home_view(client):
     assert response.status_code == 200
     assert 'core/home.html' in [t.name for t in response.templates]
 
+@pytest.mark.django_db
+def test_stylesheet_url_is_stable(client):
+    """The stylesheet URL comes from the static storage only (no per-request version), so browsers can cache it."""
+    content = client.get(reverse('about')).content.decode()
+    assert 'css/style.css"' in content
+    assert '?v=' not in content
+
 @pytest.mark.django_db
 def test_about_view(client):
     """About page should load successfully and use the correct template."""
@@ -96,3 +110,140 @@ def test_services_view(client, swimmingpoolinfo_fr, foodinfo_fr, laundryinfo_fr)
     assert context['swimming_info'].pk == swimmingpoolinfo_fr.pk
     assert context['food_info'].pk == foodinfo_fr.pk
     assert context['laundry_info'].pk == laundryinfo_fr.pk
+
+# ==============================
+# Tests for rates_view
+# ==============================
+
+@pytest.mark.django_db
+def test_rates_view_indexes_price_matrix(client, django_assert_num_queries):
+    """Rates page reads prices from the snapshot matrix and singletons from the registry: only mobile homes are queried."""
+    SupplementPrice.objects.create(extra_adult_price=4)
+    Price.objects.create(booking_type='tent', season='low', price_1_person_with_electricity=11, price_1_person_without_electricity=9,
+                         price_2_persons_with_electricity=15, price_2_persons_without_electricity=13)
+    Price.objects.create(booking_type='camping_car', season='high', price_2_persons_with_electricity=25, price_2_persons_without_electricity=22)
+    Price.objects.create(booking_type='caravan', is_worker=True, worker_week_price=12)
+    rates_matrix()
+
+    with django_assert_num_queries(1):
+        response = client.get(reverse('rates'))
+
+    assert response.status_code == 200
+    matrix = response.context['price_matrix']
+    assert matrix['tent']['low']['p1'] == (11, 9)
+    assert matrix['camping_car']['high']['p2'] == (25, 22)
+    assert 'mid' not in matrix['tent']
+    assert [p.worker_week_price for p in response.context['worker_prices']['caravan']] == [12]
+    content = response.content.decode()
+    assert '25,00€' in content and '12,00€' in content
+
+
+# ==============================
+# Tests for the site configuration registry
+# ==============================
+
+@pytest.mark.django_db
+def test_site_config_is_loaded_once_and_follows_edits(campinginfo_fr, laundryinfo_fr, django_assert_num_queries):
+    """Singletons are served from memory in the active language until one of them is saved."""
+    get_singleton(CampingInfo)
+    with django_assert_num_queries(0):
+        with translation.override('fr'):
+            assert get_singleton(CampingInfo).pk == campinginfo_fr.pk
+            assert get_singleton(LaundryInfo).get_current_language() == 'fr'
+        with translation.override('en'):
+            assert get_singleton(LaundryInfo).get_current_language() == 'en'
+
+    laundryinfo_fr.dryer_price = 3
+    laundryinfo_fr.save()
+    assert get_singleton(LaundryInfo).dryer_price == 3
+
+
+# ==============================
+# Tests for the page cache
+# ==============================
+
+@pytest.mark.django_db
+def test_pages_are_served_from_cache_per_language(client, django_assert_num_queries):
+    """A cached page is served without queries nor rendering, in the language of the URL."""
+    client.get(reverse('rates'))
+    with django_assert_num_queries(0):
+        response = client.get(reverse('rates'))
+    assert response.status_code == 200
+    assert not response.templates
+
+    with translation.override('en'):
+        response = client.get(reverse('rates'))
+    assert response.templates
+    assert response['Content-Language'] == 'en'
+
+
+@pytest.mark.django_db
+def test_page_cache_swaps_csrf_token(client):
+    """Each visitor gets their own CSRF token in the language forms of a cached page."""
+    client.get(reverse('home'))
+    response = client.get(reverse('home'))
+    assert not response.templates
+    assert CSRF_PLACEHOLDER not in response.content.decode()
+    assert 'csrfmiddlewaretoken' in response.content.decode()
+    assert 'csrftoken' in response.cookies
+
+
+@pytest.mark.django_db
+def test_page_cache_follows_admin_edits(client, swimmingpoolinfo_fr, foodinfo_fr, laundryinfo_fr):
+    """Saving a model read by a page invalidates that page only."""
+    client.get(reverse('services'))
+    client.get(reverse('home'))
+
+    laundryinfo_fr.washing_machine_price = 5
+    laundryinfo_fr.save()
+
+    assert client.get(reverse('services')).templates
+    assert not client.get(reverse('home')).templates
+
+
+@pytest.mark.django_db
+def test_page_cache_is_bypassed_with_session(client):
+    """Visitors with a session cookie always get a fresh page."""
+    client.get(reverse('about'))
+    client.cookies['sessionid'] = 'abc'
+    assert client.get(reverse('about')).templates
+
+
+# ==============================
+# Tests for the sitemap
+# ==============================
+
+@pytest.mark.django_db
+def test_sitemap_is_cached_and_compressed(client, django_assert_num_queries):
+    """The sitemap lists each page once per language with alternates, and is served from cache."""
+    response = client.get('/sitemap.xml')
+    content = response.content.decode()
+    assert response.status_code == 200
+    assert content.count('<url>') == 50
+    assert '/fr/tarifs/</loc>' in content
+    assert '/fr/fr/' not in content
+    assert 'hreflang="x-default"' in content
+    assert '<lastmod>' not in content
+
+    with django_assert_num_queries(0):
+        response = client.get('/sitemap.xml', HTTP_ACCEPT_ENCODING='gzip, br')
+    assert response['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.content).decode() == content
+
+    assert client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+
+@pytest.mark.django_db
+def test_sitemap_lastmod_follows_admin_edits(client, laundryinfo_fr):
+    """Saving the content of a page dates that page only and renders a new sitemap."""
+    PageGroupUpdate.objects.all().delete()
+    etag = client.get('/sitemap.xml')['ETag']
+    laundryinfo_fr.dryer_price = 3
+    laundryinfo_fr.save()
+
+    response = client.get('/sitemap.xml')
+    content = response.content.decode()
+    assert response['ETag'] != etag
+    assert response.has_header('Last-Modified')
+    assert content.count('<lastmod>') == 5
+    assert '/fr/services/</loc><lastmod>' in content
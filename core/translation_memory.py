@@ -0,0 +1,81 @@
+"""
+DeepL translation memory.
+
+get_translator() returns a single deepl.Translator shared by the whole
+process (one per API key). translate_texts() looks every text up in the
+TranslationMemory table and sends only the misses to DeepL, in a single
+multi-text translate_text call, then stores the new translations.
+"""
+import hashlib
+import threading
+import deepl
+from django.conf import settings
+from .metrics import timing
+
+_lock = threading.Lock()
+_translators = {}
+
+
+def get_translator():
+    """Return the shared deepl.Translator for settings.DEEPL_API_KEY."""
+    api_key = settings.DEEPL_API_KEY
+    translator = _translators.get(api_key)
+    if translator is None:
+        with _lock:
+            translator = _translators.get(api_key)
+            if translator is None:
+                translator = _translators[api_key] = deepl.Translator(api_key)
+    return translator
+
+
+def source_hash(text):
+    """Return the hash used as translation memory key for a source text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def translate_texts(texts, target_lang, source_lang="FR"):
+    """
+    Translate a list of texts, using the translation memory first.
+
+    Misses are deduplicated and sent to DeepL in one request; empty texts are
+    returned unchanged. DeepL errors are propagated to the caller.
+
+    Returns:
+        list[str]: translations aligned with texts
+    """
+    from .models import TranslationMemory
+
+    hashes = [source_hash(text) for text in texts]
+    known = dict(
+        TranslationMemory.objects.filter(
+            source_hash__in=set(hashes),
+            source_lang=source_lang,
+            target_lang=target_lang,
+        ).values_list('source_hash', 'translated_text')
+    )
+
+    missing = {}
+    for text, text_hash in zip(texts, hashes):
+        if text and text_hash not in known:
+            missing.setdefault(text_hash, text)
+
+    if missing:
+        with timing('deepl'):
+            results = get_translator().translate_text(
+                list(missing.values()),
+                source_lang=source_lang,
+                target_lang=target_lang,
+            )
+        new_entries = []
+        for (text_hash, text), result in zip(missing.items(), results):
+            known[text_hash] = result.text
+            new_entries.append(TranslationMemory(
+                source_hash=text_hash,
+                source_lang=source_lang,
+                target_lang=target_lang,
+                source_text=text,
+                translated_text=result.text,
+            ))
+        TranslationMemory.objects.bulk_create(new_entries, ignore_conflicts=True)
+
+    return [known.get(text_hash, text) if text else text for text, text_hash in zip(texts, hashes)]
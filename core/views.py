@@ -1,11 +1,18 @@
 from django.utils.translation import gettext as _, get_language
 from parler.utils.context import switch_language
 from django.shortcuts import render
-from django.http import HttpResponse
-from bookings.models import Price, SupplementPrice, SeasonInfo, Capacity, MobileHome, SupplementMobileHome, OtherPrice
+from django.http import Http404, HttpResponse
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from bookings.models import SeasonInfo, Capacity, MobileHome, SupplementMobileHome, OtherPrice
+from bookings.pricing import rates_matrix
 from .models import CampingInfo, SwimmingPoolInfo, FoodInfo, LaundryInfo
+from .metrics import render_metrics
+from .page_cache import cached_page
+from .site_config import get_singleton
 
 
+@cached_page('static')
 def home_view(request):
     """
     Render the homepage.
@@ -22,6 +29,7 @@ def home_view(request):
     return render(request, 'core/home.html')
 
 
+@cached_page('static')
 def about_view(request):
     """
     Render the about page.
@@ -32,6 +40,7 @@ def about_view(request):
     return render(request, 'core/about.html')
 
 
+@cached_page('infos')
 def infos_view(request):
     """
     Render the information page with pricing, supplements, seasons, mobile homes,
@@ -49,10 +58,10 @@ def infos_view(request):
     """
 
     # --- Camping general information ---
-    camping_info = CampingInfo.objects.first()
-    other_prices = OtherPrice.objects.first()
-    season_info = SeasonInfo.objects.first()
-    capacity_info = Capacity.objects.first()
+    camping_info = get_singleton(CampingInfo)
+    other_prices = get_singleton(OtherPrice)
+    season_info = get_singleton(SeasonInfo)
+    capacity_info = get_singleton(Capacity)
 
     # --- Language-specific handling ---
     lang = get_language()
@@ -68,6 +77,7 @@ def infos_view(request):
         "other_prices": other_prices,
     })
 
+@cached_page('services')
 def services_view(request):
     """
     Render the Services page including swimming pool, food, and laundry info.
@@ -77,9 +87,9 @@ def services_view(request):
         - No user input processed
     """
 
-    swimming_info = SwimmingPoolInfo.objects.first()
-    food_info = FoodInfo.objects.first()
-    laundry_info = LaundryInfo.objects.first()  
+    swimming_info = get_singleton(SwimmingPoolInfo)
+    food_info = get_singleton(FoodInfo)
+    laundry_info = get_singleton(LaundryInfo)
 
     return render(request, 'core/services.html', {
         "swimming_info": swimming_info,
@@ -87,13 +97,15 @@ def services_view(request):
         "laundry_info": laundry_info
     })
 
+@cached_page('rates')
 def rates_view(request):
     """
-    Render the information page with pricing, supplements, seasons, mobile homes,
-    camping info, capacity, and other prices.
+    Render the rates page with pricing, supplements, seasons, mobile homes
+    and other prices.
 
     Features:
-        - Groups normal and worker prices
+        - Camping prices come from the in-process pricing snapshot, laid out as a
+          type -> season -> people -> electricity matrix the template indexes into
         - Handles supplements and visitor prices
         - Dynamically sets mobile home descriptions based on current language
 
@@ -102,22 +114,11 @@ def rates_view(request):
         - No user input is processed
         - Safe against XSS and injection
     """
-    # --- Retrieve all standard and worker prices ---
-    prices = Price.objects.all()
-
-    grouped_prices = {}
-    normal_prices = prices.filter(is_worker=False)
-    
-    for price in normal_prices:
-        key = price.booking_type
-        if key not in grouped_prices:
-            grouped_prices[key] = []
-        grouped_prices[key].append(price)
-
-    worker_prices = prices.filter(is_worker=True)
+    # --- Standard and worker prices (no query once the snapshot is built) ---
+    rates = rates_matrix()
 
     # --- Supplements prices ---
-    supplements_obj = SupplementPrice.objects.first()
+    supplements_obj = rates.supplement
     supplements = []
     visitor_prices = []
 
@@ -154,8 +155,8 @@ def rates_view(request):
             })
 
     # --- Camping general information ---
-    other_prices = OtherPrice.objects.first()
-    season_info = SeasonInfo.objects.first()
+    other_prices = get_singleton(OtherPrice)
+    season_info = get_singleton(SeasonInfo)
 
     # --- Language-specific handling ---
     lang = get_language()
@@ -168,11 +169,11 @@ def rates_view(request):
         home.name_display = getattr(home, f"name_{lang}", home.name)
         home.description_display = getattr(home, f"description_{lang}", home.description_text)
 
-    mobilhome_supplements = SupplementMobileHome.objects.first()
+    mobilhome_supplements = get_singleton(SupplementMobileHome)
 
     return render(request, 'core/rates.html', {
-        "grouped_prices": grouped_prices,
-        "worker_prices": worker_prices,
+        "price_matrix": rates.prices,
+        "worker_prices": rates.worker_prices,
         "supplements": supplements,
         "visitor_prices": visitor_prices,
         "mobilhomes": mobilhomes,
@@ -181,6 +182,7 @@ def rates_view(request):
         "other_prices": other_prices,
     })
 
+@cached_page('static')
 def accommodations_view(request):
     """
     Render the Accommodations page.
@@ -191,6 +193,7 @@ def accommodations_view(request):
     return render(request, 'core/accommodations.html')
 
 
+@cached_page('static')
 def activities_view(request):
     """
     Render the Activities page.
@@ -201,6 +204,7 @@ def activities_view(request):
     return render(request, 'core/activities.html')
 
 
+@cached_page('static')
 def legal_view(request):
     """
     Render the Legal page.
@@ -211,6 +215,7 @@ def legal_view(request):
     return render(request, 'core/legal.html')
 
 
+@cached_page('static')
 def privacy_view(request):
     """
     Render the Privacy Policy page.
@@ -249,4 +254,19 @@ Allow: /static/
 Allow: /media/
 Sitemap: https://www.camping-le-maine-blanc.com/sitemap.xml
 """
-    return HttpResponse(content, content_type="text/plain")
\ No newline at end of file
+    return HttpResponse(content, content_type="text/plain")
+
+
+def metrics_view(request):
+    """
+    Expose the request metrics of this worker in the Prometheus text format.
+
+    Security:
+        - Readable by staff users, or with "Authorization: Bearer <METRICS_TOKEN>".
+        - Answers 404 to anyone else, so the endpoint is not advertised.
+    """
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    token_ok = bool(settings.METRICS_TOKEN) and constant_time_compare(authorization, f"Bearer {settings.METRICS_TOKEN}")
+    if not (token_ok or request.user.is_staff):
+        raise Http404()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -9,6 +9,7 @@ from django.utils.translation import gettext_lazy as _
 from decouple import config
 import os, socket
 import sys
+import tempfile
 
 # ============================================
 # BASE DIRECTORY
@@ -99,7 +100,8 @@ INSTALLED_APPS = [
 # ============================================
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise, async capable
+    'core.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -116,7 +118,8 @@ ROOT_URLCONF = 'maineblanc_project.urls'
 # ============================================
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates measuring render times for core.metrics
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'core/templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -130,7 +133,6 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.available_languages',
                 'django.template.context_processors.i18n',
-                'core.context_processors.global_static_version',
             ],
         },
     },
@@ -141,18 +143,55 @@ WSGI_APPLICATION = 'maineblanc_project.wsgi.application'
 # ============================================
 # DATABASE
 # ============================================
-if os.environ.get("RENDER") == "True":
-    DATABASES = {
+# SQLite tuning, applied to each new connection (init_command):
+# - WAL: readers no longer wait for the writer, and commits are cheaper;
+# - synchronous=NORMAL: safe with WAL, fsync only at checkpoints;
+# - busy_timeout: wait for the write lock instead of failing at once;
+# - larger page cache, memory-mapped reads, temporary tables in memory.
+# BEGIN IMMEDIATE takes the write lock when an atomic block starts: a read
+# transaction upgraded to a write cannot fail with "database is locked"
+# without waiting for busy_timeout. Write blocks are also retried with a
+# jittered backoff (core.db.retry_on_lock).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,            # Milliseconds
+    'cache_size': -20000,            # KiB (20 MB)
+    'mmap_size': 128 * 1024 * 1024,  # Bytes
+    'temp_store': 'MEMORY',
+}
+SQLITE_OPTIONS = {
+    'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': 'IMMEDIATE',
+}
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, "db_render.sqlite3" if os.environ.get("RENDER") == "True" else "db.sqlite3"),
+        'OPTIONS': SQLITE_OPTIONS,
+        # Persistent connections: the PRAGMAs run once per worker, not per request
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# ============================================
+# CACHE
+# ============================================
+# Shared by all gunicorn workers of an instance (page cache and its versions),
+# emptied on each deploy since it lives in the temporary directory.
+if DEBUG:
+    CACHES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': os.path.join(BASE_DIR, "db_render.sqlite3"),
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 else:
-    DATABASES = {
+    CACHES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': os.path.join(BASE_DIR, "db.sqlite3"),
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'maineblanc_cache')),
         }
     }
 
@@ -193,13 +232,34 @@ DEEPL_API_KEY = config('DEEPL_API_KEY', default='')
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Outside DEBUG, collectstatic writes content-hashed copies (style.3f2a9c1b8e4d.css)
+# and {% static %} returns those names, which whitenoise serves with
+# "Cache-Control: public, max-age=315360000, immutable".
+# (STATICFILES_STORAGE is ignored since Django 5.1, hence STORAGES.)
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG
+            else "whitenoise.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
 
 WHITENOISE_IGNORE_MISSING = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media files are served by core.media.serve_media. Behind nginx, set the
+# internal location aliasing MEDIA_ROOT (e.g. /protected-media/) to hand the
+# transfer over with X-Accel-Redirect; behind Apache/lighttpd, enable X-Sendfile.
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='')
+MEDIA_X_SENDFILE = config('MEDIA_X_SENDFILE', default=False, cast=bool)
+
 # ============================================
 # DEFAULT PRIMARY KEY
 # ============================================
@@ -233,12 +293,28 @@ LOGOUT_REDIRECT_URL = '/'
 # ============================================
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY', default='')
+# Other Stripe API address (stripe-mock, tests); empty for api.stripe.com
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
+
+# Serve the details step with the async view (bookings.views.booking_details_async),
+# which awaits Stripe instead of holding a worker. Only useful under ASGI; the
+# Render start script (scripts/start_render.sh) then serves the ASGI application:
+#   gunicorn maineblanc_project.asgi:application -k uvicorn_worker.UvicornWorker
+# Off by default: under ASGI, Django reads streamed responses (static files,
+# media, CSV/XLSX exports) into memory before sending them, without sendfile.
+ASYNC_CHECKOUT = config('ASYNC_CHECKOUT', default=False, cast=bool)
 
 # ============================================
 # SITE URL
 # ============================================
 SITE_URL = config('SITE_URL', default='http://localhost:8000')
 
+# ============================================
+# METRICS
+# ============================================
+# Bearer token of the Prometheus scraper on /metrics (staff users can always read it)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # ============================================
 # LOGGING DES ERREURS 500
 # ============================================
@@ -256,14 +332,3 @@ LOGGING = {
         "level": "ERROR",
     },
 }
-
-# ============================================
-# CACHE-BUSTING
-# ============================================
-from datetime import datetime
-
-STATIC_VERSION = datetime.now().strftime("%Y%m%d%H%M%S")
-
-def global_static_version(request):
-    from django.conf import settings
-    return {'STATIC_VERSION': settings.STATIC_VERSION}
\ No newline at end of file
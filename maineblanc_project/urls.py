@@ -1,18 +1,15 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.i18n import i18n_patterns
-from django.contrib.sitemaps.views import sitemap
-from django.conf.urls.static import static
-from core.sitemaps import MultilingualStaticSitemap
-
-sitemaps = {
-    'multilingual_static': MultilingualStaticSitemap,
-}
+from core.sitemaps import sitemap_view
+from core.media import serve_media
+from core.views import metrics_view
 
 urlpatterns = [
     path('i18n/', include('django.conf.urls.i18n')),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='sitemap'),
+    path('sitemap.xml', sitemap_view, name='sitemap'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 urlpatterns += i18n_patterns(
@@ -22,6 +19,8 @@ urlpatterns += i18n_patterns(
     path('bookings/', include('bookings.urls')),
 )
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Uploaded files (brochures, inventories), in DEBUG and in production
+urlpatterns += [
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='media'),
+]
 
@@ -5,6 +5,7 @@ from django.urls import reverse
 from unittest.mock import patch
 from django.contrib.messages import get_messages
 from reservations.forms import ReservationRequestForm
+from core.models import OutboxEmail
 
 
 # ==============================
@@ -65,8 +66,9 @@ def test_post_valid_reservation_with_datetime_and_label(mock_translate, mock_sen
     url = reverse('reservation_request')
     response = client.post(url, data=valid_reservation_data, follow=True)
     
-    # Check that email was sent
-    assert mock_send.called
+    # Check that email was queued in the outbox instead of sent inline
+    assert not mock_send.called
+    assert OutboxEmail.objects.filter(subject="Nouvelle demande de réservation").count() == 1
 
     # Check that success message is present
     success_text = "Votre demande de réservation a été envoyée avec succès"
@@ -7,20 +7,22 @@ from django.utils.translation import override
 from django.template.loader import render_to_string
 from django.core.mail import EmailMessage
 from django.utils import timezone
-import deepl, socket
+from core.outbox import queue_emails
+from core.translation_memory import get_translator
+import socket
 
 
 def reservation_request_view(request):
     """
     Handles reservation requests from users:
         - GET: display empty reservation form
-        - POST: validate form, translate message, send email to admin, show success message
+        - POST: validate form, translate message, queue email to admin, show success message
 
     Security measures:
         - Form validation via ReservationRequestForm
         - Escape user-provided message to prevent XSS
         - Deepl API errors are caught and logged, original message preserved
-        - Email sending is wrapped, fail_silently=False
+        - Email is queued in the outbox and sent by the send_outbox command (retries on failure)
         - No sensitive data (API key) is exposed to templates
     """
 
@@ -34,8 +36,8 @@ def reservation_request_view(request):
             translated_message = "Aucun message" 
             if message_client:
                 try:
-                    translator = deepl.Translator(settings.DEEPL_API_KEY)
-                    result = translator.translate_text(message_client, target_lang="FR")
+                    # Shared translator; visitor messages are not stored in the translation memory
+                    result = get_translator().translate_text(message_client, target_lang="FR")
                     translated_message = result.text
                 except Exception as e:
                     # Preserve original message if translation fails
@@ -94,7 +96,8 @@ def reservation_request_view(request):
                             to = [settings.ADMIN_EMAIL],
                         )
                         email_admin.content_subtype = "html" 
-                        email_admin.send(fail_silently=False) 
+                        # Queued in the outbox, sent by the send_outbox command
+                        queue_emails([email_admin])
 
                 # --- Notify user of successful submission ---
                 messages.success(
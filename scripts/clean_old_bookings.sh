@@ -5,7 +5,7 @@ source /home/username/venv/bin/activate
 # Se placer dans le dossier du projet
 cd /home/username/camping_site/maineblanc_project
 
-# Lancer la commande Django
+# Lancer la commande Django (par lots ; reprend où elle s'était arrêtée si elle a été interrompue)
 python manage.py clean_old_bookings
 
 # Désactiver l'environnement virtuel
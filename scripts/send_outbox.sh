@@ -0,0 +1,13 @@
+#!/bin/bash
+# Hébergement classique (cron). Sur Render, send_outbox est lancé par scripts/start_render.sh
+# Active l'environnement virtuel
+source /home/username/venv/bin/activate
+
+# Se placer dans le dossier du projet
+cd /home/username/camping_site/maineblanc_project
+
+# Envoyer les emails en attente (à lancer chaque minute via cron)
+python manage.py send_outbox
+
+# Désactiver l'environnement virtuel
+deactivate
@@ -0,0 +1,21 @@
+#!/bin/bash
+# Démarrage du service web sur Render.
+#
+# La base SQLite est sur le disque du service web : un worker ou un cron job
+# Render séparé ne la verrait pas. L'envoi des emails en file d'attente
+# (send_outbox) tourne donc dans le même conteneur, en tâche de fond, et
+# redémarre s'il s'arrête.
+while true; do
+    python manage.py send_outbox --loop
+    sleep 5
+done &
+
+# WSGI par défaut. ASYNC_CHECKOUT=True (optionnel) sert l'application ASGI sous
+# des workers uvicorn : l'étape de paiement attend Stripe sans bloquer de
+# worker, mais Django lit alors en mémoire les réponses en streaming (fichiers
+# statiques, médias, exports CSV/XLSX) avant de les envoyer, sans sendfile.
+if [ "$ASYNC_CHECKOUT" = "True" ]; then
+    exec gunicorn maineblanc_project.asgi:application -k uvicorn_worker.UvicornWorker
+else
+    exec gunicorn maineblanc_project.wsgi:application
+fi